@@ -5,6 +5,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt       
 from flask_login import LoginManager
 from flask_mail import Mail
+from flask_migrate import Migrate
 
 # Allow insecure HTTP for OAuth in development (REMOVE IN PRODUCTION!)
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
@@ -17,6 +18,7 @@ login_manager.login_view = 'admin_login'
 login_manager.login_message_category = 'info'
 
 mail = Mail()
+migrate = Migrate()
 
 def create_app(config_class=Config):
     """Create and configure the Flask app."""
@@ -24,10 +26,19 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    if app.config.get('METRICS_ENABLED') and app.config.get('SQLALCHEMY_DATABASE_URI'):
+        from .metrics import engine_options
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            **engine_options(app.config['SQLALCHEMY_DATABASE_URI']),
+            **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        }
+
     db.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    # Batch mode lets SQLite migrations add constraints by copying the table
+    migrate.init_app(app, db, render_as_batch=True)
 
     with app.app_context():
         from . import routes
@@ -39,6 +50,17 @@ def create_app(config_class=Config):
         from .card_payment_routes import register_card_payment_routes
         register_card_payment_routes(app)
 
+        from .commands import register_commands
+        register_commands(app)
+
+        if app.config.get('METRICS_ENABLED'):
+            from .metrics import init_metrics
+            init_metrics(app)
+
+        if app.config.get('PROFILING_ENABLED'):
+            from .profiling import init_profiling
+            init_profiling(app)
+
         @login_manager.user_loader
         def load_user(user_id):
             return models.User.query.get(int(user_id))
@@ -6,6 +6,7 @@ from flask import render_template, redirect, url_for, flash, request, session
 from app import db
 from app.models import Customer, Order
 from app.forms import CreditCardPaymentForm
+from app.query_budget import query_budget
 from functools import wraps
 
 # Import the decorator from routes
@@ -36,6 +37,7 @@ def register_card_payment_routes(app):
     
     @app.route('/checkout/card/payment', methods=['GET', 'POST'])
     @customer_login_required
+    @query_budget(0, role='customer')
     def client_card_payment():
         """Handle credit/debit card payment form"""
         if session.get('payment_method') != 'Credit/Debit Card':
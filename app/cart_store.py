@@ -0,0 +1,268 @@
+"""
+Server-side cart store.
+
+Cart lines live in the Cart_Items table keyed by customer, holding only the
+variant and quantity; everything shown to the customer (names, images,
+prices, categories) is filled in from the catalog snapshot. The signed
+session cookie no longer carries the cart or the buffet package.
+
+Line keys match the ones the cart routes have always used: the variant id
+as a string, or "buffet_<variant id>" for buffet lines in the main cart.
+All helpers work inside the caller's transaction; the caller commits.
+
+Every change to the main cart bumps the customer's Cart_States.version,
+which keys the memoized checkout quote (see app/quotes.py).
+
+Each line also remembers the unit price the customer was shown when it was
+added. revalidate() compares those prices, and the products' availability,
+against the database in a single IN query before an order is placed.
+"""
+from decimal import Decimal
+
+from sqlalchemy import update
+
+from app import db
+from app.catalog import get_catalog, mark_catalog_stale
+from app.models import CartItem, CartState, Category, Product, ProductVariant
+from app.upsert import update_or_insert
+
+CART = 'cart'
+BUFFET = 'buffet'
+BUFFET_KEY_PREFIX = 'buffet_'
+
+
+def line_key(variant_id, is_buffet_item=False):
+    return f"{BUFFET_KEY_PREFIX}{variant_id}" if is_buffet_item else str(variant_id)
+
+
+def parse_line_key(key, basket=CART):
+    """(variant_id, is_buffet_item) for a line key, or None if malformed."""
+    is_buffet_item = basket == CART and key.startswith(BUFFET_KEY_PREFIX)
+    if is_buffet_item:
+        key = key[len(BUFFET_KEY_PREFIX):]
+    try:
+        return int(key), is_buffet_item
+    except (TypeError, ValueError):
+        return None
+
+
+def _line_filter(customer_id, basket, variant_id, is_buffet_item):
+    return (
+        CartItem.customer_id == customer_id,
+        CartItem.basket == basket,
+        CartItem.variant_id == variant_id,
+        CartItem.is_buffet_item == is_buffet_item
+    )
+
+
+def _hydrate(row, catalog):
+    variant = catalog.variants_by_id.get(row.variant_id)
+    if variant is None:
+        return None
+    product = catalog.products_by_id[variant.product_id]
+    return {
+        'key': line_key(row.variant_id, row.is_buffet_item),
+        'line_id': row.line_id,
+        'variant_id': row.variant_id,
+        'product_id': product.product_id,
+        'name': product.name,
+        'product_name': product.name,
+        'variant_name': variant.size_name,
+        'category': product.category_name,
+        'image': product.image_file,
+        'price': variant.price,
+        'shown_price': float(row.price) if row.price is not None else None,
+        'quantity': row.quantity,
+        'line_total': variant.price * row.quantity,
+        'is_buffet_item': row.is_buffet_item,
+        'is_active': product.is_active
+    }
+
+
+def bump_cart_version(customer_id):
+    """
+    Invalidate the customer's checkout quote. Also called by the routes that
+    change a customer's discount status, which the quote depends on.
+    """
+    update_or_insert(
+        update(CartState)
+        .where(CartState.customer_id == customer_id)
+        .values(version=CartState.version + 1, quote_key=None, quote_json=None),
+        lambda: CartState(customer_id=customer_id, version=1)
+    )
+
+
+def get_lines(customer_id, basket=CART):
+    """The basket's lines in the order they were added, filled in from the catalog."""
+    if not customer_id:
+        return []
+    rows = CartItem.query.filter_by(customer_id=customer_id, basket=basket)\
+        .order_by(CartItem.line_id.asc()).all()
+    catalog = get_catalog()
+    return [line for line in (_hydrate(row, catalog) for row in rows) if line is not None]
+
+
+def get_buffet_package(customer_id):
+    """The buffet package as {variant id string: line}, as the wizard templates expect."""
+    return {str(line['variant_id']): line for line in get_lines(customer_id, BUFFET)}
+
+
+def is_empty(customer_id, basket=CART):
+    return not db.session.query(
+        CartItem.query.filter_by(customer_id=customer_id, basket=basket).exists()
+    ).scalar()
+
+
+def has_buffet_items(customer_id):
+    return db.session.query(
+        CartItem.query.filter_by(customer_id=customer_id, basket=CART, is_buffet_item=True).exists()
+    ).scalar()
+
+
+def add_item(customer_id, variant_id, quantity, basket=CART, is_buffet_item=False):
+    """Add `quantity` of a variant, merging with an existing line."""
+    variant = get_catalog().get_variant(variant_id)
+    price = variant.price if variant else None
+    # A double-clicked "Add to cart" can race to create the same line
+    update_or_insert(
+        update(CartItem)
+        .where(*_line_filter(customer_id, basket, variant_id, is_buffet_item))
+        .values(quantity=CartItem.quantity + quantity, price=price),
+        lambda: CartItem(
+            customer_id=customer_id,
+            basket=basket,
+            variant_id=variant_id,
+            is_buffet_item=is_buffet_item,
+            quantity=quantity,
+            price=price
+        )
+    )
+    if basket == CART:
+        bump_cart_version(customer_id)
+
+
+def set_quantity(customer_id, key, quantity, basket=CART):
+    """Set a line's quantity; returns the updated line, or None if it is not in the basket."""
+    parsed = parse_line_key(key, basket)
+    if parsed is None:
+        return None
+    result = db.session.execute(
+        update(CartItem)
+        .where(*_line_filter(customer_id, basket, *parsed))
+        .values(quantity=quantity)
+    )
+    if result.rowcount == 0:
+        return None
+    if basket == CART:
+        bump_cart_version(customer_id)
+    return _hydrate(CartItem(variant_id=parsed[0], is_buffet_item=parsed[1], quantity=quantity), get_catalog())
+
+
+def remove_item(customer_id, key, basket=CART):
+    """Remove a line; returns the removed line, or None if it was not in the basket."""
+    parsed = parse_line_key(key, basket)
+    if parsed is None:
+        return None
+    row = CartItem.query.filter(*_line_filter(customer_id, basket, *parsed)).first()
+    if row is None:
+        return None
+    line = _hydrate(row, get_catalog())
+    db.session.delete(row)
+    if basket == CART:
+        bump_cart_version(customer_id)
+    return line
+
+
+def clear(customer_id, basket=CART):
+    CartItem.query.filter_by(customer_id=customer_id, basket=basket)\
+        .delete(synchronize_session=False)
+    if basket == CART:
+        bump_cart_version(customer_id)
+
+
+def commit_buffet_package(customer_id):
+    """Move the buffet package into the main cart as buffet lines."""
+    rows = CartItem.query.filter_by(customer_id=customer_id, basket=BUFFET).all()
+    for row in rows:
+        add_item(customer_id, row.variant_id, row.quantity, is_buffet_item=True)
+        db.session.delete(row)
+    return len(rows)
+
+
+def revalidate(customer_id, lines=None):
+    """
+    Check the main cart against the database before an order is placed.
+
+    All of the cart's variants are loaded in one IN query with their product and category
+    status. Lines whose product or category was deactivated (or whose size
+    was deleted) are removed; lines whose price differs from the one the
+    customer was shown are re-priced, and the new price is remembered so
+    the next check passes. Returns (lines, changes): the remaining lines,
+    priced from the database, and one dict per change with 'line', 'reason'
+    ('price' or 'unavailable') and, for price changes, 'old_price' and
+    'new_price'. Works inside the caller's transaction; the caller commits.
+    """
+    if lines is None:
+        lines = get_lines(customer_id)
+    if not lines:
+        return lines, []
+
+    variant_ids = {line['variant_id'] for line in lines}
+    current = {
+        row.variant_id: row
+        for row in db.session.query(
+            ProductVariant.variant_id,
+            ProductVariant.price,
+            Product.is_active,
+            Category.is_active.label('category_active')
+        ).join(Product, Product.product_id == ProductVariant.product_id)
+         .join(Category, Category.category_id == Product.category_id)
+         .filter(ProductVariant.variant_id.in_(variant_ids))
+    }
+    valid_lines = []
+    changes = []
+    removed_ids = []
+    price_updates = []
+    snapshot_behind = False
+    for line in lines:
+        row = current.get(line['variant_id'])
+        if row is None or not row.is_active or not row.category_active:
+            changes.append({'line': line, 'reason': 'unavailable'})
+            removed_ids.append(line['line_id'])
+            continue
+
+        new_price = float(row.price)
+        shown_price = line['shown_price'] if line['shown_price'] is not None else line['price']
+        if new_price != shown_price:
+            changes.append({'line': line, 'reason': 'price', 'old_price': shown_price, 'new_price': new_price})
+        if new_price != line['shown_price']:
+            price_updates.append({'line_id': line['line_id'], 'price': Decimal(str(new_price))})
+        if new_price != line['price']:
+            snapshot_behind = True
+
+        valid_lines.append(dict(line, price=new_price, shown_price=new_price, line_total=new_price * line['quantity']))
+
+    if snapshot_behind:
+        # Rebuild the snapshot before the next quote is computed from it
+        mark_catalog_stale()
+
+    if removed_ids:
+        CartItem.query.filter(CartItem.line_id.in_(removed_ids)).delete(synchronize_session=False)
+    if price_updates:
+        db.session.execute(update(CartItem), price_updates)
+    if changes:
+        bump_cart_version(customer_id)
+
+    return valid_lines, changes
+
+
+def remove_variants(variant_ids):
+    """Drop every cart line for variants that are being deleted."""
+    if variant_ids:
+        CartItem.query.filter(CartItem.variant_id.in_(variant_ids))\
+            .delete(synchronize_session=False)
+
+
+def remove_customer(customer_id):
+    CartItem.query.filter_by(customer_id=customer_id).delete(synchronize_session=False)
+    CartState.query.filter_by(customer_id=customer_id).delete(synchronize_session=False)
@@ -0,0 +1,248 @@
+"""
+In-process catalog snapshot shared by the menu, cart and buffet routes.
+
+Each worker keeps one immutable snapshot of categories, products and
+variants. Admin routes call bump_catalog_version() inside their
+transaction; workers notice the new version and rebuild the snapshot on
+their next read.
+
+Rating aggregates change with every review, so they are kept out of the
+snapshot: get_ratings() re-reads Product_Ratings (one small query) at
+most once per CATALOG_VERSION_CHECK_SECONDS instead.
+"""
+import time
+from collections import namedtuple
+from threading import Lock
+from types import MappingProxyType
+
+from flask import current_app
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Category, Product, ProductVariant, ProductRating, CatalogVersion
+from app.upsert import update_or_insert
+
+CATEGORY_ORDER = [
+    'Beef',
+    'Pork',
+    'Chicken',
+    'Seafood',
+    'Pasta & Noodles',
+    'Noodles',
+    'Vegetables',
+    'Dessert',
+    'Drinks'
+]
+
+CatalogCategory = namedtuple('CatalogCategory', [
+    'category_id', 'name', 'description', 'is_active', 'rank'
+])
+
+CatalogProduct = namedtuple('CatalogProduct', [
+    'product_id', 'category_id', 'category_name', 'name', 'description',
+    'has_variants', 'is_active', 'image_file', 'variants', 'min_price'
+])
+
+CatalogVariant = namedtuple('CatalogVariant', [
+    'variant_id', 'product_id', 'size_name', 'price'
+])
+
+CatalogRating = namedtuple('CatalogRating', ['average', 'count'])
+
+
+def category_rank(category_name):
+    """Position of a category in CATEGORY_ORDER (unknown categories go last)."""
+    try:
+        return CATEGORY_ORDER.index(category_name)
+    except ValueError:
+        return 999
+
+
+class Catalog:
+    """
+    Immutable view of the whole menu at a given catalog version.
+    Only plain values are stored, never ORM instances.
+    """
+
+    def __init__(self, version, categories, products):
+        self.version = version
+        self.categories = tuple(sorted(categories, key=lambda c: (c.rank, c.name)))
+        self.products = tuple(sorted(products, key=lambda p: p.name))
+
+        self.categories_by_id = MappingProxyType({c.category_id: c for c in self.categories})
+        self.categories_by_name = MappingProxyType({c.name: c for c in self.categories})
+        self.products_by_id = MappingProxyType({p.product_id: p for p in self.products})
+        self.variants_by_id = MappingProxyType({
+            v.variant_id: v for p in self.products for v in p.variants
+        })
+
+    def active_categories(self):
+        return [c for c in self.categories if c.is_active]
+
+    def menu_products(self, category_id=None):
+        """Active products in active categories, sorted by name."""
+        products = []
+        for product in self.products:
+            if not product.is_active:
+                continue
+            if category_id and product.category_id != category_id:
+                continue
+            category = self.categories_by_id.get(product.category_id)
+            if category is None or not category.is_active:
+                continue
+            products.append(product)
+        return products
+
+    def get_variant(self, variant_id):
+        """Look up a variant by id; accepts the string ids posted by forms."""
+        try:
+            return self.variants_by_id.get(int(variant_id))
+        except (TypeError, ValueError):
+            return None
+
+
+_state = {
+    'catalog': None,
+    'checked_at': 0.0,
+    'stale': True
+}
+_rebuild_lock = Lock()
+
+_ratings = {
+    'by_product': None,
+    'checked_at': 0.0
+}
+
+
+def _read_version():
+    version = db.session.query(CatalogVersion.version).filter_by(id=1).scalar()
+    return version or 0
+
+
+def _build_catalog(version):
+    categories = [
+        CatalogCategory(
+            category_id=c.category_id,
+            name=c.name,
+            description=c.description,
+            is_active=c.is_active,
+            rank=category_rank(c.name)
+        )
+        for c in Category.query.all()
+    ]
+    category_names = {c.category_id: c.name for c in categories}
+
+    variants_by_product = {}
+    for v in ProductVariant.query.order_by(ProductVariant.variant_id.asc()).all():
+        variants_by_product.setdefault(v.product_id, []).append(
+            CatalogVariant(
+                variant_id=v.variant_id,
+                product_id=v.product_id,
+                size_name=v.size_name,
+                price=float(v.price)
+            )
+        )
+
+    products = []
+    for p in Product.query.all():
+        variants = tuple(variants_by_product.get(p.product_id, ()))
+        products.append(CatalogProduct(
+            product_id=p.product_id,
+            category_id=p.category_id,
+            category_name=category_names.get(p.category_id),
+            name=p.name,
+            description=p.description,
+            has_variants=p.has_variants,
+            is_active=p.is_active,
+            image_file=p.image_file,
+            variants=variants,
+            min_price=min(v.price for v in variants) if variants else None
+        ))
+
+    return Catalog(version, categories, products)
+
+
+def get_catalog():
+    """
+    Return the current catalog snapshot, rebuilding it if the version changed.
+    The version counter is read at most once per CATALOG_VERSION_CHECK_SECONDS,
+    so steady-state reads issue no SQL.
+    """
+    interval = current_app.config.get('CATALOG_VERSION_CHECK_SECONDS', 5)
+    catalog = _state['catalog']
+    now = time.monotonic()
+
+    if catalog is not None and not _state['stale'] and now - _state['checked_at'] < interval:
+        return catalog
+
+    with _rebuild_lock:
+        catalog = _state['catalog']
+        if catalog is not None and not _state['stale'] and now - _state['checked_at'] < interval:
+            return catalog
+
+        _state['stale'] = False
+        version = _read_version()
+        if catalog is None or catalog.version != version:
+            catalog = _build_catalog(version)
+            _state['catalog'] = catalog
+        _state['checked_at'] = time.monotonic()
+
+    return catalog
+
+
+def bump_catalog_version():
+    """
+    Increment the shared catalog version in the current transaction.
+    Call before db.session.commit() in any route that edits the menu.
+    This worker's snapshot is marked stale once the transaction commits;
+    marking it earlier would let a concurrent request re-read the old
+    version and keep the old snapshot until the next timed check.
+    """
+    update_or_insert(
+        update(CatalogVersion)
+        .where(CatalogVersion.id == 1)
+        .values(version=CatalogVersion.version + 1),
+        lambda: CatalogVersion(id=1, version=1)
+    )
+    db.session.info['catalog_bumped'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _mark_stale_after_commit(session):
+    if session.info.pop('catalog_bumped', False):
+        _state['stale'] = True
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_bump_after_rollback(session):
+    session.info.pop('catalog_bumped', None)
+
+
+def mark_catalog_stale():
+    """Re-read the catalog version and ratings on their next read."""
+    _state['stale'] = True
+    _ratings['by_product'] = None
+
+
+def get_ratings():
+    """
+    {product_id: CatalogRating} for every reviewed product, re-read at most
+    once per CATALOG_VERSION_CHECK_SECONDS. A new review therefore shows up
+    within that interval without invalidating the catalog snapshot.
+    """
+    interval = current_app.config.get('CATALOG_VERSION_CHECK_SECONDS', 5)
+    ratings = _ratings['by_product']
+    if ratings is not None and time.monotonic() - _ratings['checked_at'] < interval:
+        return ratings
+
+    rows = db.session.query(
+        ProductRating.product_id, ProductRating.rating_sum, ProductRating.review_count
+    ).filter(ProductRating.review_count > 0)
+    ratings = MappingProxyType({
+        product_id: CatalogRating(average=rating_sum / review_count, count=review_count)
+        for product_id, rating_sum, review_count in rows
+    })
+    _ratings['by_product'] = ratings
+    _ratings['checked_at'] = time.monotonic()
+    return ratings
@@ -0,0 +1,122 @@
+"""
+Maintenance commands, run with `flask <command>`.
+"""
+import click
+
+from app import db
+
+
+def register_commands(app):
+    """Register maintenance CLI commands with the Flask app"""
+
+    @app.cli.command('rebuild-ratings')
+    def rebuild_ratings_command():
+        """Recompute Product_Ratings from the Reviews table."""
+        from app.ratings import rebuild_product_ratings
+
+        count = rebuild_product_ratings()
+        db.session.commit()
+        click.echo(f"Rebuilt rating aggregates for {count} products.")
+
+    @app.cli.command('rebuild-leaderboard')
+    def rebuild_leaderboard_command():
+        """Recompute the best-seller tables from Orders/Order_Items."""
+        from app.leaderboard import rebuild_leaderboard
+
+        count = rebuild_leaderboard()
+        db.session.commit()
+        click.echo(f"Rebuilt best-seller totals for {count} products.")
+
+    @app.cli.command('rebuild-sales-rollup')
+    def rebuild_sales_rollup_command():
+        """Recompute the daily sales rollup tables from Orders/Order_Items."""
+        from app.sales_rollup import rebuild_sales_rollup
+
+        count = rebuild_sales_rollup()
+        db.session.commit()
+        click.echo(f"Rebuilt {count} daily sales rollup rows.")
+
+    @app.cli.command('send-emails')
+    @click.option('--loop', is_flag=True, help='Keep running and poll the outbox.')
+    @click.option('--batch-size', default=50, show_default=True)
+    def send_emails_command(loop, batch_size):
+        """Deliver queued emails from the outbox."""
+        from app.mailer import deliver_pending, run_worker
+
+        if loop:
+            run_worker(app, app.config.get('EMAIL_OUTBOX_POLL_SECONDS', 5), batch_size)
+            return
+
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = deliver_pending(batch_size)
+            if not sent and not failed:
+                break
+            total_sent += sent
+            total_failed += failed
+        click.echo(f"Sent {total_sent} emails ({total_failed} failed or deferred).")
+
+    @app.cli.command('process-pending-images')
+    @click.option('--min-age', default=300, show_default=True,
+                  help='Skip raw uploads younger than this many seconds.')
+    def process_pending_images_command(min_age):
+        """Finish image uploads left unprocessed by a restarted worker."""
+        from app.images import process_incoming
+        from app.upload_store import referenced_paths
+
+        count = process_incoming(referenced_paths(), min_age_seconds=min_age)
+        click.echo(f"Processed {count} pending images.")
+
+    @app.cli.command('build-image-derivatives')
+    @click.option('--force', is_flag=True, help='Rebuild derivatives that already exist.')
+    def build_image_derivatives_command(force):
+        """Create the responsive WebP/JPEG sizes for existing product pictures."""
+        from app.images import build_derivatives
+        from app.models import Product
+
+        image_files = {image_file for (image_file,) in db.session.query(Product.image_file).distinct() if image_file}
+
+        built = failed = 0
+        for image_file in sorted(image_files):
+            try:
+                if build_derivatives(image_file, force=force):
+                    built += 1
+            except Exception as e:
+                failed += 1
+                click.echo(f"Skipped {image_file}: {e}")
+        click.echo(f"Built derivatives for {built} of {len(image_files)} product pictures ({failed} failed).")
+
+    @app.cli.command('gc-uploads')
+    @click.option('--grace-hours', default=24, show_default=True,
+                  help='Keep unreferenced uploads touched within this many hours.')
+    @click.option('--recount', is_flag=True, help='Rebuild reference counts before collecting.')
+    @click.option('--dry-run', is_flag=True, help='Only report what would be deleted.')
+    def gc_uploads_command(grace_hours, recount, dry_run):
+        """Delete stored uploads that no product, order or customer references."""
+        from app.upload_store import rebuild_upload_refs, collect_garbage
+
+        if recount:
+            count = rebuild_upload_refs()
+            click.echo(f"Rebuilt reference counts for {count} stored files.")
+
+        removed, freed = collect_garbage(app.config['UPLOAD_FOLDER'], grace_hours * 3600, dry_run=dry_run)
+        db.session.commit()
+        verb = "Would remove" if dry_run else "Removed"
+        click.echo(f"{verb} {removed} unreferenced uploads ({freed / 1024:.0f} KiB).")
+
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', is_flag=True, help='Print every plan, not only failures.')
+    def check_query_plans_command(verbose):
+        """EXPLAIN the hot route queries and fail if any of them skips its index."""
+        from app.query_plans import check_query_plans
+
+        failures = 0
+        for description, problem, plan in check_query_plans():
+            click.echo(f"{'FAIL' if problem else 'ok  '} {description}" + (f" - {problem}" if problem else ''))
+            if verbose or problem:
+                for row in plan:
+                    click.echo(f"       {row}")
+            failures += bool(problem)
+
+        if failures:
+            raise click.ClickException(f"{failures} queries do not use their index.")
@@ -0,0 +1,189 @@
+"""
+Streaming exports for the admin pages.
+
+Rows are fetched from the database in keyset-paginated chunks and encoded
+as they are read, so memory use stays flat and the first bytes reach the
+client before the whole result set has been loaded.
+"""
+import csv
+import io
+import json
+from xml.sax.saxutils import escape, quoteattr
+
+from app import db
+from app.models import Order, OrderItem, Product, Voucher
+from app.pagination import keyset_paginate
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def order_export_query(start_date=None, end_date=None, status=None):
+    """Orders with customers/items/products/variants eager-loaded, optionally filtered."""
+    query = Order.query.options(
+        db.joinedload(Order.customer, innerjoin=True),
+        db.selectinload(Order.items).joinedload(OrderItem.product),
+        db.selectinload(Order.items).joinedload(OrderItem.variant)
+    )
+    if start_date:
+        query = query.filter(Order.order_date >= start_date)
+    if end_date:
+        query = query.filter(Order.order_date < end_date)
+    if status:
+        query = query.filter(Order.status == status)
+    return query
+
+
+def iter_order_chunks(query, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of orders, newest first, releasing each chunk after use."""
+    cursor = None
+    while True:
+        page = keyset_paginate(query, Order.order_date, Order.order_id, chunk_size, before=cursor)
+        if not page.items:
+            return
+
+        yield page.items
+
+        for order in page.items:
+            for obj in [order.customer, order] + list(order.items):
+                if obj in db.session:
+                    db.session.expunge(obj)
+
+        if not page.has_older:
+            return
+        cursor = page.older_cursor
+
+
+def order_to_dict(order):
+    return {
+        'order_id': order.order_id,
+        'customer_name': order.customer.name,
+        'customer_email': order.customer.email,
+        'order_date': order.order_date.isoformat(),
+        'total_amount': float(order.total_amount),
+        'discount_amount': float(order.discount_amount),
+        'final_amount': float(order.final_amount),
+        'status': order.status,
+        'items': [
+            {
+                'product_name': item.product.name,
+                'variant': item.variant.size_name if item.variant else None,
+                'quantity': item.quantity,
+                'price_per_item': float(item.price_per_item)
+            }
+            for item in order.items
+        ]
+    }
+
+
+def stream_orders_jsonl(query, chunk_size=EXPORT_CHUNK_SIZE):
+    """One JSON object per line (JSON Lines)."""
+    for chunk in iter_order_chunks(query, chunk_size):
+        yield ''.join(json.dumps(order_to_dict(order)) + '\n' for order in chunk).encode('utf-8')
+
+
+def stream_orders_json_array(query, chunk_size=EXPORT_CHUNK_SIZE):
+    """A single JSON array, emitted chunk by chunk."""
+    yield b'['
+    first = True
+    for chunk in iter_order_chunks(query, chunk_size):
+        parts = []
+        for order in chunk:
+            parts.append(('' if first else ',') + json.dumps(order_to_dict(order)))
+            first = False
+        yield ''.join(parts).encode('utf-8')
+    yield b']'
+
+
+def iter_product_chunks(chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of products (with category and variants) in product_id order."""
+    last_id = 0
+    while True:
+        products = Product.query.options(
+            db.joinedload(Product.category),
+            db.selectinload(Product.variants)
+        ).filter(Product.product_id > last_id)\
+         .order_by(Product.product_id.asc())\
+         .limit(chunk_size)\
+         .all()
+        if not products:
+            return
+
+        yield products
+
+        last_id = products[-1].product_id
+        for product in products:
+            for obj in [product] + list(product.variants):
+                if obj in db.session:
+                    db.session.expunge(obj)
+
+        if len(products) < chunk_size:
+            return
+
+
+def _xml_element(tag, text, indent, newline):
+    if text is None:
+        return f"{indent}<{tag}/>{newline}"
+    return f"{indent}<{tag}>{escape(str(text))}</{tag}>{newline}"
+
+
+def stream_menu_xml(pretty=True, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    The <Menu> export, written element by element.
+    Output matches the previous minidom pretty-print when `pretty` is set.
+    """
+    nl = '\n' if pretty else ''
+    pad = '    ' if pretty else ''
+
+    yield f'<?xml version="1.0" ?>{nl}<Menu>{nl}'.encode('utf-8')
+
+    for products in iter_product_chunks(chunk_size):
+        parts = []
+        for product in products:
+            parts.append(f"{pad}<Product id={quoteattr(str(product.product_id))}>{nl}")
+            parts.append(_xml_element('Name', product.name, pad * 2, nl))
+            parts.append(_xml_element('Description', product.description, pad * 2, nl))
+            parts.append(_xml_element('Category', product.category.name, pad * 2, nl))
+            parts.append(_xml_element('HasVariants', product.has_variants, pad * 2, nl))
+
+            if product.variants:
+                parts.append(f"{pad * 2}<Variants>{nl}")
+                for variant in product.variants:
+                    parts.append(f"{pad * 3}<Variant>{nl}")
+                    parts.append(_xml_element('Size', variant.size_name, pad * 4, nl))
+                    parts.append(_xml_element('Price', variant.price, pad * 4, nl))
+                    parts.append(f"{pad * 3}</Variant>{nl}")
+                parts.append(f"{pad * 2}</Variants>{nl}")
+            else:
+                parts.append(f"{pad * 2}<Variants/>{nl}")
+
+            parts.append(f"{pad}</Product>{nl}")
+        yield ''.join(parts).encode('utf-8')
+
+    yield f'</Menu>{nl}'.encode('utf-8')
+
+
+def stream_voucher_batch_csv(batch_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """The codes of a voucher batch as CSV, read in voucher_id order as plain rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['Code', 'Discount %', 'Max Uses', 'Uses', 'Active'])
+
+    last_id = 0
+    while True:
+        rows = db.session.query(
+            Voucher.voucher_id, Voucher.code, Voucher.discount_percentage,
+            Voucher.max_uses, Voucher.current_uses, Voucher.is_active
+        ).filter(Voucher.batch_id == batch_id, Voucher.voucher_id > last_id)\
+         .order_by(Voucher.voucher_id.asc())\
+         .limit(chunk_size)\
+         .all()
+
+        for row in rows:
+            writer.writerow([row.code, row.discount_percentage, row.max_uses, row.current_uses, row.is_active])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1].voucher_id
@@ -151,8 +151,48 @@ class VoucherForm(FlaskForm):
         description="Leave blank for unlimited uses."
     )
 
+    max_uses_per_customer = IntegerField(
+        'Uses per Customer (Optional)',
+        validators=[Optional(), NumberRange(min=1)],
+        description="Leave blank for no per-customer limit."
+    )
+
     submit = SubmitField('Save Voucher')
 
+class VoucherBatchForm(FlaskForm):
+
+    name = StringField(
+        'Campaign Name',
+        validators=[DataRequired(), Length(max=100)],
+        description="e.g., 'Acme Corp Christmas Party'"
+    )
+    prefix = StringField(
+        'Code Prefix (Optional)',
+        validators=[Optional(), Length(max=12), Regexp(r'^[A-Z0-9-]+$', message="Use uppercase letters, digits and dashes only.")],
+        description="e.g., 'ACME-'"
+    )
+    code_count = IntegerField(
+        'Number of Codes',
+        validators=[DataRequired(), NumberRange(min=1, max=50000)],
+        description="Up to 50,000 single-use codes."
+    )
+    code_length = IntegerField(
+        'Random Characters per Code',
+        default=10,
+        validators=[DataRequired(), NumberRange(min=6, max=16)]
+    )
+    discount_percentage = DecimalField(
+        'Discount Percentage',
+        places=2,
+        validators=[
+            DataRequired(),
+            NumberRange(min=0.01, max=20.0, message="Discount must be between 0.01%% and 20%%.")
+        ],
+        description="e.g., Enter 10 for 10%. Max is 20%."
+    )
+
+    submit = SubmitField('Generate Codes')
+
 class UserAddForm(FlaskForm):
     
     username = StringField(
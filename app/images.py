@@ -0,0 +1,333 @@
+"""
+Background processing for uploaded images.
+
+Routes store the raw upload under uploads/_incoming and get back the
+final (content-addressed, see app/upload_store.py) name straight away; a
+bounded process pool then downscales the image and moves it into place.
+Until the final file exists the upload is "pending"; if processing fails
+a "<file>.failed" marker holds the error. upload_status() reads those
+files, so every web worker sees the same state.
+
+Product pictures also get resized derivatives (thumb, card, full) in WebP
+with a JPEG fallback, named "<stem>-<size>.<ext>" next to the original, so
+templates can offer a srcset instead of the 800px original everywhere.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+
+from flask import current_app, url_for
+from PIL import Image, UnidentifiedImageError
+
+from app.upload_store import content_hash, blob_name
+
+IMAGE_MAX_SIZE = (800, 800)
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50_000_000
+INCOMING_DIR = '_incoming'
+FAILED_SUFFIX = '.failed'
+
+# (name, width) of each product image derivative, smallest first
+PRODUCT_DERIVATIVES = (
+    ('thumb', 160),
+    ('card', 400),
+    ('full', 800)
+)
+DERIVATIVE_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True})
+)
+
+STATUS_PENDING = 'pending'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+_pool = {
+    'executor': None,
+    'slots': None,
+    'pid': None
+}
+_pool_lock = Lock()
+_ready_derivatives = set()
+
+
+class InvalidImageError(ValueError):
+    """The upload is not an image Pillow can read."""
+
+
+def derivative_name(image_file, size, ext):
+    stem, _ = os.path.splitext(image_file)
+    return f"{stem}-{size}.{ext}"
+
+
+def _flatten(img):
+    """RGB copy of `img` for JPEG, with any transparency laid on white."""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        rgba = img.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    return img.convert('RGB')
+
+
+def write_derivatives(img, directory, image_file):
+    """
+    Write every size/format derivative of `img`. The full-size JPEG is
+    written last, so its presence means the whole set is complete.
+    """
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+
+    for size, width in PRODUCT_DERIVATIVES:
+        resized = img.copy()
+        resized.thumbnail((width, width))
+        for ext, image_format, options in DERIVATIVE_FORMATS:
+            out = resized if image_format == 'WEBP' else _flatten(resized)
+            name = derivative_name(image_file, size, ext)
+            tmp_path = os.path.join(directory, f".tmp-{name}")
+            out.save(tmp_path, image_format, **options)
+            os.replace(tmp_path, os.path.join(directory, name))
+
+
+def reduce_on_decode(img, max_size):
+    """
+    Ask the JPEG decoder for the smallest DCT scale (1/2, 1/4 or 1/8) that
+    still covers the thumbnail size, so a 12-MP phone photo is never decoded
+    at full resolution. thumbnail() alone only reduces to twice the target.
+    Other formats are left alone. Must be called before the image is loaded.
+    """
+    if img.format != 'JPEG':
+        return
+    width, height = img.size
+    scale = min(max_size[0] / width, max_size[1] / height, 1)
+    img.draft(None, (max(1, round(width * scale)), max(1, round(height * scale))))
+
+
+def check_upload_limits(stream, max_bytes, max_pixels):
+    """
+    Reject an upload from its byte size and header alone, before any pixel
+    data is decoded. Returns the image (width, height).
+    """
+    size = stream.seek(0, os.SEEK_END)
+    stream.seek(0)
+    if size > max_bytes:
+        raise InvalidImageError(f"Image is too large ({size // 1024} KiB; limit {max_bytes // 1024} KiB).")
+
+    try:
+        with Image.open(stream) as img:
+            width, height = img.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImageError(f"Unsupported image file: {e}")
+    finally:
+        stream.seek(0)
+
+    if width * height > max_pixels:
+        raise InvalidImageError(f"Image is too large ({width}x{height} pixels).")
+    return width, height
+
+
+def process_image(raw_path, final_path, max_size=IMAGE_MAX_SIZE, derivatives=False):
+    """
+    Downscale `raw_path` into `final_path` and remove the raw file.
+    With `derivatives`, the srcset sizes are written before the final file
+    appears. Runs in a pool process, so it only touches the filesystem.
+    """
+    directory, filename = os.path.split(final_path)
+    tmp_path = os.path.join(directory, f".tmp-{filename}")
+    try:
+        with Image.open(raw_path) as img:
+            reduce_on_decode(img, max_size)
+            img.thumbnail(max_size)
+            if derivatives:
+                write_derivatives(img, directory, filename)
+            img.save(tmp_path)
+        os.replace(tmp_path, final_path)
+    except Exception as e:
+        with open(final_path + FAILED_SUFFIX, 'w', encoding='utf-8') as f:
+            f.write(str(e) or e.__class__.__name__)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    finally:
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+
+
+def _get_pool():
+    """The per-process executor, (re)created lazily and after a fork."""
+    with _pool_lock:
+        if _pool['executor'] is None or _pool['pid'] != os.getpid():
+            workers = current_app.config.get('IMAGE_WORKERS', 2)
+            queue_limit = current_app.config.get('IMAGE_QUEUE_LIMIT', 16)
+            _pool['executor'] = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _pool['slots'] = BoundedSemaphore(workers + queue_limit)
+            _pool['pid'] = os.getpid()
+        return _pool['executor'], _pool['slots']
+
+
+def _submit(raw_path, final_path, derivatives=False):
+    """
+    Hand the job to the pool. When the pool's queue is full (or the pool
+    is broken) the image is processed inline instead of being dropped.
+    """
+    if not current_app.config.get('IMAGE_PROCESS_ASYNC', True):
+        process_image(raw_path, final_path, derivatives=derivatives)
+        return
+
+    executor, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        process_image(raw_path, final_path, derivatives=derivatives)
+        return
+
+    try:
+        future = executor.submit(process_image, raw_path, final_path, IMAGE_MAX_SIZE, derivatives)
+    except Exception:
+        slots.release()
+        with _pool_lock:
+            _pool['executor'] = None
+        process_image(raw_path, final_path, derivatives=derivatives)
+        return
+    future.add_done_callback(lambda _: slots.release())
+
+
+def _incoming_path(upload_folder, subfolder, name):
+    return os.path.join(upload_folder, INCOMING_DIR, f"{subfolder}-{os.path.basename(name)}")
+
+
+def save_upload(file_storage, subfolder, derivatives=False):
+    """
+    Accept an uploaded image for `subfolder` (e.g. 'products', 'payments')
+    and return its content-addressed name inside that subfolder, e.g.
+    '3f/a2/3fa2...e9.jpg'. The file appears there once processing finishes;
+    pass `derivatives` for product pictures. Uploading the same bytes again
+    returns the existing name without storing or processing anything.
+
+    Only the image header is read here; files Pillow cannot identify, or
+    that exceed IMAGE_MAX_BYTES / IMAGE_MAX_PIXELS, raise InvalidImageError
+    before anything is queued.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    _, f_ext = os.path.splitext(file_storage.filename)
+
+    stream = file_storage.stream
+    check_upload_limits(
+        stream,
+        current_app.config.get('IMAGE_MAX_BYTES', IMAGE_MAX_BYTES),
+        current_app.config.get('IMAGE_MAX_PIXELS', IMAGE_MAX_PIXELS)
+    )
+
+    name = blob_name(content_hash(stream), f_ext.lower())
+    final_path = os.path.join(upload_folder, subfolder, name)
+    raw_path = _incoming_path(upload_folder, subfolder, name)
+
+    if os.path.exists(final_path):
+        # Refresh the mtime so gc-uploads' grace period covers the new use
+        os.utime(final_path)
+        return name
+    if os.path.exists(raw_path):
+        return name
+    if os.path.exists(final_path + FAILED_SUFFIX):
+        os.remove(final_path + FAILED_SUFFIX)
+
+    os.makedirs(os.path.dirname(raw_path), exist_ok=True)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    file_storage.save(raw_path)
+
+    _submit(raw_path, final_path, derivatives)
+    return name
+
+
+def upload_status(relative_path):
+    """Return (status, error message) for an upload path such as 'payments/<name>'."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    final_path = os.path.normpath(os.path.join(upload_folder, relative_path))
+    if not final_path.startswith(os.path.normpath(upload_folder) + os.sep):
+        return STATUS_FAILED, "Invalid path"
+
+    if os.path.exists(final_path):
+        return STATUS_READY, None
+
+    failed_path = final_path + FAILED_SUFFIX
+    if os.path.exists(failed_path):
+        with open(failed_path, encoding='utf-8') as f:
+            return STATUS_FAILED, f.read()
+
+    subfolder, _, name = relative_path.partition('/')
+    if os.path.exists(_incoming_path(upload_folder, subfolder, name)):
+        return STATUS_PENDING, None
+    return STATUS_FAILED, "File not found"
+
+
+def process_incoming(paths, min_age_seconds=300):
+    """
+    Finish raw uploads left in _incoming by a restarted worker. `paths` are
+    the upload paths the database refers to (e.g. 'ids/3f/a2/...jpg'); raw
+    files younger than `min_age_seconds` are assumed to still be queued and
+    are skipped. Returns the number of files processed.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    cutoff = time.time() - min_age_seconds
+
+    processed = 0
+    for path in paths:
+        subfolder, _, name = path.partition('/')
+        raw_path = _incoming_path(upload_folder, subfolder, name)
+        if not os.path.exists(raw_path) or os.path.getmtime(raw_path) > cutoff:
+            continue
+        final_path = os.path.join(upload_folder, path)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        process_image(raw_path, final_path, derivatives=(subfolder == 'products'))
+        processed += 1
+    return processed
+
+
+def derivatives_ready(image_file):
+    """
+    Whether the derivative set for a product picture exists. A positive
+    answer is remembered for the life of the process; a negative one costs
+    a single stat and is re-checked on the next call.
+    """
+    if not image_file:
+        return False
+    if image_file in _ready_derivatives:
+        return True
+    marker = derivative_name(image_file, PRODUCT_DERIVATIVES[-1][0], DERIVATIVE_FORMATS[-1][0])
+    if os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', marker)):
+        _ready_derivatives.add(image_file)
+        return True
+    return False
+
+
+def product_image_url(image_file, size, ext='jpg'):
+    """URL of one derivative of a product picture."""
+    return url_for('static', filename='uploads/products/' + derivative_name(image_file, size, ext))
+
+
+def product_image_srcset(image_file, ext):
+    """srcset value for a product picture in `ext` ('webp' or 'jpg'), or None."""
+    if not derivatives_ready(image_file):
+        return None
+    return ', '.join(
+        f"{product_image_url(image_file, size, ext)} {width}w"
+        for size, width in PRODUCT_DERIVATIVES
+    )
+
+
+def build_derivatives(image_file, force=False):
+    """
+    Backfill the derivative set for an existing product picture.
+    Returns True if derivatives were written.
+    """
+    if not force and derivatives_ready(image_file):
+        return False
+    source = os.path.join(current_app.config['UPLOAD_FOLDER'], 'products', image_file)
+    directory, filename = os.path.split(source)
+    with Image.open(source) as img:
+        img.load()
+        write_derivatives(img, directory, filename)
+    _ready_derivatives.add(image_file)
+    return True
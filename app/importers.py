@@ -0,0 +1,211 @@
+"""
+Streaming, set-based product importer for supplier CSV price lists.
+
+Column order (no header required; a leading "Category,..." header is skipped):
+    1. Category Name  2. Product Name  3. Description
+    4. Has Variants? (True/False)  5. Price  6. Size/Variant Name
+
+Several rows with the same product name add several sizes to one product.
+Category and product names are looked up from maps loaded once per import,
+and new rows are written with executemany-style bulk statements in batches.
+"""
+import csv
+import io
+import os
+import secrets
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import insert, update
+
+from app import db
+from app.models import Category, Product, ProductVariant
+
+IMPORT_BATCH_SIZE = 500
+REPORT_HEADER = ['Row', 'Category', 'Product', 'Description', 'Has Variants', 'Price', 'Size', 'Error']
+
+
+class ImportResult:
+    def __init__(self):
+        self.products_added = 0
+        self.products_updated = 0
+        self.variants_added = 0
+        self.variants_updated = 0
+        self.errors = []
+
+    def add_error(self, row_number, row, message):
+        self.errors.append((row_number, row, message))
+
+
+class ProductImporter:
+    """
+    Import rows from a CSV stream. With `upsert`, existing products (matched
+    by name) are updated and their sizes inserted or re-priced; otherwise
+    rows naming an existing product are reported as errors.
+    """
+
+    def __init__(self, upsert=False, batch_size=IMPORT_BATCH_SIZE):
+        self.upsert = upsert
+        self.batch_size = batch_size
+        self.result = ImportResult()
+
+        self.category_ids = dict(db.session.query(Category.name, Category.category_id).all())
+        self.product_ids = {}
+        for product_id, name in db.session.query(Product.product_id, Product.name).order_by(Product.product_id.desc()):
+            self.product_ids[name] = product_id
+        self.variant_ids = {
+            (product_id, size_name): variant_id
+            for variant_id, product_id, size_name in db.session.query(
+                ProductVariant.variant_id, ProductVariant.product_id, ProductVariant.size_name
+            )
+        }
+
+        self.created_names = set()
+        self.updated_names = set()
+        self.simple_sizes = {}
+
+        self._new_products = {}
+        self._pending_variants = []
+        self._product_updates = []
+        self._variant_updates = []
+
+    def run(self, text_stream):
+        for row_number, row in enumerate(csv.reader(text_stream), start=1):
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            if row_number == 1 and row[0].strip().lower() in ('category', 'category name'):
+                continue
+            self._process_row(row_number, row)
+
+            if len(self._new_products) + len(self._pending_variants) >= self.batch_size:
+                self._flush_batch()
+
+        self._flush_batch()
+        return self.result
+
+    def _process_row(self, row_number, row):
+        if len(row) < 6:
+            self.result.add_error(row_number, row, "Insufficient columns")
+            return
+
+        r_category, r_name, r_description, r_has_variant, r_price, r_size = [cell.strip() for cell in row[:6]]
+
+        if not r_name:
+            self.result.add_error(row_number, row, "Missing product name")
+            return
+
+        category_id = self.category_ids.get(r_category)
+        if category_id is None:
+            self.result.add_error(row_number, row, f"Category '{r_category}' not found.")
+            return
+
+        has_variants = r_has_variant.lower() == 'true'
+
+        price = None
+        if r_price or r_size:
+            if not r_price or not r_size:
+                self.result.add_error(row_number, row, "Price and size must be given together.")
+                return
+            try:
+                price = Decimal(r_price)
+            except InvalidOperation:
+                self.result.add_error(row_number, row, f"Invalid price '{r_price}'.")
+                return
+            if price < 0:
+                self.result.add_error(row_number, row, f"Invalid price '{r_price}'.")
+                return
+        elif not has_variants:
+            self.result.add_error(row_number, row, f"Simple product '{r_name}' missing price or size.")
+            return
+
+        if price is not None and not has_variants:
+            previous_size = self.simple_sizes.setdefault(r_name, r_size)
+            if previous_size != r_size:
+                self.result.add_error(row_number, row, f"Simple product '{r_name}' can only have one size.")
+                return
+
+        product_fields = {
+            'name': r_name,
+            'description': r_description,
+            'category_id': category_id,
+            'has_variants': has_variants
+        }
+
+        if r_name in self.created_names or r_name in self.updated_names:
+            pass
+        elif r_name in self.product_ids:
+            if not self.upsert:
+                self.result.add_error(row_number, row, f"Product '{r_name}' already exists.")
+                return
+            self._product_updates.append(dict(product_fields, product_id=self.product_ids[r_name]))
+            self.updated_names.add(r_name)
+            self.result.products_updated += 1
+        else:
+            self._new_products[r_name] = product_fields
+            self.created_names.add(r_name)
+            self.result.products_added += 1
+
+        if price is not None:
+            self._pending_variants.append((r_name, r_size, price))
+
+    def _flush_batch(self):
+        if self._new_products:
+            db.session.execute(insert(Product), list(self._new_products.values()))
+            names = list(self._new_products)
+            for product_id, name in db.session.query(Product.product_id, Product.name)\
+                    .filter(Product.name.in_(names))\
+                    .order_by(Product.product_id.asc()):
+                self.product_ids[name] = product_id
+            self._new_products = {}
+
+        if self._product_updates:
+            db.session.execute(update(Product), self._product_updates)
+            self._product_updates = []
+
+        new_variants = {}
+        for name, size_name, price in self._pending_variants:
+            product_id = self.product_ids[name]
+            key = (product_id, size_name)
+            variant_id = self.variant_ids.get(key)
+            if variant_id is not None:
+                self._variant_updates.append({'variant_id': variant_id, 'price': price})
+                self.result.variants_updated += 1
+            elif key in new_variants:
+                new_variants[key]['price'] = price
+            else:
+                new_variants[key] = {'product_id': product_id, 'size_name': size_name, 'price': price}
+                self.result.variants_added += 1
+        self._pending_variants = []
+
+        if new_variants:
+            db.session.execute(insert(ProductVariant), list(new_variants.values()))
+            product_ids = {product_id for product_id, _ in new_variants}
+            for variant_id, product_id, size_name in db.session.query(
+                ProductVariant.variant_id, ProductVariant.product_id, ProductVariant.size_name
+            ).filter(ProductVariant.product_id.in_(product_ids)):
+                self.variant_ids[(product_id, size_name)] = variant_id
+
+        if self._variant_updates:
+            db.session.execute(update(ProductVariant), self._variant_updates)
+            self._variant_updates = []
+
+
+def import_products_csv(file_storage, upsert=False):
+    """Import an uploaded CSV without reading it into memory first."""
+    text_stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    try:
+        return ProductImporter(upsert=upsert).run(text_stream)
+    finally:
+        text_stream.detach()
+
+
+def write_error_report(result, report_folder):
+    """Write the per-row errors to a CSV in `report_folder`; return its token."""
+    os.makedirs(report_folder, exist_ok=True)
+    token = secrets.token_hex(8)
+    with open(os.path.join(report_folder, f"{token}.csv"), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_HEADER)
+        for row_number, row, message in result.errors:
+            cells = (list(row) + [''] * 6)[:6]
+            writer.writerow([row_number] + cells + [message])
+    return token
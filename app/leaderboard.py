@@ -0,0 +1,121 @@
+"""
+Best-seller leaderboard maintained from order status changes.
+
+Sales are counted per product and order date in Product_Sales_Daily and
+all-time in Product_Sales_Totals. Declined orders are never counted, so the
+tables are adjusted whenever an order moves into or out of 'Declined'.
+All helpers work inside the caller's transaction; the caller commits.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Order, OrderItem, ProductSalesDaily, ProductSalesTotal
+from app.upsert import add_to_counters
+
+EXCLUDED_STATUSES = ('Declined',)
+
+LEADERBOARD_WINDOWS = {
+    '30d': 30,
+    '90d': 90,
+    'all': None
+}
+
+
+def is_counted(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def _quantities_by_product(items):
+    quantities = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + int(item.quantity)
+    return quantities
+
+
+def record_order_sales(order, sign=1, items=None):
+    """
+    Add (sign=1) or remove (sign=-1) an order's units from the leaderboard,
+    with one batched upsert per table however many lines the order has.
+    Pass `items` when the order's items are not yet loaded on the relationship.
+    """
+    items = order.items if items is None else items
+    sale_date = order.order_date.date()
+    quantities = _quantities_by_product(items)
+    add_to_counters(ProductSalesDaily, [
+        {'product_id': product_id, 'sale_date': sale_date, 'quantity': sign * quantity}
+        for product_id, quantity in quantities.items()
+    ], ('quantity',))
+    add_to_counters(ProductSalesTotal, [
+        {'product_id': product_id, 'quantity': sign * quantity}
+        for product_id, quantity in quantities.items()
+    ], ('quantity',))
+
+
+def delete_product_sales(product_id):
+    """
+    Drop a product's leaderboard rows before the product is deleted. Rows
+    of deleted orders stay behind with quantity 0 and still reference it.
+    """
+    ProductSalesDaily.query.filter_by(product_id=product_id).delete()
+    ProductSalesTotal.query.filter_by(product_id=product_id).delete()
+
+
+def apply_status_change(order, old_status, new_status):
+    """Keep the leaderboard in step with an order status transition."""
+    if is_counted(old_status) and not is_counted(new_status):
+        record_order_sales(order, sign=-1)
+    elif not is_counted(old_status) and is_counted(new_status):
+        record_order_sales(order, sign=1)
+
+
+def top_products(days=None, limit=3):
+    """
+    Return [(product_id, quantity), ...] for the best sellers.
+    `days=None` ranks all-time sales, otherwise the last `days` days.
+    """
+    if days is None:
+        rows = db.session.query(ProductSalesTotal.product_id, ProductSalesTotal.quantity)\
+            .filter(ProductSalesTotal.quantity > 0)\
+            .order_by(ProductSalesTotal.quantity.desc(), ProductSalesTotal.product_id.asc())\
+            .limit(limit)\
+            .all()
+    else:
+        since = date.today() - timedelta(days=days - 1)
+        total_sold = func.sum(ProductSalesDaily.quantity)
+        rows = db.session.query(ProductSalesDaily.product_id, total_sold)\
+            .filter(ProductSalesDaily.sale_date >= since)\
+            .group_by(ProductSalesDaily.product_id)\
+            .having(total_sold > 0)\
+            .order_by(total_sold.desc(), ProductSalesDaily.product_id.asc())\
+            .limit(limit)\
+            .all()
+    return [(product_id, int(quantity)) for product_id, quantity in rows]
+
+
+def rebuild_leaderboard():
+    """Recompute both leaderboard tables from Orders/Order_Items (backfill)."""
+    ProductSalesDaily.query.delete()
+    ProductSalesTotal.query.delete()
+
+    sale_date = func.date(Order.order_date)
+    rows = db.session.query(
+        OrderItem.product_id,
+        sale_date,
+        func.sum(OrderItem.quantity)
+    ).join(Order, Order.order_id == OrderItem.order_id)\
+     .filter(Order.status.notin_(EXCLUDED_STATUSES))\
+     .group_by(OrderItem.product_id, sale_date)\
+     .all()
+
+    totals = {}
+    for product_id, day, quantity in rows:
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        db.session.add(ProductSalesDaily(product_id=product_id, sale_date=day, quantity=int(quantity)))
+        totals[product_id] = totals.get(product_id, 0) + int(quantity)
+
+    for product_id, quantity in totals.items():
+        db.session.add(ProductSalesTotal(product_id=product_id, quantity=quantity))
+    return len(totals)
@@ -0,0 +1,152 @@
+"""
+Durable outbound email.
+
+Routes call queue_email() inside their own transaction, so a message is
+stored exactly when the change that triggered it is committed. A worker
+(one background thread per web process, or `flask send-emails`) claims due
+messages in batches, sends each batch over a single SMTP connection and
+retries failures with exponential backoff.
+"""
+import secrets
+from datetime import datetime, timedelta
+from threading import Thread, Event
+
+from flask_mail import Message
+from sqlalchemy import update, or_, and_
+
+from app import db, mail
+from app.models import EmailOutbox
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+_wake = Event()
+
+
+def queue_email(subject, recipients, html, sender=None):
+    """Store one outbox row per recipient in the current transaction."""
+    for recipient in recipients:
+        db.session.add(EmailOutbox(
+            recipient=recipient,
+            sender=sender,
+            subject=subject,
+            html_body=html
+        ))
+    _wake.set()
+
+
+def _due_filter(now):
+    return or_(
+        and_(EmailOutbox.status == 'Pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'Sending', EmailOutbox.claimed_at < now - CLAIM_TIMEOUT)
+    )
+
+
+def claim_batch(batch_size):
+    """Mark up to `batch_size` due messages as ours and return them."""
+    now = datetime.utcnow()
+    candidate_ids = [
+        email_id for (email_id,) in db.session.query(EmailOutbox.email_id)
+        .filter(_due_filter(now))
+        .order_by(EmailOutbox.next_attempt_at.asc())
+        .limit(batch_size)
+    ]
+    if not candidate_ids:
+        return []
+
+    token = secrets.token_hex(16)
+    db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.email_id.in_(candidate_ids), _due_filter(now))
+        .values(status='Sending', claim_token=token, claimed_at=now)
+    )
+    db.session.commit()
+    return EmailOutbox.query.filter_by(claim_token=token).all()
+
+
+def _mark_failed(email, error):
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    email.claim_token = None
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'Failed'
+    else:
+        email.status = 'Pending'
+        email.next_attempt_at = datetime.utcnow() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (email.attempts - 1))
+
+
+def deliver_pending(batch_size=50):
+    """Send one claimed batch over a shared connection; return (sent, failed)."""
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    try:
+        with mail.connect() as connection:
+            for email in batch:
+                msg = Message(
+                    email.subject,
+                    recipients=[email.recipient],
+                    sender=email.sender,
+                    html=email.html_body
+                )
+                try:
+                    connection.send(msg)
+                except Exception as e:
+                    _mark_failed(email, e)
+                    failed += 1
+                else:
+                    email.status = 'Sent'
+                    email.sent_at = datetime.utcnow()
+                    email.claim_token = None
+                    sent += 1
+    except Exception as e:
+        # Could not open (or lost) the SMTP connection: retry the unsent rest
+        for email in batch:
+            if email.status == 'Sending':
+                _mark_failed(email, e)
+                failed += 1
+
+    db.session.commit()
+    return sent, failed
+
+
+def pending_count():
+    return EmailOutbox.query.filter(EmailOutbox.status.in_(['Pending', 'Sending'])).count()
+
+
+def run_worker(app, poll_seconds=5, batch_size=50, stop_event=None):
+    """Deliver outbox batches until `stop_event` is set."""
+    while stop_event is None or not stop_event.is_set():
+        with app.app_context():
+            try:
+                sent, failed = deliver_pending(batch_size)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f"Email outbox worker error: {e}")
+                sent = failed = 0
+            finally:
+                db.session.remove()
+
+        if sent or failed:
+            continue
+        _wake.wait(poll_seconds)
+        _wake.clear()
+
+
+def start_worker_thread(app):
+    """
+    Start the per-process background delivery thread. Only the entry
+    point of a served web process calls this (run.py, or a gunicorn
+    post_worker_init hook), so `flask` commands never start one.
+    """
+    thread = Thread(
+        target=run_worker,
+        args=(app, app.config.get('EMAIL_OUTBOX_POLL_SECONDS', 5)),
+        name='email-outbox',
+        daemon=True
+    )
+    thread.start()
+    return thread
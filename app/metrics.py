@@ -0,0 +1,147 @@
+"""
+Prometheus metrics, served in text format at /metrics.
+
+Request latency, connection-pool checkout waits, orders placed and cart
+adds are recorded in the process that handles them. Under a prefork
+server (gunicorn, several workers) set PROMETHEUS_MULTIPROC_DIR to an
+empty directory that all workers share, before they start; each worker
+then writes its samples there and /metrics sums them across workers.
+Call mark_worker_dead(pid) from the server's child-exit hook so a dead
+worker's live values are dropped.
+
+The email queue depth and open orders per status are read from the
+database when /metrics is scraped, so they are the same in every worker.
+"""
+import hmac
+import os
+import time
+
+from flask import g, request
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import func
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from app import db
+from app.models import EmailOutbox, Order
+
+REQUEST_LATENCY = Histogram(
+    'anjets_http_request_duration_seconds',
+    'Time spent handling a request, by endpoint.',
+    ['endpoint', 'method', 'status'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    'anjets_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a database connection from the pool.',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+ORDERS_PLACED = Counter(
+    'anjets_orders_placed_total',
+    'Orders placed by customers, by initial status and payment method.',
+    ['status', 'payment_method']
+)
+CART_ADDS = Counter(
+    'anjets_cart_adds_total',
+    'Items added to a cart or buffet package.',
+    ['basket']
+)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def engine_options(database_uri):
+    """
+    Engine options that time pool checkouts. In-memory SQLite keeps its
+    single-connection pool, since a pooled one would see empty databases.
+    """
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {'poolclass': TimedQueuePool}
+
+
+class DatabaseCollector:
+    """Gauges read from the database at scrape time."""
+
+    def collect(self):
+        email_queue = GaugeMetricFamily(
+            'anjets_email_queue_depth',
+            'Emails in the outbox waiting to be delivered, by status.',
+            labels=['status']
+        )
+        orders = GaugeMetricFamily(
+            'anjets_orders',
+            'Orders in the database, by status.',
+            labels=['status']
+        )
+        for status, count in db.session.query(EmailOutbox.status, func.count(EmailOutbox.email_id))\
+                .filter(EmailOutbox.status.in_(['Pending', 'Sending']))\
+                .group_by(EmailOutbox.status):
+            email_queue.add_metric([status], count)
+        for status, count in db.session.query(Order.status, func.count(Order.order_id)).group_by(Order.status):
+            orders.add_metric([status], count)
+        yield email_queue
+        yield orders
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('_metrics_started', None)
+    if started is not None and request.endpoint not in ('static', 'metrics'):
+        REQUEST_LATENCY.labels(
+            endpoint=request.endpoint or 'unmatched',
+            method=request.method,
+            status=str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
+
+
+def scrape_allowed(config):
+    """
+    With METRICS_TOKEN set, a scrape must send it as a bearer token (from
+    any address); otherwise it must come from METRICS_ALLOWED_IPS.
+    """
+    token = config.get('METRICS_TOKEN')
+    if token:
+        sent = request.headers.get('Authorization', '')
+        return hmac.compare_digest(sent.encode(), f"Bearer {token}".encode())
+    return request.remote_addr in config.get('METRICS_ALLOWED_IPS', [])
+
+
+def render_metrics():
+    """(body, content type) for a scrape, summed across workers in multiprocess mode."""
+    database = CollectorRegistry(auto_describe=True)
+    database.register(DatabaseCollector())
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(database), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid):
+    """Drop a dead worker's live samples (gunicorn: call from child_exit)."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+def init_metrics(app):
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
@@ -52,6 +52,9 @@ class Product(db.Model):
     e.g., "Kalderetang Baka"
     """
     __tablename__ = 'Products'
+    __table_args__ = (
+        db.Index('ix_products_category_active_name', 'category_id', 'is_active', 'name'),
+    )
     product_id = db.Column(db.Integer, primary_key=True)
     category_id = db.Column(db.Integer, db.ForeignKey('Categories.category_id'), nullable=False)
     name = db.Column(db.String(255), nullable=False)
@@ -80,6 +83,9 @@ class Customer(db.Model, UserMixin):
     Model for client-facing website users.
     """
     __tablename__ = 'Customers'
+    __table_args__ = (
+        db.Index('ix_customers_discount_status_registration', 'discount_status', 'registration_date'),
+    )
     customer_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     contact_number = db.Column(db.String(50), nullable=True)
@@ -155,6 +161,13 @@ class Order(db.Model):
     Updated for Event-Based Logic.
     """
     __tablename__ = 'Orders'
+    __table_args__ = (
+        db.UniqueConstraint('customer_id', 'idempotency_key', name='uq_orders_idempotency_key'),
+        db.Index('ix_orders_order_date', 'order_date', 'order_id'),
+        db.Index('ix_orders_status_order_date', 'status', 'order_date'),
+        db.Index('ix_orders_customer_order_date', 'customer_id', 'order_date'),
+        db.Index('ix_orders_payment_method_status', 'payment_method', 'payment_status'),
+    )
     order_id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('Customers.customer_id'), nullable=False)
     order_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) 
@@ -182,6 +195,7 @@ class Order(db.Model):
     gcash_reference_no = db.Column(db.String(50), nullable=True)
     card_last_four = db.Column(db.String(4), nullable=True)  # Last 4 digits of card
     card_type = db.Column(db.String(20), nullable=True)  # Visa, Mastercard, etc.
+    idempotency_key = db.Column(db.String(64), nullable=True)  # Sent by the checkout page; a retry returns this order
 
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade="all, delete-orphan")
 
@@ -190,6 +204,11 @@ class OrderItem(db.Model):
     Model for an individual item within an order.
     """
     __tablename__ = 'Order_Items'
+    __table_args__ = (
+        db.Index('ix_order_items_order_id', 'order_id'),
+        db.Index('ix_order_items_product_id', 'product_id'),
+        db.Index('ix_order_items_variant_id', 'variant_id'),
+    )
     order_item_id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('Orders.order_id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('Products.product_id'), nullable=False)
@@ -209,7 +228,41 @@ class Voucher(db.Model):
     discount_percentage = db.Column(db.Numeric(5, 2), nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     max_uses = db.Column(db.Integer, nullable=True) 
+    max_uses_per_customer = db.Column(db.Integer, nullable=True)
     current_uses = db.Column(db.Integer, nullable=False, default=0)
+    batch_id = db.Column(db.Integer, db.ForeignKey('Voucher_Batches.batch_id'), nullable=True, index=True)
+
+
+class VoucherBatch(db.Model):
+    """
+    A set of single-use voucher codes generated together for a campaign.
+    """
+    __tablename__ = 'Voucher_Batches'
+    batch_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    prefix = db.Column(db.String(12), nullable=False, default='')
+    code_count = db.Column(db.Integer, nullable=False)
+    discount_percentage = db.Column(db.Numeric(5, 2), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class VoucherRedemption(db.Model):
+    """
+    One use of a voucher by a customer's order (see app/vouchers.py).
+    `use_no` is which of the customer's allowed uses this is, 1 to the
+    voucher's max_uses_per_customer; NULL when the voucher has no
+    per-customer limit.
+    """
+    __tablename__ = 'Voucher_Redemptions'
+    __table_args__ = (
+        db.UniqueConstraint('voucher_id', 'customer_id', 'use_no', name='uq_voucher_redemptions_use'),
+    )
+    redemption_id = db.Column(db.Integer, primary_key=True)
+    voucher_id = db.Column(db.Integer, db.ForeignKey('Vouchers.voucher_id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('Customers.customer_id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('Orders.order_id'), nullable=False, index=True)
+    use_no = db.Column(db.Integer, nullable=True)
+    redeemed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 
 class Review(db.Model):
@@ -217,6 +270,9 @@ class Review(db.Model):
     Model for customer product reviews.
     """
     __tablename__ = 'Reviews'
+    __table_args__ = (
+        db.UniqueConstraint('customer_id', 'product_id', name='uq_reviews_customer_product'),
+    )
     review_id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('Products.product_id'), nullable=False)
     customer_id = db.Column(db.Integer, db.ForeignKey('Customers.customer_id'), nullable=False)
@@ -226,3 +282,158 @@ class Review(db.Model):
     review_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     customer = db.relationship('Customer')
+
+
+class CatalogVersion(db.Model):
+    """
+    Single-row counter bumped whenever categories, products or variants change.
+    Workers compare it against their in-memory catalog snapshot.
+    """
+    __tablename__ = 'Catalog_Version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ProductRating(db.Model):
+    """
+    Running review totals per product, maintained alongside Reviews
+    so listings never have to aggregate the Reviews table.
+    """
+    __tablename__ = 'Product_Ratings'
+    product_id = db.Column(db.Integer, db.ForeignKey('Products.product_id'), primary_key=True)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def average(self):
+        if not self.review_count:
+            return 0.0
+        return self.rating_sum / self.review_count
+
+    @property
+    def histogram(self):
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
+
+
+class ProductSalesDaily(db.Model):
+    """
+    Units sold per product per order date, excluding declined orders.
+    Backs the rolling-window best-seller leaderboard.
+    """
+    __tablename__ = 'Product_Sales_Daily'
+    product_id = db.Column(db.Integer, db.ForeignKey('Products.product_id'), primary_key=True)
+    sale_date = db.Column(db.Date, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ProductSalesTotal(db.Model):
+    """
+    All-time units sold per product, excluding declined orders.
+    """
+    __tablename__ = 'Product_Sales_Totals'
+    product_id = db.Column(db.Integer, db.ForeignKey('Products.product_id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SalesDaily(db.Model):
+    """
+    Daily order totals per status class, payment method and order type.
+    Sales reports and the dashboard sum these rows instead of scanning Orders.
+    """
+    __tablename__ = 'Sales_Daily'
+    sale_date = db.Column(db.Date, primary_key=True)
+    status_class = db.Column(db.String(20), primary_key=True)
+    payment_method = db.Column(db.String(50), primary_key=True)
+    order_type = db.Column(db.String(50), primary_key=True)
+
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    vat_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    discount_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+
+
+class SalesDailyVariant(db.Model):
+    """
+    Daily units sold per product variant and status class.
+    """
+    __tablename__ = 'Sales_Daily_Variants'
+    sale_date = db.Column(db.Date, primary_key=True)
+    status_class = db.Column(db.String(20), primary_key=True)
+    variant_id = db.Column(db.Integer, db.ForeignKey('Product_Variants.variant_id'), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('Products.product_id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+
+class EmailOutbox(db.Model):
+    """
+    Outgoing email waiting for (or done with) delivery by the mail worker.
+    """
+    __tablename__ = 'Email_Outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    email_id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255), nullable=True)
+    subject = db.Column(db.String(255), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+
+    status = db.Column(db.String(20), nullable=False, default='Pending')  # Pending, Sending, Sent, Failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+
+class StoredFile(db.Model):
+    """
+    Reference count for a content-addressed upload, keyed by its path under
+    the upload folder (e.g. 'payments/3f/a2/3fa2...e9.jpg').
+    """
+    __tablename__ = 'Stored_Files'
+    path = db.Column(db.String(100), primary_key=True)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CartItem(db.Model):
+    """
+    One line of a customer's server-side cart. Only the variant and quantity
+    are stored; names, images and prices come from the catalog snapshot.
+    `basket` is 'cart' for the main cart or 'buffet' for the package being
+    built in the buffet wizard. `price` is the unit price the customer last
+    saw for the line, which checkout revalidates against the database.
+    """
+    __tablename__ = 'Cart_Items'
+    __table_args__ = (
+        db.UniqueConstraint('customer_id', 'basket', 'variant_id', 'is_buffet_item',
+                            name='uq_cart_items_line'),
+    )
+    line_id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('Customers.customer_id'), nullable=False)
+    basket = db.Column(db.String(10), nullable=False, default='cart')
+    variant_id = db.Column(db.Integer, db.ForeignKey('Product_Variants.variant_id'), nullable=False)
+    is_buffet_item = db.Column(db.Boolean, nullable=False, default=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    price = db.Column(db.Numeric(10, 2), nullable=True)
+
+
+class CartState(db.Model):
+    """
+    Per-customer cart version, bumped on every cart or discount-status
+    change, plus the last checkout quote computed and the key it is valid for.
+    """
+    __tablename__ = 'Cart_States'
+    customer_id = db.Column(db.Integer, db.ForeignKey('Customers.customer_id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    quote_key = db.Column(db.String(255), nullable=True)
+    quote_json = db.Column(db.Text, nullable=True)
@@ -4,8 +4,10 @@
 from flask import current_app as app, redirect, url_for, flash, request, session
 from app import db
 from app.models import Customer
+from app.query_budget import no_query_budget
 
 @app.route('/auth/google')
+@no_query_budget("Redirects to Google's sign-in page")
 def google_login():
     """Initiate Google OAuth flow"""
     from google_auth_oauthlib.flow import Flow
@@ -52,6 +54,7 @@ def google_login():
     return redirect(authorization_url)
 
 @app.route('/auth/google/callback')
+@no_query_budget("Needs a sign-in code from Google")
 def google_callback():
     """Handle Google OAuth callback"""
     from google_auth_oauthlib.flow import Flow
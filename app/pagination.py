@@ -0,0 +1,87 @@
+"""
+Keyset (cursor) pagination over (timestamp, id) ordered queries.
+
+Pages are ordered newest first. A cursor is "<iso timestamp>_<id>" of the
+boundary row, so fetching a page costs the same no matter how deep it is.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) or None for a missing/malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        timestamp_str, row_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp_str), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of rows plus the cursors for the neighbouring pages."""
+
+    def __init__(self, items, newer_cursor, older_cursor):
+        self.items = items
+        self.newer_cursor = newer_cursor
+        self.older_cursor = older_cursor
+
+    @property
+    def has_newer(self):
+        return self.newer_cursor is not None
+
+    @property
+    def has_older(self):
+        return self.older_cursor is not None
+
+
+def keyset_paginate(query, timestamp_col, id_col, per_page, before=None, after=None):
+    """
+    Page through `query` newest first.
+
+    `before` returns the page of rows older than that cursor, `after` the
+    page of rows newer than it; with neither, the newest page is returned.
+    """
+    before_key = decode_cursor(before)
+    after_key = decode_cursor(after)
+
+    if after_key and not before_key:
+        ts, row_id = after_key
+        rows = query.filter(or_(
+            timestamp_col > ts,
+            and_(timestamp_col == ts, id_col > row_id)
+        )).order_by(timestamp_col.asc(), id_col.asc()).limit(per_page + 1).all()
+
+        has_more_newer = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_more_older = True
+    else:
+        if before_key:
+            ts, row_id = before_key
+            query = query.filter(or_(
+                timestamp_col < ts,
+                and_(timestamp_col == ts, id_col < row_id)
+            ))
+        rows = query.order_by(timestamp_col.desc(), id_col.desc()).limit(per_page + 1).all()
+
+        has_more_older = len(rows) > per_page
+        rows = rows[:per_page]
+        has_more_newer = before_key is not None
+
+    newer_cursor = None
+    older_cursor = None
+    if rows:
+        timestamp_attr = timestamp_col.key
+        id_attr = id_col.key
+        if has_more_newer:
+            newer_cursor = encode_cursor(getattr(rows[0], timestamp_attr), getattr(rows[0], id_attr))
+        if has_more_older:
+            older_cursor = encode_cursor(getattr(rows[-1], timestamp_attr), getattr(rows[-1], id_attr))
+
+    return KeysetPage(rows, newer_cursor, older_cursor)
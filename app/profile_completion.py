@@ -8,6 +8,7 @@ from flask import render_template, redirect, url_for, flash, request, session
 from app import db
 from app.models import Customer
 from app.forms import CompleteProfileForm
+from app.query_budget import query_budget
 from functools import wraps
 
 def customer_login_required(f):
@@ -24,6 +25,7 @@ def register_profile_routes(app):
     
     @app.route('/complete_profile', methods=['GET', 'POST'])
     @customer_login_required
+    @query_budget(1, role='customer')
     def complete_profile():
         """Complete profile for Google OAuth users"""
         customer = Customer.query.get_or_404(session['customer_id'])
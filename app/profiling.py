@@ -0,0 +1,198 @@
+"""
+Opt-in request profiling (PROFILING_ENABLED).
+
+For every request this records wall time, the number of SQL statements
+and the time spent in them (from SQLAlchemy engine events) and the time
+spent rendering templates, and aggregates them per endpoint in memory.
+Requests slower than PROFILING_SLOW_MS are logged with their most
+expensive statements and kept for the admin profiling page. Requests
+that go over their declared query budget (app/query_budget.py) are logged.
+
+Stats are per process: with several workers each one shows its own.
+"""
+import time
+from collections import deque
+from threading import Lock
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+
+from app import db
+from app.query_budget import budget_for
+
+SLOW_REQUEST_HISTORY = 50
+TOP_STATEMENTS = 5
+MAX_STATEMENTS_PER_REQUEST = 1000
+STATEMENT_PREVIEW_CHARS = 300
+
+_lock = Lock()
+_endpoints = {}
+_slow_requests = deque(maxlen=SLOW_REQUEST_HISTORY)
+_state = {'since': time.time()}
+
+
+class EndpointStats:
+    """Running totals for one endpoint."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.sql_count = 0
+        self.max_sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+
+    def add(self, elapsed, sql_count, sql_time, template_time):
+        self.count += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.sql_count += sql_count
+        self.max_sql_count = max(self.max_sql_count, sql_count)
+        self.sql_time += sql_time
+        self.template_time += template_time
+
+    @property
+    def avg_time(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    @property
+    def avg_sql_count(self):
+        return self.sql_count / self.count if self.count else 0.0
+
+
+def _profile():
+    if not has_request_context():
+        return None
+    return g.get('_profile')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile()
+    if profile is not None:
+        profile['sql_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile()
+    if profile is None or profile.get('sql_started') is None:
+        return
+    elapsed = time.perf_counter() - profile.pop('sql_started')
+    profile['sql_count'] += 1
+    profile['sql_time'] += elapsed
+    if len(profile['statements']) < MAX_STATEMENTS_PER_REQUEST:
+        profile['statements'].append((statement, elapsed))
+
+
+def _before_render(sender, template, context, **extra):
+    profile = _profile()
+    if profile is not None:
+        profile['render_started'].append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    profile = _profile()
+    if profile is not None and profile['render_started']:
+        elapsed = time.perf_counter() - profile['render_started'].pop()
+        # Only count the outermost template, which includes the nested ones
+        if not profile['render_started']:
+            profile['template_time'] += elapsed
+
+
+def _start_request():
+    g._profile = {
+        'started': time.perf_counter(),
+        'sql_count': 0,
+        'sql_time': 0.0,
+        'statements': [],
+        'template_time': 0.0,
+        'render_started': []
+    }
+
+
+def top_statements(statements, limit=TOP_STATEMENTS):
+    """[(statement, executions, total seconds)] grouped by SQL text, slowest first."""
+    grouped = {}
+    for statement, elapsed in statements:
+        count, total = grouped.get(statement, (0, 0.0))
+        grouped[statement] = (count + 1, total + elapsed)
+    ranked = sorted(grouped.items(), key=lambda item: item[1][1], reverse=True)
+    return [(statement, count, total) for statement, (count, total) in ranked[:limit]]
+
+
+def _finish_request(app):
+    profile = g.pop('_profile', None)
+    if profile is None or request.endpoint in (None, 'static'):
+        return
+
+    elapsed = time.perf_counter() - profile['started']
+    with _lock:
+        stats = _endpoints.get(request.endpoint)
+        if stats is None:
+            stats = _endpoints[request.endpoint] = EndpointStats(request.endpoint)
+        stats.add(elapsed, profile['sql_count'], profile['sql_time'], profile['template_time'])
+
+    budget = budget_for(request.endpoint)
+    if budget is not None and profile['sql_count'] > budget.limit:
+        app.logger.warning(
+            f"{request.endpoint} issued {profile['sql_count']} SQL statements, over its budget of {budget.limit}"
+        )
+
+    if elapsed * 1000 < app.config.get('PROFILING_SLOW_MS', 500):
+        return
+
+    top = top_statements(profile['statements'])
+    _slow_requests.appendleft({
+        'at': time.time(),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'elapsed': elapsed,
+        'sql_count': profile['sql_count'],
+        'sql_time': profile['sql_time'],
+        'template_time': profile['template_time'],
+        'top_statements': [(s[:STATEMENT_PREVIEW_CHARS], count, total) for s, count, total in top]
+    })
+    lines = [
+        f"Slow request {request.method} {request.path} ({request.endpoint}): {elapsed * 1000:.0f} ms, "
+        f"{profile['sql_count']} SQL statements in {profile['sql_time'] * 1000:.0f} ms, "
+        f"templates {profile['template_time'] * 1000:.0f} ms"
+    ]
+    for statement, count, total in top:
+        preview = ' '.join(statement.split())[:STATEMENT_PREVIEW_CHARS]
+        lines.append(f"  {total * 1000:.1f} ms x{count}: {preview}")
+    app.logger.warning('\n'.join(lines))
+
+
+def init_profiling(app):
+    """Hook the profiler into the app. Call inside an app context."""
+    event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    app.before_request(_start_request)
+    app.teardown_request(lambda exc: _finish_request(app))
+
+
+def endpoint_stats():
+    """A snapshot of the per-endpoint stats, most total time first."""
+    with _lock:
+        stats = list(_endpoints.values())
+    return sorted(stats, key=lambda s: s.total_time, reverse=True)
+
+
+def slow_requests():
+    return list(_slow_requests)
+
+
+def stats_since():
+    return _state['since']
+
+
+def reset_stats():
+    with _lock:
+        _endpoints.clear()
+        _slow_requests.clear()
+        _state['since'] = time.time()
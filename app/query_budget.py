@@ -0,0 +1,53 @@
+"""
+Per-route SQL statement budgets.
+
+Views declare the most statements one request may issue, next to the
+route:
+
+    @app.route('/admin/orders')
+    @login_required
+    @query_budget(6, role='admin')
+    def admin_orders():
+
+`role` says who the request is made as ('customer', 'admin' or None for
+anonymous) and any keyword arguments are sample URL values, e.g.
+@query_budget(4, product_id=1); values that are not part of the route
+become the query string. `status` is the response the request should get,
+302 for the GET routes that change something and redirect (logout, cart
+removals). `method='POST'` budgets a form post instead; the only one,
+place_order, is measured by placing the customer's cart, refilled before
+each request. benchmarks/query_budgets.py requests every budgeted route
+against synthetic data at two sizes and fails if a route goes over its
+budget or issues more statements on the larger data set, which is how an
+N+1 query in a template, or a query per order line, shows up. It also
+fails on any GET route without a budget, unless the route is marked with
+@no_query_budget and a reason (the Google sign-in routes, which need
+Google). With PROFILING_ENABLED requests over budget are also logged as
+they happen.
+"""
+from collections import namedtuple
+
+QueryBudget = namedtuple('QueryBudget', ['endpoint', 'limit', 'role', 'method', 'status', 'url_values'])
+
+QUERY_BUDGETS = {}
+NO_QUERY_BUDGET = {}
+
+
+def query_budget(limit, role=None, method='GET', status=200, **url_values):
+    """Register `limit` as the statement budget of the decorated view."""
+    def decorator(view):
+        QUERY_BUDGETS[view.__name__] = QueryBudget(view.__name__, limit, role, method, status, url_values)
+        return view
+    return decorator
+
+
+def no_query_budget(reason):
+    """Exempt the decorated GET view from the budget check, saying why."""
+    def decorator(view):
+        NO_QUERY_BUDGET[view.__name__] = reason
+        return view
+    return decorator
+
+
+def budget_for(endpoint):
+    return QUERY_BUDGETS.get(endpoint)
@@ -0,0 +1,142 @@
+"""
+EXPLAIN checks for the hot queries in routes.py.
+
+Each entry below rebuilds the query a route runs (same filters and
+ordering, with sample values) and names the index it must use. `flask
+check-query-plans` asks the database for each plan and fails if a table
+is read with a full scan or the expected index is not chosen. Run it
+after `flask db upgrade` whenever a query or an index changes.
+
+SQLite (EXPLAIN QUERY PLAN) and MySQL (EXPLAIN) are supported. The
+planner also looks at table statistics, so run it against a database with
+realistic data; on a nearly empty table MySQL may prefer a scan.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from app import db
+from app.models import Customer, Order, OrderItem, Product, Review, Voucher
+
+SAMPLE_CURSOR = (datetime(2025, 1, 1), 1000)
+
+
+def _admin_orders():
+    return Order.query.order_by(Order.order_date.desc(), Order.order_id.desc()).limit(51)
+
+
+def _admin_orders_by_status():
+    ts, order_id = SAMPLE_CURSOR
+    return Order.query.filter(Order.status == 'Pending Approval')\
+        .filter(or_(Order.order_date < ts, and_(Order.order_date == ts, Order.order_id < order_id)))\
+        .order_by(Order.order_date.desc(), Order.order_id.desc()).limit(51)
+
+
+def _client_orders():
+    return Order.query.filter_by(customer_id=1)\
+        .order_by(Order.order_date.desc(), Order.order_id.desc()).limit(21)
+
+
+def _order_items_for_page():
+    return OrderItem.query.filter(OrderItem.order_id.in_([1, 2, 3]))
+
+
+def _gcash_verifications():
+    return Order.query.filter(
+        Order.payment_method == 'GCash',
+        Order.payment_status == 'Pending Verification'
+    ).order_by(Order.order_date.asc())
+
+
+def _discount_verifications():
+    return Customer.query.filter(Customer.discount_status == 'Pending')\
+        .order_by(Customer.registration_date.desc())
+
+
+def _product_in_orders():
+    return OrderItem.query.filter_by(product_id=1).limit(1)
+
+
+def _variant_in_orders():
+    return OrderItem.query.filter_by(variant_id=1).limit(1)
+
+
+def _has_reviewed_product():
+    return Review.query.filter_by(customer_id=1, product_id=1).limit(1)
+
+
+def _reviewed_product_ids():
+    return db.session.query(Review.product_id).filter(Review.customer_id == 1)
+
+
+def _products_in_category():
+    return Product.query.filter_by(category_id=1).order_by(Product.name.asc())
+
+
+def _apply_voucher():
+    return Voucher.query.filter_by(code='SALE10', is_active=True).limit(1)
+
+
+# (description, table, expected index or None for "any index", query builder)
+HOT_QUERIES = [
+    ('admin_orders: newest first', 'Orders', 'ix_orders_order_date', _admin_orders),
+    ('admin_orders: status filter, next page', 'Orders', 'ix_orders_status_order_date', _admin_orders_by_status),
+    ('client_orders: customer, newest first', 'Orders', 'ix_orders_customer_order_date', _client_orders),
+    ('order pages: items of the listed orders', 'Order_Items', 'ix_order_items_order_id', _order_items_for_page),
+    ('admin_verifications: GCash payments', 'Orders', 'ix_orders_payment_method_status', _gcash_verifications),
+    ('admin_verifications: discount IDs', 'Customers', 'ix_customers_discount_status_registration', _discount_verifications),
+    ('admin_delete_product: product in orders', 'Order_Items', 'ix_order_items_product_id', _product_in_orders),
+    ('admin_delete_variant: variant in orders', 'Order_Items', 'ix_order_items_variant_id', _variant_in_orders),
+    ('has_reviewed_product', 'Reviews', None, _has_reviewed_product),
+    ('client_orders: reviewed products', 'Reviews', None, _reviewed_product_ids),
+    ('admin_products: category filter', 'Products', 'ix_products_category_active_name', _products_in_category),
+    ('apply_voucher: code lookup', 'Vouchers', None, _apply_voucher),
+]
+
+
+def explain(query):
+    """The plan rows for an ORM query, as a list of dicts."""
+    bind = db.session.get_bind()
+    sql = str(query.statement.compile(dialect=bind.dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if bind.dialect.name == 'sqlite' else 'EXPLAIN '
+    result = db.session.execute(db.text(prefix + sql))
+    return [dict(row._mapping) for row in result]
+
+
+def _check_sqlite(plan, table, index_name):
+    details = [row['detail'] for row in plan]
+    for detail in details:
+        words = detail.split()
+        if words[:2] == ['SCAN', table] and 'INDEX' not in words:
+            return f"full scan: {detail}"
+    uses = [d for d in details if table in d.split() and 'INDEX' in d.split()]
+    if not uses:
+        return "no index used: " + '; '.join(details)
+    if index_name and not any(index_name in d.split() for d in uses):
+        return f"expected {index_name}, got: " + '; '.join(uses)
+    return None
+
+
+def _check_mysql(plan, table, index_name):
+    rows = [row for row in plan if row.get('table') == table]
+    for row in rows:
+        if row.get('type') == 'ALL':
+            return f"full scan of {table}"
+    keys = [row.get('key') for row in rows if row.get('key')]
+    if not keys:
+        return f"no index used on {table}"
+    if index_name and index_name not in keys:
+        return f"expected {index_name}, got: {', '.join(keys)}"
+    return None
+
+
+def check_query_plans():
+    """Return [(description, problem or None, plan)] for every hot query."""
+    dialect = db.session.get_bind().dialect.name
+    check = _check_sqlite if dialect == 'sqlite' else _check_mysql
+
+    results = []
+    for description, table, index_name, build in HOT_QUERIES:
+        plan = explain(build())
+        results.append((description, check(plan, table, index_name), plan))
+    return results
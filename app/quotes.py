@@ -0,0 +1,137 @@
+"""
+Checkout quotes: order totals for a customer's cart, memoized per cart version.
+
+A quote depends on the cart lines, catalog prices, the applied voucher,
+the delivery fee and the customer's discount status. Cart changes and
+discount-status changes bump Cart_States.version (see
+cart_store.bump_cart_version); the voucher and delivery fee come from the
+session and the prices from the catalog version. All of these go into the
+quote key, and the last quote is stored with its key, so repeated views
+of the cart and checkout pages reuse it without reloading the Customer.
+"""
+import json
+
+from flask import session
+from sqlalchemy import update
+
+from app import db
+from app.catalog import get_catalog
+from app.models import Customer, CartState
+from app.upsert import update_or_insert
+from app import cart_store
+
+VAT_RATE = 0.12
+DISCOUNT_RATE = 0.20
+
+
+def calculate_order_totals(cart_items, customer, delivery_fee=0.0, voucher_code=None, voucher_percent=0.0):
+    
+    gross_subtotal = 0.0
+    max_item_price = 0.0
+    
+    for item in cart_items:
+        price = float(item['price'])
+        quantity = int(item['quantity'])
+        gross_subtotal += price * quantity
+        
+        if price > max_item_price:
+            max_item_price = price
+
+    vatable_sales = gross_subtotal
+    vat_exempt_sales = 0.0
+    discount_amount = 0.0
+    vat_amount = 0.0
+    
+    if customer and customer.is_verified_discount and customer.discount_status == 'Approved':
+        vat_exempt_sales = max_item_price
+        vatable_sales = gross_subtotal - vat_exempt_sales
+        
+        discount_amount = vat_exempt_sales * DISCOUNT_RATE
+        
+        vat_amount = vatable_sales * VAT_RATE
+        
+    elif voucher_code and voucher_percent > 0:
+        discount_amount = gross_subtotal * (voucher_percent / 100)
+        
+        net_vatable_sales = gross_subtotal - discount_amount
+        vat_amount = net_vatable_sales * VAT_RATE
+        
+        vatable_sales = gross_subtotal
+        
+    else:
+        vat_amount = vatable_sales * VAT_RATE
+    
+    final_total = vatable_sales + vat_amount + vat_exempt_sales - discount_amount + delivery_fee
+    
+    return {
+        'subtotal': gross_subtotal,
+        'vatable_sales': vatable_sales,
+        'vat_exempt_sales': vat_exempt_sales,
+        'vat_amount': vat_amount,
+        'discount_amount': discount_amount,
+        'final_total': final_total
+    }
+
+
+def _quote_key(version, catalog_version, voucher_code, voucher_percent, delivery_fee):
+    return f"{version}:{catalog_version}:{voucher_code or ''}:{voucher_percent}:{delivery_fee}"
+
+
+def get_quote(customer_id, cart_items=None):
+    """
+    The checkout quote for the customer's cart and current session choices.
+
+    Returns the calculate_order_totals() fields plus delivery_fee,
+    discount_source ('discount', 'voucher' or None), discount_type,
+    voucher_code, item_count and cart_version. Pass `cart_items` when the
+    caller has already loaded the lines. A fresh quote is written to
+    Cart_States in the current transaction; the caller commits.
+    """
+    voucher_code = session.get('voucher_code')
+    voucher_percent = session.get('discount_percentage', 0.0)
+    delivery_fee = session.get('delivery_fee', 0.0)
+
+    state = db.session.get(CartState, customer_id)
+    version = state.version if state else 0
+    key = _quote_key(version, get_catalog().version, voucher_code, voucher_percent, delivery_fee)
+    if state is not None and state.quote_key == key:
+        return json.loads(state.quote_json)
+
+    if cart_items is None:
+        cart_items = cart_store.get_lines(customer_id)
+    customer = db.session.get(Customer, customer_id)
+
+    quote = calculate_order_totals(cart_items, customer, delivery_fee, voucher_code, voucher_percent)
+    has_discount = bool(customer and customer.is_verified_discount and customer.discount_status == 'Approved')
+    if has_discount:
+        discount_source = 'discount'
+    elif voucher_code and voucher_percent > 0:
+        discount_source = 'voucher'
+    else:
+        discount_source = None
+
+    quote.update({
+        'delivery_fee': delivery_fee,
+        'discount_source': discount_source,
+        'discount_type': customer.discount_type if has_discount else None,
+        'voucher_code': voucher_code if discount_source == 'voucher' else None,
+        'item_count': sum(int(item['quantity']) for item in cart_items),
+        'cart_version': version
+    })
+
+    # Only store the quote if the cart has not changed underneath us
+    store_quote = (
+        update(CartState)
+        .where(CartState.customer_id == customer_id, CartState.version == version)
+        .values(quote_key=key, quote_json=json.dumps(quote))
+    )
+    if state is None:
+        # A concurrent request may create the row first; the UPDATE then
+        # stores the quote only if that row is still at version 0
+        update_or_insert(
+            store_quote,
+            lambda: CartState(customer_id=customer_id, version=0, quote_key=key, quote_json=json.dumps(quote))
+        )
+    else:
+        db.session.execute(store_quote)
+    return quote
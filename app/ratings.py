@@ -0,0 +1,73 @@
+"""
+Maintenance of the per-product rating aggregates in Product_Ratings.
+All helpers work inside the caller's transaction; the caller commits.
+"""
+from sqlalchemy import update, func
+
+from app import db
+from app.models import ProductRating, Review
+from app.upsert import update_or_insert
+
+
+def _star_column(rating):
+    return getattr(ProductRating, f'stars_{int(rating)}')
+
+
+def record_review(product_id, rating):
+    """Add one review's rating to the product's aggregate row."""
+    star_column = _star_column(rating)
+
+    def new_aggregate():
+        aggregate = ProductRating(
+            product_id=product_id,
+            rating_sum=rating,
+            review_count=1,
+            stars_1=0, stars_2=0, stars_3=0, stars_4=0, stars_5=0
+        )
+        setattr(aggregate, f'stars_{int(rating)}', 1)
+        return aggregate
+
+    update_or_insert(
+        update(ProductRating)
+        .where(ProductRating.product_id == product_id)
+        .values({
+            ProductRating.rating_sum: ProductRating.rating_sum + rating,
+            ProductRating.review_count: ProductRating.review_count + 1,
+            star_column: star_column + 1
+        }),
+        new_aggregate
+    )
+
+
+def delete_product_rating(product_id):
+    ProductRating.query.filter_by(product_id=product_id).delete()
+
+
+def rebuild_product_ratings():
+    """Recompute every aggregate row from the Reviews table (backfill)."""
+    ProductRating.query.delete()
+
+    rows = db.session.query(
+        Review.product_id,
+        Review.rating,
+        func.count(Review.review_id)
+    ).group_by(Review.product_id, Review.rating).all()
+
+    aggregates = {}
+    for product_id, rating, count in rows:
+        aggregate = aggregates.get(product_id)
+        if aggregate is None:
+            aggregate = ProductRating(
+                product_id=product_id,
+                rating_sum=0,
+                review_count=0,
+                stars_1=0, stars_2=0, stars_3=0, stars_4=0, stars_5=0
+            )
+            aggregates[product_id] = aggregate
+        aggregate.rating_sum += rating * count
+        aggregate.review_count += count
+        if 1 <= rating <= 5:
+            setattr(aggregate, f'stars_{rating}', getattr(aggregate, f'stars_{rating}') + count)
+
+    db.session.add_all(aggregates.values())
+    return len(aggregates)
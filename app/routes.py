@@ -1,93 +1,123 @@
 from app import db
 import os
 import io
-import secrets
 import csv
 import pandas as pd
-import xml.etree.ElementTree as ET
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, cast, Integer
-from PIL import Image
+from sqlalchemy import func, cast, Integer, insert, update
+from sqlalchemy.exc import IntegrityError
 from flask_dance.contrib.google import google
-from xml.dom import minidom
 from flask import make_response, jsonify
 from flask import current_app as app
-from flask import render_template, redirect, url_for, flash, request, session, jsonify, current_app
+from flask import render_template, redirect, url_for, flash, request, session, jsonify, current_app, abort, Response, stream_with_context, send_from_directory
 from flask_login import login_user, logout_user, current_user, login_required
-from app.models import User, Category, Product, ProductVariant, Voucher, Customer, Order, OrderItem, Review
-from app.forms import AdminLoginForm, CategoryForm, ProductForm, VariantForm, VoucherForm, UserAddForm, UserEditForm, CustomerRegisterForm, CustomerLoginForm, CustomerEditForm, CustomerProfileForm, DiscountVerificationForm, ReviewForm
+from app.models import User, Category, Product, ProductVariant, Voucher, Customer, Order, OrderItem, Review, ProductRating, ProductSalesDaily, ProductSalesTotal, SalesDaily, SalesDailyVariant, CartItem, CartState, VoucherRedemption, VoucherBatch
+from app.catalog import CATEGORY_ORDER, category_rank, get_catalog, get_ratings, bump_catalog_version
+from app.ratings import record_review, delete_product_rating
+from app.pagination import keyset_paginate
+from app.importers import import_products_csv, write_error_report
+from app.exports import order_export_query, stream_orders_jsonl, stream_orders_json_array, stream_menu_xml, stream_voucher_batch_csv
+from app.leaderboard import LEADERBOARD_WINDOWS, top_products
+from app import leaderboard, sales_rollup, cart_store
+from app.forms import AdminLoginForm, CategoryForm, ProductForm, VariantForm, VoucherForm, VoucherBatchForm, UserAddForm, UserEditForm, CustomerRegisterForm, CustomerLoginForm, CustomerEditForm, CustomerProfileForm, DiscountVerificationForm, ReviewForm
 from functools import wraps
-from threading import Thread
-from flask_mail import Message
+from app.mailer import queue_email
+from app.images import save_upload, upload_status, product_image_srcset, product_image_url
+from app.upload_store import retain_upload, release_upload, replace_upload, product_image_path, rebuild_upload_refs
+from app.quotes import get_quote
+from app.query_budget import query_budget, no_query_budget
+from app.vouchers import VoucherUnavailableError, check_voucher, redeem_voucher, generate_voucher_batch, has_uses_left, remove_order_redemptions, remove_voucher_redemptions
 from flask_login import login_user as login_customer 
 from sqlalchemy import func, cast, Integer
-from app import mail
 from app.forms import RequestResetForm, ResetPasswordForm, GCashPaymentForm
 from flask import make_response, jsonify, current_app as app, render_template, redirect, url_for, flash, request, session, jsonify, current_app, get_flashed_messages
 
-VAT_RATE = 0.12
 MAIN_CATEGORIES = ['Pork', 'Beef', 'Chicken', 'Seafood']
+ADMIN_ORDERS_PER_PAGE = 50
+CLIENT_ORDERS_PER_PAGE = 20
 
-CATEGORY_ORDER = [
-    'Beef',
-    'Pork',
-    'Chicken',
-    'Seafood',
-    'Pasta & Noodles',
-    'Noodles',
-    'Vegetables',
-    'Dessert',
-    'Drinks'
-]
+def add_order_items(order, cart_items):
+    """
+    Insert the order's items in one executemany statement.
+    Returns transient OrderItems for the sales rollups.
+    """
+    rows = [
+        {
+            'order_id': order.order_id,
+            'product_id': item_data['product_id'],
+            'variant_id': item_data['variant_id'],
+            'quantity': item_data['quantity'],
+            'price_per_item': item_data['price']
+        }
+        for item_data in cart_items
+    ]
+    db.session.execute(insert(OrderItem), rows)
+    return [OrderItem(**row) for row in rows]
+
+def order_placed_response(order):
+    """Clear the checkout state from the session and confirm the order."""
+    keys_to_clear = ['voucher_code', 'discount_percentage', 'delivery_fee', 
+                     'order_type', 'delivery_address', 
+                     'buffet_recommendations', 'buffet_sequence', 
+                     'event_date_str', 'event_time_str', 'payment_method', 
+                     'gcash_image_file', 'gcash_reference_no', 'final_total']
+    for key in keys_to_clear:
+        session.pop(key, None)
 
-def calculate_order_totals(cart_items, customer, delivery_fee=0.0, voucher_code=None, voucher_percent=0.0):
-    
-    gross_subtotal = 0.0
-    max_item_price = 0.0
-    
-    for item in cart_items:
-        price = float(item['price'])
-        quantity = int(item['quantity'])
-        gross_subtotal += price * quantity
-        
-        if price > max_item_price:
-            max_item_price = price
+    return jsonify({
+        'status': 'success',
+        'message': f"Order #{order.order_id} has been placed!",
+        'redirect_url': url_for('client_orders')
+    })
 
-    vatable_sales = gross_subtotal
-    vat_exempt_sales = 0.0
-    discount_amount = 0.0
-    vat_amount = 0.0
-    
-    if customer and customer.is_verified_discount and customer.discount_status == 'Approved':
-        vat_exempt_sales = max_item_price
-        vatable_sales = gross_subtotal - vat_exempt_sales
-        
-        discount_amount = vat_exempt_sales * 0.20
-        
-        vat_amount = vatable_sales * 0.12
-        
-    elif voucher_code and voucher_percent > 0:
-        discount_amount = gross_subtotal * (voucher_percent / 100)
-        
-        net_vatable_sales = gross_subtotal - discount_amount
-        vat_amount = net_vatable_sales * 0.12
-        
-        vatable_sales = gross_subtotal
-        
-    else:
-        vat_amount = vatable_sales * 0.12
+def count_order_placed(order):
+    if current_app.config.get('METRICS_ENABLED'):
+        from app.metrics import ORDERS_PLACED
+        ORDERS_PLACED.labels(status=order.status, payment_method=order.payment_method).inc()
+
+def count_cart_add(basket):
+    if current_app.config.get('METRICS_ENABLED'):
+        from app.metrics import CART_ADDS
+        CART_ADDS.labels(basket=basket).inc()
+
+def record_order_placed(order, items):
+    """Count a new order in the best-seller and daily sales tables."""
+    if leaderboard.is_counted(order.status):
+        leaderboard.record_order_sales(order, items=items)
+    sales_rollup.record_order(order, items=items)
+
+def record_order_status_change(order, old_status, new_status):
     
-    final_total = vatable_sales + vat_amount + vat_exempt_sales - discount_amount + delivery_fee
+    leaderboard.apply_status_change(order, old_status, new_status)
+    sales_rollup.apply_status_change(order, old_status, new_status)
+
+def change_order_status(order, new_status):
+    """
+    Move the order to `new_status` if it still has the status it was loaded
+    with, and adjust the sales tables. Returns False, changing nothing, when
+    a concurrent request (another admin, a double submit) changed it first,
+    so the same transition is never counted twice.
+    """
+    old_status = order.status
+    result = db.session.execute(
+        update(Order)
+        .where(Order.order_id == order.order_id, Order.status == old_status)
+        .values(status=new_status)
+    )
+    if result.rowcount != 1:
+        return False
+    record_order_status_change(order, old_status, new_status)
+    return True
+
+def record_order_removed(order):
     
-    return {
-        'subtotal': gross_subtotal,
-        'vatable_sales': vatable_sales,
-        'vat_exempt_sales': vat_exempt_sales,
-        'vat_amount': vat_amount,
-        'discount_amount': discount_amount,
-        'final_total': final_total
-    }
+    if leaderboard.is_counted(order.status):
+        leaderboard.record_order_sales(order, sign=-1)
+    sales_rollup.record_order(order, sign=-1)
+
+app.add_template_global(product_image_srcset)
+app.add_template_global(product_image_url)
 
 def get_category_choices():
     
@@ -97,41 +127,14 @@ def get_category_choices():
 
 def save_picture(form_picture):
     """
-    Helper function to save an uploaded picture.
-    FIXED: Uses file stream explicitly and ensures the products directory exists.
+    Helper function to save an uploaded product picture.
+    The resized file is written in the background; see app/images.py.
     """
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(app.config['UPLOAD_FOLDER'], 'products', picture_fn)
-
-    os.makedirs(os.path.dirname(picture_path), exist_ok=True)
-
-    output_size = (800, 800) 
-    
-    form_picture.stream.seek(0) 
-    i = Image.open(form_picture.stream) 
-    
-    i.thumbnail(output_size)
-    i.save(picture_path)
-
-    return picture_fn
+    return save_upload(form_picture, 'products', derivatives=True)
 
 def save_payment_receipt(form_picture):
     
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    
-    picture_path = os.path.join(app.config['UPLOAD_FOLDER'], 'payments', picture_fn)
-
-    os.makedirs(os.path.dirname(picture_path), exist_ok=True)
-
-    output_size = (800, 800)
-    i = Image.open(form_picture)
-    i.thumbnail(output_size)
-    i.save(picture_path)
-
+    picture_fn = save_upload(form_picture, 'payments')
     return f"payments/{picture_fn}"
 
 def customer_login_required(f):
@@ -153,6 +156,7 @@ def has_reviewed_product(customer_id, product_id):
     ).first() is not None
 
 @app.route('/login/google/complete') # Matches the redirect_to in __init__.py
+@no_query_budget("Needs a Google token")
 def google_login_complete():
     # 'google' is the Flask-Dance object
     if not google.authorized:
@@ -213,73 +217,67 @@ def google_login_complete():
         flash(f"An error occurred during Google login: {e}", 'danger')
         return redirect(url_for('client_account_page'))
 @app.route('/')
+@query_budget(2)
 def client_home():
     
-    top_product_ids = db.session.query(
-            OrderItem.product_id,
-            func.sum(OrderItem.quantity).label('total_sold')
-        ).group_by(OrderItem.product_id)\
-         .order_by(func.sum(OrderItem.quantity).desc())\
-         .limit(3)\
-         .all()
-
-    product_ids = [pid for pid, total in top_product_ids]
-    popular_products = Product.query.filter(
-        Product.product_id.in_(product_ids),
-        Product.is_active == True
-    ).all()
+    catalog = get_catalog()
+    popular_products = []
+    for product_id, total_sold in top_products(limit=3):
+        product = catalog.products_by_id.get(product_id)
+        if product and product.is_active:
+            popular_products.append(product)
 
     return render_template(
         'client_home.html',
         popular_products=popular_products
     )
 
+@app.route('/api/best-sellers')
+@query_budget(2)
+def api_best_sellers():
+    
+    window = request.args.get('window', '30d')
+    if window not in LEADERBOARD_WINDOWS:
+        return jsonify({'status': 'error', 'message': f"Unknown window '{window}'."}), 400
+
+    limit = min(max(request.args.get('limit', 3, type=int), 1), 20)
+    catalog = get_catalog()
+
+    results = []
+    for product_id, total_sold in top_products(days=LEADERBOARD_WINDOWS[window], limit=limit):
+        product = catalog.products_by_id.get(product_id)
+        if product is None:
+            continue
+        results.append({
+            'product_id': product_id,
+            'name': product.name,
+            'total_sold': total_sold,
+            'is_active': product.is_active
+        })
+
+    return jsonify({'status': 'success', 'window': window, 'products': results})
+
 @app.route('/menu')
+@query_budget(2, role='customer')
 def client_menu():
     
     category_id = request.args.get('category_id', type=int)
     
-    categories = Category.query.filter_by(is_active=True).all()
-    
-    def get_sort_index(cat_name):
-        
-        try:
-            return CATEGORY_ORDER.index(cat_name)
-        except ValueError:
-            return 999 
-
-    categories.sort(key=lambda c: get_sort_index(c.name))
+    catalog = get_catalog()
+    categories = catalog.active_categories()
     
     selected_category = None
-    product_query = Product.query.join(Category).filter(
-        Category.is_active == True,
-        Product.is_active == True
-    )
-
     if category_id:
-        product_query = product_query.filter(Product.category_id==category_id)
-        selected_category = Category.query.get(category_id)
+        selected_category = catalog.categories_by_id.get(category_id)
 
-    products = product_query.order_by(Product.name.asc()).all()
-    
-    product_ids = [p.product_id for p in products]
-    
-    ratings_query = db.session.query(
-        Review.product_id,
-        func.avg(Review.rating).label('average_rating'),
-        func.count(Review.review_id).label('review_count')
-    ).filter(Review.product_id.in_(product_ids))\
-     .group_by(Review.product_id)\
-     .all()
-     
-    ratings_map = {item.product_id: {'avg': float(item.average_rating), 'count': item.review_count} for item in ratings_query}
+    products = catalog.menu_products(category_id)
 
     return render_template(
         'client_menu.html',
         categories=categories,
         products=products,
-        selected_category=selected_category,
-        ratings_map=ratings_map
+        ratings=get_ratings(),
+        selected_category=selected_category
     )
 
 
@@ -306,6 +304,7 @@ def admin_add_category():
         
         db.session.add(new_category)
         try:
+            bump_catalog_version()
             db.session.commit()
             flash(f"Category '{new_category.name}' added successfully.", 'success')
         except Exception as e:
@@ -337,6 +336,7 @@ def admin_delete_category(category_id):
 
     try:
         db.session.delete(category)
+        bump_catalog_version()
         db.session.commit()
         flash(f"Category '{category.name}' has been deleted.", 'success')
     except Exception as e:
@@ -347,6 +347,7 @@ def admin_delete_category(category_id):
 
 @app.route('/my-account/order/<int:order_id>/receipt')
 @customer_login_required
+@query_budget(1, role='customer', order_id=1)
 def client_view_receipt(order_id):
     
     
@@ -368,6 +369,7 @@ def client_view_receipt(order_id):
     )
 
 @app.route('/admin/login', methods=['GET', 'POST'])
+@query_budget(0)
 def admin_login():
     
     
@@ -399,12 +401,14 @@ def admin_login():
 
 @app.route('/my-account')
 @customer_login_required
+@query_budget(0, role='customer', status=302)
 def client_my_account():
     
     return redirect(url_for('client_profile'))
 
 @app.route('/my-account/profile', methods=['GET', 'POST'])
 @customer_login_required
+@query_budget(1, role='customer')
 def client_profile():
     
     customer = Customer.query.get_or_404(session['customer_id'])
@@ -428,7 +432,9 @@ def client_profile():
                     customer.is_verified_discount = False
                     customer.discount_status = None
                     customer.discount_type = None
+                    release_upload(customer.id_image_file)
                     customer.id_image_file = None
+                    cart_store.bump_cart_version(customer.customer_id)
                     flash('Your Senior discount has been revoked as your new birthdate makes you ineligible.', 'warning')
                     
                     profile_updated_message = 'Your profile and discount status have been updated.'
@@ -463,20 +469,36 @@ def client_profile():
 
 @app.route('/my-account/orders')
 @customer_login_required
+@query_budget(3, role='customer')
 def client_orders():
     
     customer_id = session['customer_id']
     
-    
-    orders = Order.query\
-        .filter_by(customer_id=customer_id)\
-        .order_by(Order.order_date.desc())\
+    order_query = Order.query.options(
+        db.selectinload(Order.items).joinedload(OrderItem.product),
+        db.selectinload(Order.items).joinedload(OrderItem.variant)
+    ).filter_by(customer_id=customer_id)
+
+    page = keyset_paginate(
+        order_query,
+        Order.order_date,
+        Order.order_id,
+        CLIENT_ORDERS_PER_PAGE,
+        before=request.args.get('before'),
+        after=request.args.get('after')
+    )
+
+    reviewed_product_ids = {
+        product_id for (product_id,) in db.session.query(Review.product_id)
+        .filter(Review.customer_id == customer_id)
         .all()
+    }
 
     return render_template(
         'client_orders.html',
-        orders=orders,
-        has_reviewed_product=has_reviewed_product
+        orders=page.items,
+        page=page,
+        reviewed_product_ids=reviewed_product_ids
     )
 
 @app.route('/my-account/upload-id', methods=['POST'])
@@ -489,20 +511,8 @@ def client_upload_id():
     if form.validate_on_submit():
         if form.id_image.data:
             try:
-                id_upload_folder = os.path.join(app.config['UPLOAD_FOLDER'], 'ids')
-                if not os.path.exists(id_upload_folder):
-                    os.makedirs(id_upload_folder)
-
-                random_hex = secrets.token_hex(8)
-                _, f_ext = os.path.splitext(form.id_image.data.filename)
-                picture_fn = random_hex + f_ext
-                picture_path = os.path.join(id_upload_folder, picture_fn)
-
-                output_size = (800, 800)
-                i = Image.open(form.id_image.data)
-                i.thumbnail(output_size)
-                i.save(picture_path)
-
+                picture_fn = save_upload(form.id_image.data, 'ids')
+                replace_upload(customer.id_image_file, f"ids/{picture_fn}")
                 customer.id_image_file = f"ids/{picture_fn}"
 
             except Exception as e:
@@ -514,6 +524,7 @@ def client_upload_id():
         customer.discount_status = 'Pending'  
 
         try:
+            cart_store.bump_cart_version(customer.customer_id)
             db.session.commit()
             flash('Your ID has been submitted for verification.', 'success')
         except Exception as e:
@@ -529,6 +540,7 @@ def client_upload_id():
 
 @app.route('/review/product/<int:product_id>', methods=['GET', 'POST'])
 @customer_login_required
+@query_budget(3, role='customer', product_id=1)
 def client_review_product(product_id):
     
     product = Product.query.get_or_404(product_id)
@@ -563,9 +575,14 @@ def client_review_product(product_id):
 
         try:
             db.session.add(new_review)
+            record_review(product_id, new_review.rating)
             db.session.commit()
             flash(f"Thank you for reviewing {product.name}!", 'success')
             return redirect(url_for('client_orders'))
+        except IntegrityError:
+            db.session.rollback()
+            flash("You have already submitted a review for this product.", 'danger')
+            return redirect(url_for('client_orders'))
         except Exception as e:
             db.session.rollback()
             flash(f"Error submitting review: {e}", 'danger')
@@ -584,9 +601,6 @@ def add_to_cart():
         return jsonify({'status': 'login_required', 'url': url_for('client_account_page')})
     
 
-    cart = session.get('cart', {})
-    
-    
     product_id = request.form.get('product_id')
     
     variant_id = request.form.get('variant_id')
@@ -601,37 +615,31 @@ def add_to_cart():
     if not variant_id:
         return jsonify({'status': 'error', 'message': 'No product size selected.'}), 400
         
-    variant = ProductVariant.query.get(variant_id)
+    catalog = get_catalog()
+    variant = catalog.get_variant(variant_id)
     if not variant:
         return jsonify({'status': 'error', 'message': 'Could not find that product option.'}), 404
 
-    product = variant.product 
+    product = catalog.products_by_id[variant.product_id]
 
     if not product.is_active:
         return jsonify({'status': 'error', 'message': 'This product is currently unavailable.'}), 400
     
-    if variant_id in cart:
-        cart[variant_id]['quantity'] += quantity
-    else:
-        cart[variant_id] = {
-            'product_id': product.product_id,
-            'name': product.name,
-            'variant_name': variant.size_name,
-            'price': float(variant.price),
-            'image': product.image_file,
-            'quantity': quantity
-        }
-    
-    session['cart'] = cart
+    cart_store.add_item(session['customer_id'], variant.variant_id, quantity)
+    db.session.commit()
+    count_cart_add(cart_store.CART)
     
     message = f"Added {quantity} x {product.name} ({variant.size_name}) to cart!"
     return jsonify({'status': 'success', 'message': message})
 
 @app.route('/product_details/<int:product_id>')
+@query_budget(3, role='customer', product_id=1)
 def product_details(product_id):
-    product = Product.query.get_or_404(product_id)
+    product = get_catalog().products_by_id.get(product_id)
+    if product is None:
+        abort(404)
 
-    buffet_cart = session.get('buffet_package', {})
+    buffet_cart = cart_store.get_buffet_package(session.get('customer_id'))
 
     variants_data = []
     for variant in product.variants:
@@ -640,58 +648,47 @@ def product_details(product_id):
         variants_data.append({
             'id': variant.variant_id,
             'size': variant.size_name,
-            'price': float(variant.price),
+            'price': variant.price,
             'current_quantity': current_quantity
         })
 
+    rating = get_ratings().get(product.product_id)
+
     return jsonify({
         'id': product.product_id,
         'name': product.name,
         'has_variants': product.has_variants,
+        'rating_avg': round(rating.average, 1) if rating else 0.0,
+        'rating_count': rating.count if rating else 0,
         'variants': variants_data
     })
 
 @app.route('/cart')
 @customer_login_required
+@query_budget(7, role='customer')
 def client_cart():
-    cart_session = session.get('cart', {})
-    cart_items = []
-    
-    
-    for item_id, item_data in cart_session.items():
-        cart_items.append({
-            'product_id': item_data['product_id'],
-            'variant_id': item_id, 
-            'name': item_data['name'],
-            'variant_name': item_data['variant_name'], 
-            'image': item_data['image'],
-            'price': float(item_data['price']), 
-            'quantity': int(item_data['quantity']),
-            'line_total': float(item_data['price']) * int(item_data['quantity']),
-            'is_buffet_item': item_data.get('is_buffet_item', False)
-        })
+    cart_items = cart_store.get_lines(session['customer_id'])
 
     customer = Customer.query.get(session['customer_id'])
     
     
     voucher_code = session.get('voucher_code')
-    voucher_percent = session.get('discount_percentage', 0.0)
 
     
     if customer and customer.is_verified_discount and voucher_code:
         session.pop('voucher_code', None)
         session.pop('discount_percentage', None)
-        voucher_code = None
-        voucher_percent = 0.0
         flash(f"Your verified {customer.discount_type} discount has replaced the voucher.", 'info')
 
     
-    totals = calculate_order_totals(cart_items, customer, 0.0, voucher_code, voucher_percent)
+    totals = get_quote(session['customer_id'], cart_items)
+    db.session.commit()
 
     
     available_vouchers = Voucher.query.filter(
         Voucher.is_active == True,
-        (Voucher.max_uses == None) | (Voucher.current_uses < Voucher.max_uses)
+        Voucher.batch_id == None,
+        has_uses_left()
     ).all()
 
     return render_template(
@@ -710,7 +707,7 @@ def client_cart():
         ala_carte_subtotal=0, 
         buffet_subtotal=0,    
         voucher_discount_amt=0,
-        senior_discount_amt=totals['discount_amount'] if customer.is_verified_discount else 0,
+        senior_discount_amt=totals['discount_amount'] if totals['discount_source'] == 'discount' else 0,
         pwd_discount_amt=0, 
         
         available_vouchers=available_vouchers,
@@ -719,8 +716,10 @@ def client_cart():
 
 @app.route('/cart/clear')
 @customer_login_required
+@query_budget(2, role='customer', status=302)
 def clear_cart():
-    session.pop('cart', None)
+    cart_store.clear(session['customer_id'])
+    db.session.commit()
     session.pop('voucher_code', None)
     session.pop('discount_percentage', None)
     flash("Cart has been cleared.", 'info')
@@ -728,23 +727,19 @@ def clear_cart():
 
 @app.route('/cart/remove/<string:variant_id>')
 @customer_login_required
+@query_budget(4, role='customer', status=302, variant_id='1')
 def remove_from_cart(variant_id):
-    cart = session.get('cart', {})
-
-    item_data = cart.pop(variant_id, None) 
+    item_data = cart_store.remove_item(session['customer_id'], variant_id)
+    db.session.commit()
 
     if item_data:
         flash(f"Removed {item_data['name']} ({item_data['variant_name']}) from cart.", 'info')
 
-    session['cart'] = cart
-
     return redirect(url_for('client_cart'))
 
 @app.route('/cart/update', methods=['POST'])
 @customer_login_required
 def update_cart_quantity():
-    cart = session.get('cart', {})
-
     variant_id = request.form.get('variant_id')
     try:
         quantity = int(request.form.get('quantity'))
@@ -753,11 +748,11 @@ def update_cart_quantity():
     except:
         quantity = 1
 
-    if variant_id in cart:
-        cart[variant_id]['quantity'] = quantity
-        flash(f"Updated {cart[variant_id]['name']} quantity.", 'success')
+    item_data = cart_store.set_quantity(session['customer_id'], variant_id or '', quantity)
+    db.session.commit()
 
-    session['cart'] = cart
+    if item_data:
+        flash(f"Updated {item_data['name']} quantity.", 'success')
 
     return redirect(url_for('client_cart'))
 
@@ -770,71 +765,50 @@ def apply_voucher():
         flash("Please enter a voucher code.", 'danger')
         return redirect(url_for('client_cart'))
 
-    voucher = Voucher.query.filter_by(code=code, is_active=True).first()
-    
-    if voucher:
-        if voucher.max_uses is not None and voucher.current_uses >= voucher.max_uses:
-            flash("This voucher code has reached its maximum usage limit.", 'danger')
-            session.pop('voucher_code', None)
-            session.pop('discount_percentage', None)
-            return redirect(url_for('client_cart'))
-
-        session['voucher_code'] = voucher.code
-        session['discount_percentage'] = float(voucher.discount_percentage)
-        flash(f"Voucher '{voucher.code}' applied successfully!", 'success')
-    else:
+    try:
+        voucher = check_voucher(code, session['customer_id'])
+    except VoucherUnavailableError as e:
         session.pop('voucher_code', None)
         session.pop('discount_percentage', None)
-        flash("Invalid or expired voucher code.", 'danger')
+        flash(str(e), 'danger')
+        return redirect(url_for('client_cart'))
+
+    session['voucher_code'] = voucher.code
+    session['discount_percentage'] = float(voucher.discount_percentage)
+    flash(f"Voucher '{voucher.code}' applied successfully!", 'success')
         
     return redirect(url_for('client_cart'))
 
+def flash_cart_changes(changes):
+    """Tell the customer what revalidation changed in their cart."""
+    for change in changes:
+        line = change['line']
+        label = f"{line['name']} ({line['variant_name']})"
+        if change['reason'] == 'unavailable':
+            flash(f"{label} is no longer available and was removed from your cart.", 'warning')
+        else:
+            flash(f"The price of {label} changed from ₱{change['old_price']:,.2f} to ₱{change['new_price']:,.2f}.", 'warning')
+
 @app.route('/checkout')
 @customer_login_required
+@query_budget(6, role='customer')
 def client_checkout():
     
     
-    cart_session = session.get('cart', {})
-    if not cart_session:
+    cart_items, changes = cart_store.revalidate(session['customer_id'])
+    if changes:
+        db.session.commit()
+        flash_cart_changes(changes)
+    if not cart_items:
         flash("Your cart is empty.", 'info')
         return redirect(url_for('client_cart'))
     if 'order_type' not in session:
         flash("Please select your delivery or pickup option first.", 'info')
         return redirect(url_for('client_checkout_options'))
 
-    
-    cart_items = []
-    calc_items = [] 
-    
-    for item_id, item_data in cart_session.items():
-        if 'name' not in item_data or 'price' not in item_data:
-            continue
-            
-        cart_items.append({
-            'product_id': item_data['product_id'],
-            'variant_id': item_id, 
-            'name': item_data['name'],
-            'variant_name': item_data['variant_name'], 
-            'image': item_data['image'],
-            'price': float(item_data['price']), 
-            'quantity': int(item_data['quantity']),
-            'line_total': float(item_data['price']) * int(item_data['quantity']),
-            'is_buffet_item': item_data.get('is_buffet_item', False)
-        })
-        
-        calc_items.append({
-            'price': float(item_data['price']),
-            'quantity': int(item_data['quantity'])
-        })
-
-
-    customer = Customer.query.get(session['customer_id'])
-    delivery_fee = session.get('delivery_fee', 0.0)
-    voucher_code = session.get('voucher_code')
-    voucher_percent = session.get('discount_percentage', 0.0)
 
-    
-    totals = calculate_order_totals(calc_items, customer, delivery_fee, voucher_code, voucher_percent)
+    totals = get_quote(session['customer_id'], cart_items)
+    db.session.commit()
     
     
     payment_method = session.get('payment_method', 'COD/COP')
@@ -851,7 +825,7 @@ def client_checkout():
         vat_exempt_sales=totals['vat_exempt_sales'],
         vat_amount=totals['vat_amount'],
         total_discount_amount=totals['discount_amount'],
-        delivery_fee=delivery_fee,
+        delivery_fee=totals['delivery_fee'],
         final_total=totals['final_total'],
         
         
@@ -860,16 +834,25 @@ def client_checkout():
         
         
         voucher_discount_amt=0,
-        senior_discount_amt=totals['discount_amount'] if customer.is_verified_discount else 0,
+        senior_discount_amt=totals['discount_amount'] if totals['discount_source'] == 'discount' else 0,
         pwd_discount_amt=0
     )
 
+@app.route('/checkout/quote')
+@customer_login_required
+@query_budget(5, role='customer')
+def checkout_quote():
+    """The current cart's totals as JSON, for refreshing the summary without a page load."""
+    quote = get_quote(session['customer_id'])
+    db.session.commit()
+    return jsonify(quote)
+
 @app.route('/checkout/options', methods=['GET'])
 @customer_login_required
+@query_budget(3, role='customer')
 def client_checkout_options():
     
-    cart_session = session.get('cart', {})
-    if not cart_session:
+    if cart_store.is_empty(session['customer_id']):
         flash("Your cart is empty.", 'info')
         return redirect(url_for('client_cart'))
 
@@ -877,10 +860,8 @@ def client_checkout_options():
     min_days = 3 
     
     
-    for item in cart_session.values():
-        if item.get('is_buffet_item', False):
-            min_days = 7 
-            break
+    if cart_store.has_buffet_items(session['customer_id']):
+        min_days = 7 
             
     
     customer = Customer.query.get(session['customer_id'])
@@ -897,17 +878,15 @@ def client_checkout_options():
 @customer_login_required
 def save_checkout_options():
     
-    cart_session = session.get('cart', {})
-    if not cart_session:
+    cart_items = cart_store.get_lines(session['customer_id'])
+    if not cart_items:
         flash("Your cart is empty.", 'info')
         return redirect(url_for('client_cart'))
 
     
     min_days = 3
-    for item in cart_session.values():
-        if item.get('is_buffet_item', False):
-            min_days = 7
-            break
+    if any(item['is_buffet_item'] for item in cart_items):
+        min_days = 7
 
     
     event_date_str = request.form.get('event_date')
@@ -967,39 +946,16 @@ def save_checkout_options():
     session['payment_method'] = payment_method
 
     
-    if payment_method == 'GCash':
-        
-        cart_items = []
-        for item_id, item_data in cart_session.items():
-            cart_items.append({
-                'price': float(item_data['price']),
-                'quantity': int(item_data['quantity'])
-            })
-        customer = Customer.query.get(session['customer_id'])
-        delivery_fee = session.get('delivery_fee', 0.0)
-        voucher_code = session.get('voucher_code')
-        voucher_percent = session.get('discount_percentage', 0.0)
-        totals = calculate_order_totals(cart_items, customer, delivery_fee, voucher_code, voucher_percent)
+    if payment_method in ('GCash', 'Credit/Debit Card'):
+        # The payment pages show the total before the order is placed
+        totals = get_quote(session['customer_id'], cart_items)
+        db.session.commit()
         session['final_total'] = totals['final_total']
-        
-        
+
+    if payment_method == 'GCash':
         return redirect(url_for('client_gcash_upload'))
     
     elif payment_method == 'Credit/Debit Card':
-        # Calculate totals for card payment page
-        cart_items = []
-        for item_id, item_data in cart_session.items():
-            cart_items.append({
-                'price': float(item_data['price']),
-                'quantity': int(item_data['quantity'])
-            })
-        customer = Customer.query.get(session['customer_id'])
-        delivery_fee = session.get('delivery_fee', 0.0)
-        voucher_code = session.get('voucher_code')
-        voucher_percent = session.get('discount_percentage', 0.0)
-        totals = calculate_order_totals(cart_items, customer, delivery_fee, voucher_code, voucher_percent)
-        session['final_total'] = totals['final_total']
-        
         return redirect(url_for('client_card_payment'))
     
     
@@ -1007,6 +963,7 @@ def save_checkout_options():
 
 @app.route('/checkout/gcash/upload', methods=['GET', 'POST'])
 @customer_login_required
+@query_budget(0, role='customer')
 def client_gcash_upload():
     
     if session.get('payment_method') != 'GCash':
@@ -1044,24 +1001,32 @@ def client_gcash_upload():
 
 @app.route('/checkout/place_order', methods=['POST'])
 @customer_login_required
+@query_budget(30, role='customer', method='POST')
 def place_order():
-    cart_session = session.get('cart', {})
-    if not cart_session:
+    # The checkout page sends one key per attempt; a double click or a retry
+    # after a network error returns the order already placed with that key.
+    idempotency_key = (request.headers.get('Idempotency-Key') or request.form.get('idempotency_key') or '').strip()[:64] or None
+    if idempotency_key:
+        existing_order = Order.query.filter_by(customer_id=session['customer_id'], idempotency_key=idempotency_key).first()
+        if existing_order:
+            return order_placed_response(existing_order)
+
+    cart_items, changes = cart_store.revalidate(session['customer_id'])
+    if changes:
+        # Let the customer review the new total before anything is placed
+        db.session.commit()
+        flash_cart_changes(changes)
+        return jsonify({
+            'status': 'error',
+            'message': "Your cart has changed since you last saw it. Please review your order.",
+            'redirect_url': url_for('client_checkout') if cart_items else url_for('client_cart')
+        }), 409
+    if not cart_items:
         return jsonify({'status': 'error', 'message': "Your cart is empty."}), 400
 
-    
-    valid_cart_items = []
-    for item_id, item_data in cart_session.items():
-        valid_cart_items.append({
-            'price': float(item_data['price']),
-            'quantity': int(item_data['quantity'])
-        })
 
     
-    customer = Customer.query.get(session['customer_id'])
     delivery_fee = session.get('delivery_fee', 0.0)
-    voucher_code = session.get('voucher_code')
-    voucher_percent = session.get('discount_percentage', 0.0)
     
     
     event_date_str = session.get('event_date_str')
@@ -1070,7 +1035,7 @@ def place_order():
     event_time = datetime.strptime(event_time_str, '%H:%M').time() if event_time_str else None
 
     
-    totals = calculate_order_totals(valid_cart_items, customer, delivery_fee, voucher_code, voucher_percent)
+    totals = get_quote(session['customer_id'], cart_items)
 
     
     payment_method = session.get('payment_method', 'COD/COP')
@@ -1115,56 +1080,47 @@ def place_order():
             payment_image_file=gcash_image_file,
             gcash_reference_no=gcash_reference_no,
             card_last_four=session.get('card_last_four'),
-            card_type=session.get('card_type')
+            card_type=session.get('card_type'),
+            idempotency_key=idempotency_key
         )
         db.session.add(new_order)
-        db.session.commit()
+        retain_upload(gcash_image_file)
+        db.session.flush()
 
-        
-        for item_id, item_data in cart_session.items():
-            real_variant_id = item_data.get('variant_id', item_id)
-            if isinstance(real_variant_id, str) and real_variant_id.startswith('buffet_'):
-                final_variant_id = int(real_variant_id.split('_')[1])
-            else:
-                final_variant_id = int(real_variant_id)
-                
-            new_item = OrderItem(
-                order_id=new_order.order_id,
-                product_id=item_data['product_id'],
-                variant_id=final_variant_id,
-                quantity=item_data['quantity'],
-                price_per_item=item_data['price'] 
-            )
-            db.session.add(new_item)
+        order_items = add_order_items(new_order, cart_items)
+        record_order_placed(new_order, order_items)
 
-        
-        if voucher_code:
-            voucher = Voucher.query.filter_by(code=voucher_code).first()
-            if voucher:
-                voucher.current_uses += 1
+        cart_store.clear(session['customer_id'])
+        cart_store.clear(session['customer_id'], cart_store.BUFFET)
 
+        # Last before the commit, so the voucher row is locked as briefly as possible
+        if totals['discount_source'] == 'voucher':
+            redeem_voucher(totals['voucher_code'], session['customer_id'], new_order.order_id)
         db.session.commit()
+        count_order_placed(new_order)
 
-        
-        keys_to_clear = ['cart', 'voucher_code', 'discount_percentage', 'delivery_fee', 
-                         'order_type', 'delivery_address', 'buffet_package', 
-                         'buffet_recommendations', 'buffet_sequence', 
-                         'event_date_str', 'event_time_str', 'payment_method', 
-                         'gcash_image_file', 'gcash_reference_no', 'final_total']
-        for key in keys_to_clear:
-            session.pop(key, None)
+        return order_placed_response(new_order)
 
-        return jsonify({
-            'status': 'success',
-            'message': f"Order #{new_order.order_id} has been placed!",
-            'redirect_url': url_for('client_orders')
-        })
+    except VoucherUnavailableError as e:
+        db.session.rollback()
+        session.pop('voucher_code', None)
+        session.pop('discount_percentage', None)
+        return jsonify({'status': 'error', 'message': f"{e} It has been removed from your cart; please review your total."}), 409
+
+    except IntegrityError:
+        db.session.rollback()
+        # A concurrent request with the same key won the race
+        existing_order = Order.query.filter_by(customer_id=session['customer_id'], idempotency_key=idempotency_key).first() if idempotency_key else None
+        if existing_order:
+            return order_placed_response(existing_order)
+        return jsonify({'status': 'error', 'message': "Could not place the order. Please try again."}), 500
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': f"DB Error: {e}"}), 500
     
 @app.route('/account', methods=['GET'])
+@query_budget(0)
 def client_account_page():
     if 'customer_id' in session:
         return redirect(url_for('client_home'))
@@ -1177,6 +1133,7 @@ def client_account_page():
     )
 
 @app.route('/register', methods=['GET'])
+@query_budget(0)
 def client_register_page():
     if 'customer_id' in session:
         return redirect(url_for('client_home'))
@@ -1189,10 +1146,13 @@ def client_register_page():
     )
 
 @app.route('/logout')
+@query_budget(2, role='customer', status=302)
 def client_logout():
+    if 'customer_id' in session:
+        cart_store.clear(session['customer_id'])
+        db.session.commit()
     session.pop('customer_id', None)
     session.pop('customer_name', None)
-    session.pop('cart', None)
     session.pop('voucher_code', None)
     session.pop('discount_percentage', None)
 
@@ -1249,31 +1209,22 @@ def client_login():
         login_form=login_form
     )
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
-
 def send_reset_email(customer):
     token = customer.get_reset_token()
     
     
     sender_email = current_app.config.get('MAIL_USERNAME') or 'noreply@demo.com'
 
-    msg = Message(
+    queue_email(
         'Password Reset Request',
-        sender=sender_email,
-        recipients=[customer.email]
+        [customer.email],
+        render_template('reset_email.html', customer=customer, token=token),
+        sender=sender_email
     )
-    
-    msg.html = render_template('reset_email.html', customer=customer, token=token)
-    
-    from threading import Thread
-    app = current_app._get_current_object() 
-    thread = Thread(target=send_async_email, args=(app, msg))
-    thread.start()
-    return thread
+    db.session.commit()
 
 @app.route('/forgot-password', methods=['GET', 'POST'])
+@query_budget(0)
 def client_forgot_password():
     if 'customer_id' in session:
         return redirect(url_for('client_home'))
@@ -1289,6 +1240,7 @@ def client_forgot_password():
     return render_template('client_forgot_password.html', form=form)
 
 @app.route('/reset-password/<token>', methods=['GET', 'POST'])
+@query_budget(1, token='set-by-the-harness')
 def client_reset_token(token):
     if 'customer_id' in session:
         return redirect(url_for('client_home'))
@@ -1308,8 +1260,9 @@ def client_reset_token(token):
     return render_template('client_reset_password.html', form=form)
 
 @app.route('/buffet-builder', methods=['GET'])
+@query_budget(1)
 def buffet_wizard_start():
-    categories = Category.query.filter_by(is_active=True).order_by(Category.name.asc()).all()
+    categories = sorted(get_catalog().active_categories(), key=lambda c: c.name)
     return render_template(
         'client_buffet_step1.html',
         categories=categories
@@ -1332,13 +1285,7 @@ def buffet_wizard_reco():
 
     
     
-    def get_sort_index(cat_name):
-        try:
-            return CATEGORY_ORDER.index(cat_name)
-        except ValueError:
-            return 999 
-            
-    selected_categories.sort(key=get_sort_index)
+    selected_categories.sort(key=category_rank)
     
 
     recommendations = {}
@@ -1359,7 +1306,9 @@ def buffet_wizard_reco():
 
     session['buffet_recommendations'] = recommendations
     session['buffet_guest_count'] = guest_count
-    session['buffet_package'] = {}
+    if 'customer_id' in session:
+        cart_store.clear(session['customer_id'], cart_store.BUFFET)
+        db.session.commit()
     
     
     session['buffet_sequence'] = selected_categories
@@ -1368,6 +1317,7 @@ def buffet_wizard_reco():
 
 @app.route('/buffet-builder/select/<string:category_name>', methods=['GET', 'POST'])
 @customer_login_required
+@query_budget(2, role='customer', category_name='Category 1')
 def buffet_wizard_select(category_name):
     recommendations = session.get('buffet_recommendations')
     wizard_sequence = session.get('buffet_sequence')
@@ -1376,13 +1326,13 @@ def buffet_wizard_select(category_name):
         flash("Your buffet session has expired. Please start over.", 'danger')
         return redirect(url_for('buffet_wizard_start'))
 
-    category_obj = Category.query.filter_by(name=category_name, is_active=True).first_or_404()
-    products = Product.query.filter_by(
-        category_id=category_obj.category_id,
-        is_active=True
-    ).order_by(Product.name.asc()).all()
+    catalog = get_catalog()
+    category_obj = catalog.categories_by_name.get(category_name)
+    if category_obj is None or not category_obj.is_active:
+        abort(404)
+    products = catalog.menu_products(category_obj.category_id)
 
-    buffet_package = session.get('buffet_package', {})
+    buffet_package = cart_store.get_buffet_package(session['customer_id'])
     
     
     is_main_category = category_name in MAIN_CATEGORIES
@@ -1459,8 +1409,9 @@ def buffet_wizard_select(category_name):
 
 @app.route('/buffet-builder/checkout', methods=['GET'])
 @customer_login_required
+@query_budget(2, role='customer')
 def buffet_wizard_checkout():
-    buffet_package = session.get('buffet_package', {})
+    buffet_package = cart_store.get_buffet_package(session['customer_id'])
     
     total_price = 0.0
     for item_data in buffet_package.values():
@@ -1476,36 +1427,13 @@ def buffet_wizard_checkout():
 @app.route('/buffet/commit_package', methods=['POST'])
 @customer_login_required
 def buffet_commit_package():
-    buffet_package = session.get('buffet_package', {})
-    if not buffet_package:
+    if not cart_store.commit_buffet_package(session['customer_id']):
         flash("Buffet package is empty. Please start over.", 'danger')
         return redirect(url_for('buffet_wizard_start'))
 
-    main_cart = session.get('cart', {})
-
-    for variant_id, item_data in buffet_package.items():
-        
-        
-        cart_key = f"buffet_{variant_id}"
-
-        if cart_key in main_cart:
-            main_cart[cart_key]['quantity'] += item_data['quantity']
-        else:
-            main_cart[cart_key] = {
-                'product_id': item_data['product_id'],
-                'name': item_data['product_name'],
-                'variant_id': variant_id,
-                'variant_name': item_data['variant_name'],
-                'price': item_data['price'],
-                'image': item_data['image'],
-                'quantity': item_data['quantity'],
-                'is_buffet_item': True
-            }
-
-    session['cart'] = main_cart
+    db.session.commit()
 
     
-    session.pop('buffet_package', None)
     session.pop('buffet_recommendations', None)
     session.pop('buffet_sequence', None)
     session.pop('buffet_guest_count', None)
@@ -1516,23 +1444,20 @@ def buffet_commit_package():
 
 @app.route('/buffet/remove/<string:variant_id>')
 @customer_login_required
+@query_budget(3, role='customer', status=302, variant_id='1')
 def buffet_remove_item(variant_id):
-    buffet_package = session.get('buffet_package', {})
-    
-    item_data = buffet_package.pop(variant_id, None) 
+    item_data = cart_store.remove_item(session['customer_id'], variant_id, cart_store.BUFFET)
+    db.session.commit()
     
     if item_data:
         flash(f"Removed {item_data['product_name']} from your buffet.", 'info')
     
-    session['buffet_package'] = buffet_package
-    
     return redirect(url_for('buffet_wizard_checkout'))
 
 
 @app.route('/buffet/update', methods=['POST'])
 @customer_login_required
 def buffet_update_quantity():
-    buffet_package = session.get('buffet_package', {})
     variant_id = request.form.get('variant_id')
     
     try:
@@ -1542,11 +1467,11 @@ def buffet_update_quantity():
     except:
         quantity = 1
     
-    if variant_id in buffet_package:
-        buffet_package[variant_id]['quantity'] = quantity
-        flash(f"Updated {buffet_package[variant_id]['product_name']} quantity.", 'success')
-        
-    session['buffet_package'] = buffet_package
+    item_data = cart_store.set_quantity(session['customer_id'], variant_id or '', quantity, cart_store.BUFFET)
+    db.session.commit()
+
+    if item_data:
+        flash(f"Updated {item_data['product_name']} quantity.", 'success')
     
     return redirect(url_for('buffet_wizard_checkout'))
 
@@ -1560,21 +1485,22 @@ def buffet_add_item():
     except:
         quantity = 1
 
-    buffet_cart = session.get('buffet_package', {})
+    buffet_cart = cart_store.get_buffet_package(session['customer_id'])
     recommendations = session.get('buffet_recommendations', {})
 
     if not variant_id:
         return jsonify({'status': 'error', 'message': 'No variant selected.'}), 400
 
-    variant = ProductVariant.query.get(variant_id)
+    catalog = get_catalog()
+    variant = catalog.get_variant(variant_id)
     if not variant:
         return jsonify({'status': 'error', 'message': 'Item not found.'}), 404
         
-    product = variant.product
+    product = catalog.products_by_id[variant.product_id]
 
     if not product.is_active:
         return jsonify({'status': 'error', 'message': 'This item is currently unavailable.'}), 400
-    category_name = product.category.name
+    category_name = product.category_name
 
     
     if category_name in MAIN_CATEGORIES:
@@ -1599,25 +1525,13 @@ def buffet_add_item():
         })
 
     
-    if variant_id in buffet_cart:
-        buffet_cart[variant_id]['quantity'] += quantity
-    else:
-        buffet_cart[variant_id] = {
-            'product_id': product.product_id,
-            'product_name': product.name,
-            'variant_name': variant.size_name,
-            'quantity': quantity,
-            'category': category_name,
-            'price': float(variant.price),
-            'image': product.image_file
-        }
+    cart_store.add_item(session['customer_id'], variant.variant_id, quantity, cart_store.BUFFET)
+    db.session.commit()
+    count_cart_add(cart_store.BUFFET)
     
-    session['buffet_package'] = buffet_cart
     
-    
-    new_total_price = 0.0
-    for item in buffet_cart.values():
-        new_total_price += (item['price'] * item['quantity'])
+    new_total_price = sum(item['price'] * item['quantity'] for item in buffet_cart.values())
+    new_total_price += variant.price * quantity
 
     return jsonify({
         'status': 'success',
@@ -1627,52 +1541,48 @@ def buffet_add_item():
 
 @app.route('/buffet/remove_item/<string:variant_id>/<string:category_name>')
 @customer_login_required
+@query_budget(3, role='customer', status=302, variant_id='1', category_name='Category 1')
 def buffet_remove_item_from_package(variant_id, category_name):
-    buffet_package = session.get('buffet_package', {})
-    
-    if variant_id in buffet_package:
-        item_name = buffet_package.pop(variant_id)['product_name']
-        flash(f"Removed {item_name} from your selections.", 'info')
-    
-    session['buffet_package'] = buffet_package
+    item_data = cart_store.remove_item(session['customer_id'], variant_id, cart_store.BUFFET)
+    db.session.commit()
+
+    if item_data:
+        flash(f"Removed {item_data['product_name']} from your selections.", 'info')
     
     return redirect(url_for('buffet_wizard_select', category_name=category_name))
 
 @app.route('/buffet/review')
 @customer_login_required
+@query_budget(0, role='customer', status=302)
 def buffet_review_and_add():
     
     return redirect(url_for('client_cart'))
 
 @app.route('/admin/dashboard')
 @login_required
+@query_budget(7, role='admin')
 def admin_dashboard():
     
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    orders_today_count = Order.query.filter(
-        Order.order_date >= today_start,
-        Order.status != 'Declined'
-    ).count()
+    orders_today_count, _ = sales_rollup.order_totals(today_start.date())
 
     
     month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
-    
-    valid_statuses = ['Approved', 'In Progress', 'Up for Delivery', 'Completed']
-    
-    total_sales_month_query = db.session.query(func.sum(Order.final_amount)).filter(
-        Order.order_date >= month_start,
-        Order.status.in_(valid_statuses)
-    ).scalar()
-    
-    total_sales_month = total_sales_month_query or 0.0
+    _, total_sales_month = sales_rollup.order_totals(
+        month_start.date(),
+        classes=(sales_rollup.CONFIRMED,)
+    )
 
     
     new_customers_month_count = Customer.query.filter(Customer.registration_date >= month_start).count()
 
     
     
-    recent_pending_orders = Order.query.filter_by(status='Pending Approval')\
+    recent_pending_orders = Order.query.options(
+        db.joinedload(Order.customer, innerjoin=True),
+        db.selectinload(Order.items).joinedload(OrderItem.product)
+    ).filter_by(status='Pending Approval')\
         .order_by(Order.event_date.asc())\
         .limit(5)\
         .all()
@@ -1702,6 +1612,7 @@ def verify_admin_password(password_attempt):
 
 @app.route('/admin/logout')
 @login_required
+@query_budget(1, role='admin', status=302)
 def admin_logout():
     logout_user()
     flash('You have been logged out.', 'danger')
@@ -1709,37 +1620,52 @@ def admin_logout():
 
 @app.route('/admin/orders')
 @login_required
+@query_budget(4, role='admin')
 def admin_orders():
     
     status_filter = request.args.get('status')
-    order_query = Order.query.join(Customer).order_by(Order.order_date.desc())
+    order_query = Order.query.options(
+        db.joinedload(Order.customer, innerjoin=True),
+        db.selectinload(Order.items).joinedload(OrderItem.product),
+        db.selectinload(Order.items).joinedload(OrderItem.variant)
+    )
 
     if status_filter:
         order_query = order_query.filter(Order.status == status_filter)
 
-    orders = order_query.all()
-    
-    
+    page = keyset_paginate(
+        order_query,
+        Order.order_date,
+        Order.order_id,
+        ADMIN_ORDERS_PER_PAGE,
+        before=request.args.get('before'),
+        after=request.args.get('after')
+    )
+
+    status_counts = dict(
+        db.session.query(Order.status, func.count(Order.order_id))
+        .group_by(Order.status)
+        .all()
+    )
 
     return render_template(
         'admin_orders.html', 
-        orders=orders, 
+        orders=page.items, 
+        page=page,
+        status_counts=status_counts,
+        total_count=sum(status_counts.values()),
         current_filter=status_filter,
         available_riders=[]
     )
 
 def send_order_email(order, subject, template_name):
-    
-    msg = Message(
+    """Queue a status email; it is delivered once the caller commits."""
+    queue_email(
         subject,
-        recipients=[order.customer.email],
+        [order.customer.email],
+        render_template(template_name, order=order),
         sender=current_app.config.get('MAIL_USERNAME')
     )
-    msg.html = render_template(template_name, order=order)
-    
-    
-    app = current_app._get_current_object()
-    Thread(target=send_async_email, args=(app, msg)).start()
 
 @app.route('/admin/orders/update_status/<int:order_id>', methods=['POST'])
 @login_required
@@ -1752,7 +1678,10 @@ def admin_update_order_status(order_id):
     try:
         if new_status and new_status != order.status:
             old_status = order.status
-            order.status = new_status
+            if not change_order_status(order, new_status):
+                db.session.rollback()
+                flash(f"Order #{order_id} was just updated by someone else. Please review it and try again.", 'warning')
+                return redirect(url_for('admin_orders'))
             
             
             if new_status == 'Declined' and decline_reason:
@@ -1761,10 +1690,6 @@ def admin_update_order_status(order_id):
             
             if new_status == 'Approved':
                 order.decline_reason = None
-
-            db.session.commit()
-            
-            
             
             
             if new_status == 'Approved' and old_status != 'Approved':
@@ -1784,6 +1709,8 @@ def admin_update_order_status(order_id):
             elif new_status == 'Completed' and old_status != 'Completed':
                 send_order_email(order, f"Order #{order.order_id} Completed - Thank You!", 'email_order_completed.html')
 
+            db.session.commit()
+
             flash(f"Order #{order.order_id} updated to '{new_status}' and customer notified.", 'success')
         else:
              flash("No status change submitted.", 'info')
@@ -1801,8 +1728,12 @@ def admin_delete_order(order_id):
     order = Order.query.get_or_404(order_id)
     
     try:
+        record_order_removed(order)
+
         OrderItem.query.filter_by(order_id=order.order_id).delete()
+        remove_order_redemptions(order.order_id)
         
+        release_upload(order.payment_image_file)
         db.session.delete(order)
         db.session.commit()
         flash(f"Order #{order.order_id} has been deleted.", 'success')
@@ -1817,52 +1748,38 @@ def admin_delete_order(order_id):
 
 @app.route('/admin/export/orders_json')
 @login_required
+@query_budget(3, role='admin')
 def admin_export_orders_json():
+    export_format = request.args.get('format', 'json')
+    status_filter = request.args.get('status') or None
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+
     try:
-        orders = Order.query.options(
-            db.joinedload(Order.customer),
-            db.joinedload(Order.items).joinedload(OrderItem.product),
-            db.joinedload(Order.items).joinedload(OrderItem.variant)
-        ).order_by(Order.order_date.desc()).all()
-
-        all_orders_data = []
-
-        for order in orders:
-            order_data = {
-                'order_id': order.order_id,
-                'customer_name': order.customer.name,
-                'customer_email': order.customer.email,
-                'order_date': order.order_date.isoformat(),
-                'total_amount': float(order.total_amount),
-                'discount_amount': float(order.discount_amount),
-                'final_amount': float(order.final_amount),
-                'status': order.status,
-                'items': []
-            }
-
-            for item in order.items:
-                item_data = {
-                    'product_name': item.product.name,
-                    'variant': item.variant.size_name,
-                    'quantity': item.quantity,
-                    'price_per_item': float(item.price_per_item)
-                }
-                order_data['items'].append(item_data)
-
-            all_orders_data.append(order_data)
-
-        response = make_response(jsonify(all_orders_data))
-        response.headers["Content-Disposition"] = "attachment; filename=orders_export.json"
-        response.headers["Content-type"] = "application/json"
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1) if end_date_str else None
+    except ValueError:
+        flash("Invalid date format for export. Use YYYY-MM-DD.", 'danger')
+        return redirect(url_for('admin_orders'))
 
-        return response
+    query = order_export_query(start_date, end_date, status_filter)
 
-    except Exception as e:
-        flash(f"An error occurred while generating the JSON: {e}", 'danger')
-        return redirect(url_for('admin_orders'))
+    if export_format == 'jsonl':
+        body = stream_orders_jsonl(query)
+        mimetype = 'application/x-ndjson'
+        filename = 'orders_export.jsonl'
+    else:
+        body = stream_orders_json_array(query)
+        mimetype = 'application/json'
+        filename = 'orders_export.json'
+
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
 
 @app.route('/admin/categories', methods=['GET'])
 @login_required
+@query_budget(2, role='admin')
 def admin_categories():
     search_query = request.args.get('search')
     
@@ -1892,6 +1809,7 @@ def admin_toggle_product_status(product_id):
     product.is_active = not product.is_active
 
     try:
+        bump_catalog_version()
         db.session.commit()
         if product.is_active:
             flash(f"Product '{product.name}' has been Activated.", 'success')
@@ -1914,6 +1832,7 @@ def admin_edit_category(category_id):
         category.description = edit_form.description.data
 
         try:
+            bump_catalog_version()
             db.session.commit()
             flash(f"Category '{category.name}' updated successfully.", 'success')
         except Exception as e:
@@ -1932,6 +1851,7 @@ def admin_toggle_category_status(category_id):
     category.is_active = not category.is_active
 
     try:
+        bump_catalog_version()
         db.session.commit()
         if category.is_active:
             flash(f"Category '{category.name}' has been Activated.", 'success')
@@ -1946,6 +1866,7 @@ def admin_toggle_category_status(category_id):
 
 @app.route('/admin/products', methods=['GET'])
 @login_required
+@query_budget(3, role='admin')
 def admin_products():
     search_query = request.args.get('search')
     selected_category_id = request.args.get('category', type=int)
@@ -1967,13 +1888,15 @@ def admin_products():
         products=products,
         all_categories=all_categories,
         selected_category_id=selected_category_id,
-        search_query=search_query
+        search_query=search_query,
+        import_report=session.get('import_report')
     )
 
 # app/routes.py (Replace existing admin_add_product function)
 
 @app.route('/admin/products/add', methods=['GET', 'POST'])
 @login_required
+@query_budget(2, role='admin')
 def admin_add_product():
     form = ProductForm()
     form.category.choices = get_category_choices()
@@ -1998,6 +1921,7 @@ def admin_add_product():
             image_file=image_filename 
         )
         db.session.add(new_product)
+        retain_upload(product_image_path(image_filename))
 
         # Logic for simple products (without variants)
         if not new_product.has_variants:
@@ -2013,6 +1937,7 @@ def admin_add_product():
             db.session.add(simple_variant)
 
         try:
+            bump_catalog_version()
             db.session.commit()
             flash(f"Product '{new_product.name}' added successfully.", 'success')
             return redirect(url_for('admin_products'))
@@ -2030,6 +1955,7 @@ def admin_add_product():
 
 @app.route('/admin/products/edit/<int:product_id>', methods=['GET', 'POST'])
 @login_required
+@query_budget(4, role='admin', product_id=1)
 def admin_edit_product(product_id):
     product = Product.query.get_or_404(product_id)
     
@@ -2061,6 +1987,7 @@ def admin_edit_product(product_id):
             try:
                 
                 image_filename = save_picture(form.image.data)
+                replace_upload(product_image_path(product.image_file), product_image_path(image_filename))
                 product.image_file = image_filename
             except Exception as e:
                 flash(f'Error uploading image: {e}', 'danger')
@@ -2095,6 +2022,7 @@ def admin_edit_product(product_id):
                 db.session.add(simple_variant)
 
         try:
+            bump_catalog_version()
             db.session.commit()
             flash(f"Product '{product.name}' updated successfully.", 'success')
             return redirect(url_for('admin_products'))
@@ -2134,6 +2062,7 @@ def admin_delete_product(product_id):
         
         if product.is_active:
             product.is_active = False
+            bump_catalog_version()
             db.session.commit()
             flash(f"'{product.name}' has been deactivated automatically.", 'info')
             
@@ -2143,12 +2072,19 @@ def admin_delete_product(product_id):
     try:
         # FIX ADDED: 1. Delete all associated reviews first to satisfy the Foreign Key Constraint
         Review.query.filter_by(product_id=product_id).delete()
+        delete_product_rating(product_id)
+        leaderboard.delete_product_sales(product_id)
         
-        # Existing: 2. Delete variants
+        # Existing: 2. Delete variants (and any cart lines and sales rollup rows holding them)
+        variant_ids = [v.variant_id for v in product.variants]
+        cart_store.remove_variants(variant_ids)
+        sales_rollup.delete_variant_sales(variant_ids)
         ProductVariant.query.filter_by(product_id=product_id).delete()
         
         # 3. Delete the product itself
+        release_upload(product_image_path(product.image_file))
         db.session.delete(product)
+        bump_catalog_version()
         db.session.commit()
         flash(f"Product '{product.name}' deleted permanently.", 'success')
     except Exception as e:
@@ -2159,45 +2095,17 @@ def admin_delete_product(product_id):
 
 @app.route('/admin/export/products_xml')
 @login_required
+@query_budget(3, role='admin')
 def admin_export_products_xml():
-    try:
-        products = Product.query.options(
-            db.joinedload(Product.category),
-            db.joinedload(Product.variants)
-        ).all()
-
-        root = ET.Element('Menu')
-
-        for product in products:
-            product_elem = ET.SubElement(root, 'Product')
-            product_elem.set('id', str(product.product_id))
-
-            ET.SubElement(product_elem, 'Name').text = product.name
-            ET.SubElement(product_elem, 'Description').text = product.description
-            ET.SubElement(product_elem, 'Category').text = product.category.name
-            ET.SubElement(product_elem, 'HasVariants').text = str(product.has_variants)
+    pretty = request.args.get('pretty', '1') != '0'
 
-            variants_elem = ET.SubElement(product_elem, 'Variants')
-            for variant in product.variants:
-                variant_elem = ET.SubElement(variants_elem, 'Variant')
-                ET.SubElement(variant_elem, 'Size').text = variant.size_name
-                ET.SubElement(variant_elem, 'Price').text = str(variant.price)
-
-        xml_str = minidom.parseString(ET.tostring(root))\
-                         .toprettyxml(indent="    ")
-
-        response = make_response(xml_str)
-        response.headers["Content-Disposition"] = "attachment; filename=menu_export.xml"
-        response.headers["Content-type"] = "application/xml"
-
-        return response
-
-    except Exception as e:
-        flash(f"An error occurred while generating the XML: {e}", 'danger')
-        return redirect(url_for('admin_products'))
+    response = Response(stream_with_context(stream_menu_xml(pretty=pretty)), mimetype='application/xml')
+    response.headers["Content-Disposition"] = "attachment; filename=menu_export.xml"
+    return response
 
 @app.route('/admin/products/<int:product_id>/variants', methods=['GET'])
 @login_required
+@query_budget(3, role='admin', product_id=1)
 def admin_product_variants(product_id):
     product = Product.query.get_or_404(product_id)
     if not product.has_variants:
@@ -2250,6 +2158,7 @@ def admin_add_variant(product_id):
         )
         db.session.add(new_variant)
         try:
+            bump_catalog_version()
             db.session.commit()
             flash(f"Variant '{new_variant.size_name}' added.", 'success')
         except Exception as e:
@@ -2267,8 +2176,15 @@ def admin_delete_variant(variant_id):
     variant = ProductVariant.query.get_or_404(variant_id)
     product_id = variant.product_id
 
+    if OrderItem.query.filter_by(variant_id=variant_id).first():
+        flash(f"Cannot delete variant '{variant.size_name}' because it is part of existing order history.", 'warning')
+        return redirect(url_for('admin_product_variants', product_id=product_id) + '#existing-variants-card')
+
     try:
+        cart_store.remove_variants([variant.variant_id])
+        sales_rollup.delete_variant_sales([variant.variant_id])
         db.session.delete(variant)
+        bump_catalog_version()
         db.session.commit()
         flash(f"Variant '{variant.size_name}' deleted.", 'success')
     except Exception as e:
@@ -2301,6 +2217,7 @@ def admin_edit_variant(variant_id):
         variant.price = edit_form.price.data
         
         try:
+            bump_catalog_version()
             db.session.commit()
             flash(f"Variant '{variant.size_name}' updated successfully.", 'success')
         except Exception as e:
@@ -2328,81 +2245,25 @@ def admin_import_products_csv():
         return redirect(url_for('admin_products'))
 
     if file and file.filename.endswith('.csv'):
+        upsert = request.form.get('upsert') == 'on'
+        session.pop('import_report', None)
         try:
-            stream = io.StringIO(file.stream.read().decode("UTF-8"), newline=None)
-            
-            csv_reader = csv.reader(stream)
-
-            products_added = 0
-            errors = []
-
-            for row_idx, row in enumerate(csv_reader):
-                
-                if not row:
-                    continue
-                
-                
-                if len(row) < 6:
-                    errors.append(f"Row {row_idx + 1}: Skipped (insufficient columns)")
-                    continue
-
-                
-                
-                r_category    = row[0].strip()
-                r_name        = row[1].strip()
-                r_description = row[2].strip()
-                r_has_variant = row[3].strip()
-                r_price       = row[4].strip()
-                r_size        = row[5].strip()
-
-                
-                category = Category.query.filter_by(name=r_category).first()
-                if not category:
-                    errors.append(f"Row {row_idx + 1}: Category '{r_category}' not found.")
-                    continue
-
-                
-                existing_product = Product.query.filter_by(name=r_name).first()
-                if existing_product:
-                    errors.append(f"Row {row_idx + 1}: Product '{r_name}' already exists.")
-                    continue
-
-                
-                has_variants_bool = r_has_variant.lower() == 'true'
-                new_product = Product(
-                    name=r_name,
-                    description=r_description,
-                    category_id=category.category_id,
-                    has_variants=has_variants_bool
-                )
-                db.session.add(new_product)
-
-                
-                if not has_variants_bool:
-                    if not r_price or not r_size:
-                        errors.append(f"Row {row_idx + 1}: Simple product '{r_name}' missing price or size.")
-                        
-                        
-                        continue
-
-                    simple_variant = ProductVariant(
-                        product=new_product,
-                        size_name=r_size,
-                        price=r_price
-                    )
-                    db.session.add(simple_variant)
-
-                products_added += 1
-
+            result = import_products_csv(file, upsert=upsert)
+            bump_catalog_version()
             db.session.commit()
 
-            if products_added > 0:
-                flash(f"Successfully imported {products_added} new products!", 'success')
-            if errors:
-                
-                error_msg = " | ".join(errors[:3])
-                if len(errors) > 3:
-                    error_msg += f" ...and {len(errors)-3} more errors."
+            if result.products_added or result.products_updated:
+                flash(
+                    f"Successfully imported {result.products_added} new products "
+                    f"({result.products_updated} updated, {result.variants_added} sizes added, "
+                    f"{result.variants_updated} sizes re-priced).",
+                    'success'
+                )
+            if result.errors:
+                session['import_report'] = write_error_report(result, import_report_folder())
+                error_msg = " | ".join(f"Row {row_number}: {message}" for row_number, _, message in result.errors[:3])
+                if len(result.errors) > 3:
+                    error_msg += f" ...and {len(result.errors)-3} more errors."
                 flash(f"Import completed with issues: {error_msg}", 'warning')
 
         except Exception as e:
@@ -2413,20 +2274,88 @@ def admin_import_products_csv():
 
     return redirect(url_for('admin_products'))
 
+def import_report_folder():
+    
+    return os.path.join(app.instance_path, 'import_reports')
+
+@app.route('/admin/import/report/<string:token>')
+@login_required
+@query_budget(1, role='admin', token='querybudget')
+def admin_import_report(token):
+    if not token.isalnum():
+        abort(404)
+    return send_from_directory(
+        import_report_folder(),
+        f"{token}.csv",
+        as_attachment=True,
+        download_name='import_errors.csv',
+        mimetype='text/csv'
+    )
+
 @app.route('/admin/vouchers', methods=['GET'])
 @login_required
+@query_budget(4, role='admin')
 def admin_vouchers():
     add_form = VoucherForm()
     edit_form = VoucherForm()
-    vouchers = Voucher.query.order_by(Voucher.code.asc()).all()
+    batch_form = VoucherBatchForm()
+    # Campaign codes are listed per batch, not one row each
+    vouchers = Voucher.query.filter(Voucher.batch_id == None).order_by(Voucher.code.asc()).all()
+
+    batches = VoucherBatch.query.order_by(VoucherBatch.created_at.desc()).all()
+    batch_uses = dict(
+        db.session.query(Voucher.batch_id, func.sum(Voucher.current_uses))
+        .filter(Voucher.batch_id != None)
+        .group_by(Voucher.batch_id)
+        .all()
+    )
 
     return render_template(
         'admin_vouchers.html',
         add_form=add_form,
         edit_form=edit_form,
-        vouchers=vouchers
+        batch_form=batch_form,
+        vouchers=vouchers,
+        batches=batches,
+        batch_uses=batch_uses
     )
 
+@app.route('/admin/vouchers/generate', methods=['POST'])
+@login_required
+def admin_generate_vouchers():
+    batch_form = VoucherBatchForm()
+
+    if batch_form.validate_on_submit():
+        try:
+            batch = generate_voucher_batch(
+                batch_form.name.data,
+                batch_form.code_count.data,
+                batch_form.discount_percentage.data,
+                prefix=batch_form.prefix.data or '',
+                code_length=batch_form.code_length.data
+            )
+            db.session.commit()
+            flash(f"Generated {batch.code_count} voucher codes for '{batch.name}'.", 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Error generating vouchers: {e}", 'danger')
+    else:
+        for field, errors in batch_form.errors.items():
+            for error in errors:
+                field_name = getattr(batch_form, field).label.text
+                flash(f"Error in '{field_name}': {error}", 'danger')
+
+    return redirect(url_for('admin_vouchers') + '#voucher-batches-card')
+
+@app.route('/admin/vouchers/batch/<int:batch_id>/codes.csv')
+@login_required
+@query_budget(3, role='admin', batch_id=1)
+def admin_voucher_batch_csv(batch_id):
+    batch = VoucherBatch.query.get_or_404(batch_id)
+    response = Response(stream_with_context(stream_voucher_batch_csv(batch.batch_id)), mimetype='text/csv')
+    response.headers["Content-Disposition"] = f"attachment; filename=vouchers_batch_{batch.batch_id}.csv"
+    return response
+
 @app.route('/admin/vouchers/add', methods=['POST'])
 @login_required
 def admin_add_voucher():
@@ -2444,7 +2373,8 @@ def admin_add_voucher():
             code=form_code,
             discount_percentage=add_form.discount_percentage.data,
             is_active=add_form.is_active.data,
-            max_uses=add_form.max_uses.data
+            max_uses=add_form.max_uses.data,
+            max_uses_per_customer=add_form.max_uses_per_customer.data
         )
         db.session.add(new_voucher)
         try:
@@ -2481,6 +2411,7 @@ def admin_edit_voucher(voucher_id):
         voucher.code = form_code
         voucher.discount_percentage = edit_form.discount_percentage.data
         voucher.max_uses = edit_form.max_uses.data
+        voucher.max_uses_per_customer = edit_form.max_uses_per_customer.data
         
         try:
             db.session.commit()
@@ -2502,6 +2433,7 @@ def admin_delete_voucher(voucher_id):
     voucher = Voucher.query.get_or_404(voucher_id)
 
     try:
+        remove_voucher_redemptions(voucher.voucher_id)
         db.session.delete(voucher)
         db.session.commit()
         flash(f"Voucher '{voucher.code}' deleted.", 'success')
@@ -2532,6 +2464,7 @@ def admin_toggle_voucher_status(voucher_id):
 
 @app.route('/admin/customers', methods=['GET'])
 @login_required
+@query_budget(2, role='admin')
 def admin_customers():
     search_query = request.args.get('search')
     
@@ -2576,6 +2509,8 @@ def admin_delete_customer(customer_id):
 
     
     try:
+        release_upload(customer.id_image_file)
+        cart_store.remove_customer(customer.customer_id)
         db.session.delete(customer)
         db.session.commit()
         flash(f"Customer '{customer.name}' has been deleted successfully.", 'success')
@@ -2587,6 +2522,7 @@ def admin_delete_customer(customer_id):
 
 @app.route('/admin/customers/edit/<int:customer_id>', methods=['GET'])
 @login_required
+@query_budget(2, role='admin', customer_id=1)
 def admin_edit_customer_page(customer_id):
     customer = Customer.query.get_or_404(customer_id)
     form = CustomerEditForm(obj=customer)
@@ -2636,6 +2572,7 @@ def admin_edit_customer(customer_id):
 
 @app.route('/admin/verifications')
 @login_required
+@query_budget(3, role='admin')
 def admin_verifications():
     
     customers_to_verify = Customer.query.filter(
@@ -2661,6 +2598,19 @@ def admin_verifications():
         
     )
 
+@app.route('/admin/uploads/status')
+@login_required
+@query_budget(1, role='admin', path='payments/missing.jpg')
+def admin_upload_status():
+    """Processing status of uploaded images, e.g. ?path=payments/<file>&path=ids/<file>."""
+    
+    statuses = {}
+    for path in request.args.getlist('path')[:50]:
+        status, error = upload_status(path)
+        statuses[path] = {'status': status, 'error': error}
+
+    return jsonify({'status': 'success', 'uploads': statuses})
+
 @app.route('/admin/approve_discount/<int:customer_id>', methods=['POST'])
 @login_required
 def admin_approve_discount(customer_id):
@@ -2670,6 +2620,7 @@ def admin_approve_discount(customer_id):
     customer.discount_status = 'Approved'
 
     try:
+        cart_store.bump_cart_version(customer.customer_id)
         db.session.commit()
         flash(f"Approved discount for {customer.name}.", 'success')
     except Exception as e:
@@ -2683,16 +2634,17 @@ def admin_approve_discount(customer_id):
 @login_required
 def admin_approve_payment(order_id):
     order = Order.query.get_or_404(order_id)
+    if order.status == 'Approved' or not change_order_status(order, 'Approved'):
+        db.session.rollback()
+        flash(f"Order #{order_id} was already handled by someone else.", 'warning')
+        return redirect(url_for('admin_verifications'))
     
     order.payment_status = 'Paid'
-    
-    order.status = 'Approved' 
     order.decline_reason = None 
 
     try:
-        db.session.commit()
-        
         send_order_email(order, f"Order #{order.order_id} Confirmed - Anjet's", 'email_order_approved.html')
+        db.session.commit()
         
         flash(f"GCash payment for Order #{order.order_id} verified and the order is now 'Approved'. Customer notified.", 'success')
     except Exception as e:
@@ -2705,10 +2657,12 @@ def admin_approve_payment(order_id):
 @login_required
 def admin_deny_payment(order_id):
     order = Order.query.get_or_404(order_id)
+    if order.status == 'Declined' or not change_order_status(order, 'Declined'):
+        db.session.rollback()
+        flash(f"Order #{order_id} was already handled by someone else.", 'warning')
+        return redirect(url_for('admin_verifications'))
     
     order.payment_status = 'Failed'
-    
-    order.status = 'Declined'
     order.decline_reason = "GCash payment verification failed or expired. Please contact us to resolve or re-order with COD/COP."
 
     try:
@@ -2729,6 +2683,7 @@ def admin_deny_discount(customer_id):
     customer.discount_status = 'Denied'
 
     try:
+        cart_store.bump_cart_version(customer.customer_id)
         db.session.commit()
         flash(f"Denied and cleared discount request for {customer.name}.", 'info')
     except Exception as e:
@@ -2737,8 +2692,51 @@ def admin_deny_discount(customer_id):
 
     return redirect(url_for('admin_verifications'))
 
+@app.route('/metrics')
+@no_query_budget("Off in the benchmark configuration; a scrape runs DatabaseCollector's fixed queries")
+def metrics():
+    if not current_app.config.get('METRICS_ENABLED'):
+        abort(404)
+
+    from app.metrics import render_metrics, scrape_allowed
+
+    if not scrape_allowed(current_app.config):
+        abort(404)
+
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/admin/profiling')
+@login_required
+@query_budget(1, role='admin')
+def admin_profiling():
+    if not current_app.config.get('PROFILING_ENABLED'):
+        return render_template('admin_profiling.html', enabled=False)
+
+    from app import profiling
+
+    return render_template(
+        'admin_profiling.html',
+        enabled=True,
+        endpoints=profiling.endpoint_stats(),
+        slow_requests=profiling.slow_requests(),
+        since=datetime.fromtimestamp(profiling.stats_since()),
+        slow_ms=current_app.config.get('PROFILING_SLOW_MS', 500),
+        pid=os.getpid()
+    )
+
+@app.route('/admin/profiling/reset', methods=['POST'])
+@login_required
+def admin_profiling_reset():
+    if current_app.config.get('PROFILING_ENABLED'):
+        from app import profiling
+        profiling.reset_stats()
+        flash("Profiling stats cleared.", 'info')
+    return redirect(url_for('admin_profiling'))
+
 @app.route('/admin/sales_reports')
 @login_required
+@query_budget(3, role='admin')
 def admin_sales_reports():
     start_date_str = request.args.get('start_date')
     end_date_str = request.args.get('end_date')
@@ -2753,33 +2751,23 @@ def admin_sales_reports():
     except:
         end_date = date.today()
 
-    date_filter = [Order.order_date.between(start_date, end_date + timedelta(days=1))]
-
     if start_date.strftime('%Y-%m-%d') == (date.today() - timedelta(days=30)).strftime('%Y-%m-%d') and end_date.strftime('%Y-%m-%d') == date.today().strftime('%Y-%m-%d'):
         date_range_str = "Last 30 Days"
     else:
         date_range_str = f"from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}"
 
 
+    top_variants = sales_rollup.top_variants(start_date, end_date).subquery()
     top_selling_items = db.session.query(
         Product.name,
         ProductVariant.size_name,
-        func.sum(OrderItem.quantity).label('total_sold')
-    ).join(Product, Product.product_id == OrderItem.product_id)\
-     .join(ProductVariant, ProductVariant.variant_id == OrderItem.variant_id)\
-     .join(Order, Order.order_id == OrderItem.order_id)\
-     .filter(*date_filter)\
-     .group_by(OrderItem.variant_id)\
-     .order_by(func.sum(OrderItem.quantity).desc())\
+        top_variants.c.total_sold
+    ).join(ProductVariant, ProductVariant.variant_id == top_variants.c.variant_id)\
+     .join(Product, Product.product_id == ProductVariant.product_id)\
+     .order_by(top_variants.c.total_sold.desc())\
      .all()
 
-    sales_by_day = db.session.query(
-        func.date(Order.order_date).label('date'),
-        func.sum(Order.final_amount).label('total_sales')
-    ).filter(*date_filter)\
-     .group_by(func.date(Order.order_date))\
-     .order_by(func.date(Order.order_date).desc())\
-     .all()
+    sales_by_day = sales_rollup.sales_by_day(start_date, end_date).all()
 
     return render_template(
         'admin_sales_reports.html',
@@ -2792,6 +2780,7 @@ def admin_sales_reports():
 
 @app.route('/admin/export/sales_csv')
 @login_required
+@query_budget(2, role='admin')
 def admin_export_sales_csv():
     start_date_str = request.args.get('start_date')
     end_date_str = request.args.get('end_date')
@@ -2806,15 +2795,8 @@ def admin_export_sales_csv():
     except:
         end_date = date.today()
 
-    date_filter = [Order.order_date.between(start_date, end_date + timedelta(days=1))]
-    
     try:
-        sales_by_day_query = db.session.query(
-            func.date(Order.order_date).label('date'),
-            func.sum(Order.final_amount).label('total_sales')
-        ).filter(*date_filter)\
-         .group_by(func.date(Order.order_date))\
-         .order_by(func.date(Order.order_date).desc())
+        sales_by_day_query = sales_rollup.sales_by_day(start_date, end_date)
 
         df = pd.read_sql(sales_by_day_query.statement, db.engine)
 
@@ -2839,6 +2821,7 @@ def admin_export_sales_csv():
 
 @app.route('/admin/users', methods=['GET'])
 @login_required
+@query_budget(2, role='admin')
 def admin_users():
     
     staff_users = User.query.order_by(User.username.asc()).all()
@@ -2850,6 +2833,7 @@ def admin_users():
 
 @app.route('/admin/users/add', methods=['GET', 'POST'])
 @login_required
+@query_budget(1, role='admin')
 def admin_add_user():
     form = UserAddForm()
     if form.validate_on_submit():
@@ -2883,6 +2867,7 @@ def admin_add_user():
 
 @app.route('/admin/users/edit/<int:user_id>', methods=['GET', 'POST'])
 @login_required
+@query_budget(1, role='admin', user_id=1)
 def admin_edit_user(user_id):
     user = User.query.get_or_404(user_id)
     form = UserEditForm(obj=user)
@@ -2946,6 +2931,7 @@ def admin_delete_user(user_id):
 
 @app.route('/admin/dangerous/reset_menu')
 @login_required
+@query_budget(20, role='admin', status=302)
 def admin_reset_menu():
     
     if current_user.role != 'Admin':
@@ -2954,7 +2940,14 @@ def admin_reset_menu():
 
     try:
         
+        db.session.query(ProductSalesDaily).delete()
+        db.session.query(ProductSalesTotal).delete()
+        db.session.query(SalesDaily).delete()
+        db.session.query(SalesDailyVariant).delete()
         num_items = db.session.query(OrderItem).delete()
+        db.session.query(CartItem).delete()
+        db.session.query(CartState).delete()
+        db.session.query(VoucherRedemption).delete()
         
         
         num_orders = db.session.query(Order).delete()
@@ -2964,6 +2957,7 @@ def admin_reset_menu():
 
         
         num_reviews = db.session.query(Review).delete()
+        db.session.query(ProductRating).delete()
 
         
         num_products = db.session.query(Product).delete()
@@ -2971,6 +2965,9 @@ def admin_reset_menu():
         
         num_categories = db.session.query(Category).delete()
 
+        rebuild_upload_refs()
+        bump_catalog_version()
+
         db.session.commit()
         
         flash(f"Database Wiped: {num_orders} Orders, {num_products} Products, {num_categories} Categories deleted.", "success")
@@ -2983,6 +2980,7 @@ def admin_reset_menu():
 
 @app.route('/cart/remove_voucher')
 @customer_login_required
+@query_budget(0, role='customer', status=302)
 def remove_voucher():
     session.pop('voucher_code', None)
     session.pop('discount_percentage', None)
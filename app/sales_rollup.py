@@ -0,0 +1,203 @@
+"""
+Daily sales rollups maintained on order placement and status changes.
+
+Orders are bucketed by order date and a coarse status class so reports can
+ask for "confirmed" or "not declined" sales over any date range by summing
+a handful of rows per day. An order's changes are written with one
+batched upsert per table, however many lines it has. All helpers work
+inside the caller's transaction; the caller commits.
+"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from app import db
+from app.models import Order, OrderItem, SalesDaily, SalesDailyVariant
+from app.upsert import add_to_counters
+
+CONFIRMED = 'confirmed'
+PENDING = 'pending'
+DECLINED = 'declined'
+
+CONFIRMED_STATUSES = ('Approved', 'In Progress', 'Up for Delivery', 'Completed')
+NOT_DECLINED = (CONFIRMED, PENDING)
+
+
+def status_class(status):
+    if status in CONFIRMED_STATUSES:
+        return CONFIRMED
+    if status == 'Declined':
+        return DECLINED
+    return PENDING
+
+
+def _money(value):
+    return Decimal(str(value or 0))
+
+
+def _record(order, signs, items):
+    """Add the order once per (status class, sign) in `signs`."""
+    sale_date = order.order_date.date()
+    quantities = {}
+    for item in items:
+        if item.variant_id is None:
+            continue
+        key = (item.variant_id, item.product_id)
+        quantities[key] = quantities.get(key, 0) + int(item.quantity)
+
+    add_to_counters(SalesDaily, [
+        {
+            'sale_date': sale_date, 'status_class': cls,
+            'payment_method': order.payment_method, 'order_type': order.order_type,
+            'order_count': sign,
+            'revenue': sign * _money(order.final_amount),
+            'vat_amount': sign * _money(order.vat_amount),
+            'discount_amount': sign * _money(order.discount_amount)
+        }
+        for cls, sign in signs
+    ], ('order_count', 'revenue', 'vat_amount', 'discount_amount'))
+    add_to_counters(SalesDailyVariant, [
+        {
+            'sale_date': sale_date, 'status_class': cls, 'variant_id': variant_id,
+            'product_id': product_id, 'quantity': sign * quantity
+        }
+        for cls, sign in signs
+        for (variant_id, product_id), quantity in quantities.items()
+    ], ('quantity',))
+
+
+def record_order(order, sign=1, items=None):
+    """Add (sign=1) or remove (sign=-1) an order under its current status."""
+    items = order.items if items is None else items
+    _record(order, [(status_class(order.status), sign)], items)
+
+
+def apply_status_change(order, old_status, new_status):
+    """Move an order between status classes when its status changes."""
+    old_class = status_class(old_status)
+    new_class = status_class(new_status)
+    if old_class == new_class:
+        return
+    _record(order, [(old_class, -1), (new_class, 1)], order.items)
+
+
+def delete_variant_sales(variant_ids):
+    """
+    Drop the per-variant rows of variants about to be deleted. Rows of
+    deleted orders stay behind with quantity 0 and still reference them.
+    """
+    if variant_ids:
+        SalesDailyVariant.query.filter(SalesDailyVariant.variant_id.in_(variant_ids))\
+            .delete(synchronize_session=False)
+
+
+def sales_by_day(start_date, end_date, classes=NOT_DECLINED):
+    """[(date, total_sales), ...] newest first, for start_date..end_date inclusive."""
+    return db.session.query(
+        SalesDaily.sale_date.label('date'),
+        func.sum(SalesDaily.revenue).label('total_sales')
+    ).filter(
+        SalesDaily.sale_date.between(start_date, end_date),
+        SalesDaily.status_class.in_(classes)
+    ).group_by(SalesDaily.sale_date)\
+     .having(func.sum(SalesDaily.order_count) > 0)\
+     .order_by(SalesDaily.sale_date.desc())
+
+
+def order_totals(start_date, end_date=None, classes=NOT_DECLINED):
+    """Return (order_count, revenue) summed over the date range."""
+    query = db.session.query(
+        func.sum(SalesDaily.order_count),
+        func.sum(SalesDaily.revenue)
+    ).filter(
+        SalesDaily.sale_date >= start_date,
+        SalesDaily.status_class.in_(classes)
+    )
+    if end_date is not None:
+        query = query.filter(SalesDaily.sale_date <= end_date)
+    order_count, revenue = query.one()
+    return int(order_count or 0), revenue or Decimal('0.00')
+
+
+def top_variants(start_date, end_date, classes=NOT_DECLINED):
+    """Query of (variant_id, total_sold) for the date range, best first."""
+    total_sold = func.sum(SalesDailyVariant.quantity)
+    return db.session.query(
+        SalesDailyVariant.variant_id,
+        total_sold.label('total_sold')
+    ).filter(
+        SalesDailyVariant.sale_date.between(start_date, end_date),
+        SalesDailyVariant.status_class.in_(classes)
+    ).group_by(SalesDailyVariant.variant_id)\
+     .having(total_sold > 0)\
+     .order_by(total_sold.desc())
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def rebuild_sales_rollup():
+    """Recompute both rollup tables from Orders/Order_Items (backfill)."""
+    SalesDaily.query.delete()
+    SalesDailyVariant.query.delete()
+
+    order_day = func.date(Order.order_date)
+
+    daily = {}
+    order_rows = db.session.query(
+        order_day,
+        Order.status,
+        Order.payment_method,
+        Order.order_type,
+        func.count(Order.order_id),
+        func.sum(Order.final_amount),
+        func.sum(Order.vat_amount),
+        func.sum(Order.discount_amount)
+    ).group_by(order_day, Order.status, Order.payment_method, Order.order_type).all()
+
+    for day, status, payment_method, order_type, count, revenue, vat, discount in order_rows:
+        key = (_as_date(day), status_class(status), payment_method, order_type)
+        row = daily.setdefault(key, [0, Decimal('0'), Decimal('0'), Decimal('0')])
+        row[0] += count
+        row[1] += _money(revenue)
+        row[2] += _money(vat)
+        row[3] += _money(discount)
+
+    variants = {}
+    item_rows = db.session.query(
+        order_day,
+        Order.status,
+        OrderItem.variant_id,
+        OrderItem.product_id,
+        func.sum(OrderItem.quantity)
+    ).join(Order, Order.order_id == OrderItem.order_id)\
+     .filter(OrderItem.variant_id.isnot(None))\
+     .group_by(order_day, Order.status, OrderItem.variant_id, OrderItem.product_id)\
+     .all()
+
+    for day, status, variant_id, product_id, quantity in item_rows:
+        key = (_as_date(day), status_class(status), variant_id)
+        if key in variants:
+            variants[key][1] += int(quantity)
+        else:
+            variants[key] = [product_id, int(quantity)]
+
+    db.session.bulk_insert_mappings(SalesDaily, [
+        {
+            'sale_date': sale_date, 'status_class': cls,
+            'payment_method': payment_method, 'order_type': order_type,
+            'order_count': row[0], 'revenue': row[1],
+            'vat_amount': row[2], 'discount_amount': row[3]
+        }
+        for (sale_date, cls, payment_method, order_type), row in daily.items()
+    ])
+    db.session.bulk_insert_mappings(SalesDailyVariant, [
+        {
+            'sale_date': sale_date, 'status_class': cls, 'variant_id': variant_id,
+            'product_id': product_id, 'quantity': quantity
+        }
+        for (sale_date, cls, variant_id), (product_id, quantity) in variants.items()
+    ])
+    return len(daily)
@@ -0,0 +1,170 @@
+"""
+Content-addressed layout and reference counts for uploaded images.
+
+Uploads are named by the SHA-256 of their bytes and fanned out into two
+levels of subdirectories, e.g. products/3f/a2/3fa2...e9.jpg, so the same
+picture uploaded twice is stored once and no directory grows too large.
+
+Stored_Files counts the Product.image_file, Order.payment_image_file and
+Customer.id_image_file values that point at each blob. Routes call
+retain_upload()/release_upload() in the same transaction that changes the
+column; `flask gc-uploads` deletes blobs that nothing references.
+Files named before this layout (flat token names) are never counted or
+collected.
+"""
+import hashlib
+import os
+import re
+import time
+
+from sqlalchemy import update, func
+
+from app import db
+from app.models import StoredFile, Product, Order, Customer
+from app.upsert import update_or_insert
+
+STORE_KINDS = ('products', 'payments', 'ids')
+HASH_CHUNK_SIZE = 64 * 1024
+
+STORED_PATH_RE = re.compile(r'^[a-z]+/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+FANOUT_DIR_RE = re.compile(r'^[0-9a-f]{2}$')
+# A blob and everything derived from it (sizes, .failed marker, temp files)
+BLOB_FILE_RE = re.compile(r'^(?:\.tmp-)?([0-9a-f]{64})[-.]')
+
+
+def content_hash(stream):
+    """SHA-256 hex digest of a binary stream, leaving it rewound."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(digest, ext):
+    """Fan-out path of a blob inside its kind folder: '3f/a2/3fa2...e9.jpg'."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def is_stored_path(path):
+    return bool(path) and STORED_PATH_RE.match(path) is not None
+
+
+def product_image_path(image_file):
+    """Product.image_file is relative to products/; counts use the full path."""
+    return f"products/{image_file}" if image_file else None
+
+
+def retain_upload(path):
+    """Add a reference to `path` in the current transaction."""
+    if not is_stored_path(path):
+        return
+    update_or_insert(
+        update(StoredFile)
+        .where(StoredFile.path == path)
+        .values(ref_count=StoredFile.ref_count + 1),
+        lambda: StoredFile(path=path, ref_count=1)
+    )
+
+
+def release_upload(path):
+    """Drop a reference to `path` in the current transaction."""
+    if not is_stored_path(path):
+        return
+    db.session.execute(
+        update(StoredFile)
+        .where(StoredFile.path == path, StoredFile.ref_count > 0)
+        .values(ref_count=StoredFile.ref_count - 1)
+    )
+
+
+def replace_upload(old_path, new_path):
+    if old_path == new_path:
+        return
+    release_upload(old_path)
+    retain_upload(new_path)
+
+
+def referenced_paths():
+    """{upload path: number of rows referencing it} across all three columns."""
+    counts = {}
+    for image_file, count in db.session.query(Product.image_file, func.count())\
+            .group_by(Product.image_file):
+        if image_file:
+            counts[product_image_path(image_file)] = count
+
+    for column in (Order.payment_image_file, Customer.id_image_file):
+        for path, count in db.session.query(column, func.count())\
+                .filter(column.isnot(None))\
+                .group_by(column):
+            counts[path] = counts.get(path, 0) + count
+    return counts
+
+
+def rebuild_upload_refs():
+    """Recompute Stored_Files from the referencing columns."""
+    db.session.query(StoredFile).delete()
+    rows = [
+        {'path': path, 'ref_count': count}
+        for path, count in referenced_paths().items()
+        if is_stored_path(path)
+    ]
+    if rows:
+        db.session.bulk_insert_mappings(StoredFile, rows)
+    return len(rows)
+
+
+def collect_garbage(upload_folder, grace_seconds, dry_run=False):
+    """
+    Delete blobs (with their derivatives) that have no references and have
+    not been touched for `grace_seconds`; uploads still sitting in a
+    checkout session are protected by the grace period.
+    Returns (blobs removed, bytes freed).
+    """
+    kept = set()
+    for (path,) in db.session.query(StoredFile.path).filter(StoredFile.ref_count > 0):
+        directory, filename = path.rsplit('/', 1)
+        kept.add((directory, filename[:64]))
+
+    cutoff = time.time() - grace_seconds
+    removed = freed = 0
+
+    for kind in STORE_KINDS:
+        kind_folder = os.path.join(upload_folder, kind)
+        if not os.path.isdir(kind_folder):
+            continue
+        for first in sorted(os.listdir(kind_folder)):
+            if not FANOUT_DIR_RE.match(first) or not os.path.isdir(os.path.join(kind_folder, first)):
+                continue
+            for second in sorted(os.listdir(os.path.join(kind_folder, first))):
+                directory = os.path.join(kind_folder, first, second)
+                if not FANOUT_DIR_RE.match(second) or not os.path.isdir(directory):
+                    continue
+
+                groups = {}
+                for filename in os.listdir(directory):
+                    match = BLOB_FILE_RE.match(filename)
+                    if match:
+                        groups.setdefault(match.group(1), []).append(os.path.join(directory, filename))
+
+                relative_dir = f"{kind}/{first}/{second}"
+                for digest, paths in groups.items():
+                    if (relative_dir, digest) in kept:
+                        continue
+                    if max(os.path.getmtime(p) for p in paths) > cutoff:
+                        continue
+                    removed += 1
+                    for p in paths:
+                        freed += os.path.getsize(p)
+                        if not dry_run:
+                            os.remove(p)
+
+                if not dry_run and not os.listdir(directory):
+                    os.rmdir(directory)
+            if not dry_run and not os.listdir(os.path.join(kind_folder, first)):
+                os.rmdir(os.path.join(kind_folder, first))
+
+    if not dry_run:
+        db.session.query(StoredFile).filter(StoredFile.ref_count <= 0).delete()
+    return removed, freed
@@ -0,0 +1,59 @@
+"""
+Race-safe "update the counter row, or create it" for aggregate tables.
+Works inside the caller's transaction; the caller commits.
+"""
+from sqlalchemy import update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+
+def update_or_insert(statement, new_row):
+    """
+    Run `statement`, an UPDATE of one aggregate row. If it matched nothing,
+    add `new_row()` instead. Two transactions can both find the row missing;
+    the insert runs in a savepoint, so the one that loses the race rolls
+    back only its insert and repeats the UPDATE on the row the winner made.
+    """
+    if db.session.execute(statement).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(new_row())
+    except IntegrityError:
+        db.session.execute(statement)
+
+
+def add_to_counters(model, rows, counters):
+    """
+    Add many rows' `counters` columns onto the matching rows of `model`
+    (by primary key), creating the rows that do not exist yet, in a single
+    INSERT ... ON CONFLICT DO UPDATE (SQLite) or ON DUPLICATE KEY UPDATE
+    (MySQL) statement. Each row is a dict of every column to insert.
+    """
+    if not rows:
+        return
+    columns = model.__table__.c
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        statement = mysql_insert(model).values(rows)
+        statement = statement.on_duplicate_key_update({
+            name: columns[name] + statement.inserted[name] for name in counters
+        })
+    elif dialect == 'sqlite':
+        statement = sqlite_insert(model).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[column.name for column in model.__table__.primary_key],
+            set_={name: columns[name] + statement.excluded[name] for name in counters}
+        )
+    else:
+        for row in rows:
+            key = {column.name: row[column.name] for column in model.__table__.primary_key}
+            update_or_insert(
+                update(model).filter_by(**key).values({name: columns[name] + row[name] for name in counters}),
+                lambda row=row: model(**row)
+            )
+        return
+    db.session.execute(statement)
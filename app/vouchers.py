@@ -0,0 +1,199 @@
+"""
+Voucher checks and redemption.
+
+A voucher is redeemed with a single conditional UPDATE that only adds a
+use while the voucher is active and under max_uses, so concurrent
+checkouts cannot overshoot the limit and the row is never read first and
+written back. Each redemption is recorded in Voucher_Redemptions. With a
+per-customer limit it takes a numbered slot (use_no 1 to the limit) under
+a unique (voucher_id, customer_id, use_no) key, so two checkouts by the
+same customer racing for the last slot cannot both insert; the loser gets
+VoucherUnavailableError. Deleting an order gives its voucher uses back.
+
+Campaign codes are generated in batches of single-use vouchers: random
+codes are checked against the unique code index in chunks and inserted
+with executemany statements. Helpers work inside the caller's
+transaction; the caller commits.
+"""
+import secrets
+
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Voucher, VoucherBatch, VoucherRedemption
+
+# No 0/O or 1/I, so codes can be read back over the phone
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+VOUCHER_INSERT_BATCH_SIZE = 1000
+MAX_GENERATION_ROUNDS = 20
+
+
+class VoucherUnavailableError(ValueError):
+    """The voucher is unknown, inactive or has no uses left."""
+
+
+def has_uses_left():
+    """Filter clause for vouchers still under their overall limit."""
+    return or_(Voucher.max_uses.is_(None), Voucher.current_uses < Voucher.max_uses)
+
+
+def customer_redemptions(voucher_id, customer_id):
+    return db.session.query(db.func.count(VoucherRedemption.redemption_id))\
+        .filter_by(voucher_id=voucher_id, customer_id=customer_id)\
+        .scalar()
+
+
+def _free_use_no(voucher, customer_id):
+    """
+    The lowest per-customer slot still free, or None once the customer has
+    used them all. Redemptions without a slot (made while the voucher had
+    no per-customer limit) take up the free slots first.
+    """
+    slots = [
+        use_no for (use_no,) in db.session.query(VoucherRedemption.use_no)
+        .filter_by(voucher_id=voucher.voucher_id, customer_id=customer_id)
+    ]
+    unnumbered = slots.count(None)
+    free = sorted(set(range(1, voucher.max_uses_per_customer + 1)) - set(slots))[unnumbered:]
+    return free[0] if free else None
+
+
+def _check_customer_limit(voucher, customer_id):
+    if voucher.max_uses_per_customer is None:
+        return
+    if customer_redemptions(voucher.voucher_id, customer_id) >= voucher.max_uses_per_customer:
+        raise VoucherUnavailableError(f"You have already used voucher '{voucher.code}'.")
+
+
+def check_voucher(code, customer_id):
+    """
+    The active voucher for `code` if the customer may still use it.
+    Only reads; the use is taken by redeem_voucher() when the order is placed.
+    """
+    voucher = Voucher.query.filter_by(code=code, is_active=True).first()
+    if voucher is None:
+        raise VoucherUnavailableError("Invalid or expired voucher code.")
+    if voucher.max_uses is not None and voucher.current_uses >= voucher.max_uses:
+        raise VoucherUnavailableError("This voucher code has reached its maximum usage limit.")
+    _check_customer_limit(voucher, customer_id)
+    return voucher
+
+
+def redeem_voucher(code, customer_id, order_id):
+    """
+    Take one use of the voucher for an order, or raise VoucherUnavailableError
+    if it was deactivated or used up since it was applied.
+    """
+    voucher = Voucher.query.filter_by(code=code).first()
+    if voucher is None:
+        raise VoucherUnavailableError("Invalid or expired voucher code.")
+
+    use_no = None
+    if voucher.max_uses_per_customer is not None:
+        use_no = _free_use_no(voucher, customer_id)
+        if use_no is None:
+            raise VoucherUnavailableError(f"You have already used voucher '{code}'.")
+
+    result = db.session.execute(
+        update(Voucher)
+        .where(Voucher.voucher_id == voucher.voucher_id, Voucher.is_active == True, has_uses_left())
+        .values(current_uses=Voucher.current_uses + 1)
+    )
+    if result.rowcount == 0:
+        raise VoucherUnavailableError(f"Voucher '{code}' is no longer available.")
+
+    # A concurrent checkout by the same customer that took the same slot
+    # makes this insert fail on the unique key
+    try:
+        with db.session.begin_nested():
+            db.session.add(VoucherRedemption(
+                voucher_id=voucher.voucher_id,
+                customer_id=customer_id,
+                order_id=order_id,
+                use_no=use_no
+            ))
+    except IntegrityError:
+        raise VoucherUnavailableError(f"You have already used voucher '{code}'.")
+
+
+def remove_order_redemptions(order_id):
+    """Delete the order's redemptions and give their uses back to the vouchers."""
+    uses = db.session.query(VoucherRedemption.voucher_id, db.func.count(VoucherRedemption.redemption_id))\
+        .filter_by(order_id=order_id)\
+        .group_by(VoucherRedemption.voucher_id)\
+        .all()
+    for voucher_id, count in uses:
+        db.session.execute(
+            update(Voucher)
+            .where(Voucher.voucher_id == voucher_id, Voucher.current_uses >= count)
+            .values(current_uses=Voucher.current_uses - count)
+        )
+    VoucherRedemption.query.filter_by(order_id=order_id).delete(synchronize_session=False)
+
+
+def remove_voucher_redemptions(voucher_id):
+    VoucherRedemption.query.filter_by(voucher_id=voucher_id).delete(synchronize_session=False)
+
+
+def _random_code(prefix, length):
+    return prefix + ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+def _taken_codes(codes):
+    """The subset of `codes` already used by a voucher (an index lookup per chunk)."""
+    codes = list(codes)
+    taken = set()
+    for start in range(0, len(codes), 500):
+        taken.update(
+            code for (code,) in db.session.query(Voucher.code)
+            .filter(Voucher.code.in_(codes[start:start + 500]))
+        )
+    return taken
+
+
+def generate_voucher_batch(name, code_count, discount_percentage, prefix='', code_length=10):
+    """
+    Create a VoucherBatch of `code_count` unique single-use codes.
+    Raises ValueError if the code space is too crowded to find enough
+    free codes (only possible with a short prefix-and-length combination).
+    """
+    batch = VoucherBatch(
+        name=name,
+        prefix=prefix,
+        code_count=code_count,
+        discount_percentage=discount_percentage
+    )
+    db.session.add(batch)
+    db.session.flush()
+
+    generated = set()
+    rounds = 0
+    while len(generated) < code_count:
+        rounds += 1
+        if rounds > MAX_GENERATION_ROUNDS * (code_count // VOUCHER_INSERT_BATCH_SIZE + 1):
+            raise ValueError("Could not generate enough unique codes; use a longer code length.")
+
+        wanted = min(code_count - len(generated), VOUCHER_INSERT_BATCH_SIZE)
+        candidates = set()
+        while len(candidates) < wanted:
+            candidates.add(_random_code(prefix, code_length))
+        candidates -= generated
+        candidates -= _taken_codes(candidates)
+        if not candidates:
+            continue
+
+        db.session.execute(insert(Voucher), [
+            {
+                'code': code,
+                'discount_percentage': discount_percentage,
+                'is_active': True,
+                'max_uses': 1,
+                'current_uses': 0,
+                'batch_id': batch.batch_id
+            }
+            for code in candidates
+        ])
+        generated |= candidates
+
+    return batch
@@ -0,0 +1,165 @@
+"""
+Benchmark the hot flows in-process through the Flask test client.
+
+    python benchmarks/app_bench.py --size small --iterations 50
+    python benchmarks/app_bench.py --size medium --json results.json
+    python benchmarks/app_bench.py --size medium --baseline results.json
+
+Seeds (or reuses) a synthetic database, see synthetic_data.py, then runs
+each flow in flows.py --iterations times after --warmup untimed runs and
+prints p50/p95/p99 latency and SQL statements per request for every
+request label. Without --database-url a SQLite file per size is kept in
+the temp directory and reused; pass --reset to reseed it. Checkout runs
+place real orders, so reseed before comparing numbers across runs.
+
+--json writes the results; --baseline compares against such a file and
+exits with status 1 if any request now issues more SQL statements than
+the baseline's maximum, or its p95 is more than --tolerance slower.
+Statement counts are deterministic for a given seed and size; latency
+depends on the machine, so only compare baselines recorded on the same one.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flows import FLOWS, print_summary, summarize  # noqa: E402
+from synthetic_data import (  # noqa: E402
+    ADMIN_USERNAME, add_volume_arguments, benchmark_config, seed_database, volumes_from_args
+)
+
+
+class TestClientDriver:
+    """Runs flow requests through app.test_client() and counts SQL per request."""
+
+    def __init__(self, app):
+        from sqlalchemy import event
+        from app import db
+        from app.models import User
+
+        self.app = app
+        self.client = app.test_client()
+        self.samples = defaultdict(list)
+        self.recording = True
+        self._queries = 0
+
+        with app.app_context():
+            self.admin_id = db.session.query(User.user_id).filter_by(username=ADMIN_USERNAME).scalar()
+            event.listen(db.engine, 'before_cursor_execute', self._count_query)
+
+    def _count_query(self, *args):
+        self._queries += 1
+
+    def as_customer(self, customer_id):
+        with self.client.session_transaction() as session:
+            session.clear()
+            session['customer_id'] = customer_id
+            session['customer_name'] = f"Customer {customer_id}"
+
+    def as_admin(self):
+        with self.client.session_transaction() as session:
+            session.clear()
+            session['_user_id'] = str(self.admin_id)
+            session['_fresh'] = True
+
+    def _request(self, label, method, path, data=None, headers=None):
+        self._queries = 0
+        started = time.perf_counter()
+        response = self.client.open(path, method=method, data=data, headers=headers)
+        # Streamed exports only run their queries while the body is read
+        response.get_data()
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            self.samples[label].append((elapsed, response.status_code, self._queries))
+        response.close()
+        return response
+
+    def get(self, label, path):
+        return self._request(label, 'GET', path)
+
+    def post(self, label, path, data=None, headers=None):
+        return self._request(label, 'POST', path, data=data, headers=headers)
+
+
+def run_flows(app, volumes, flow_names, iterations, warmup, seed):
+    driver = TestClientDriver(app)
+    for name in flow_names:
+        rng = random.Random(f"{seed}-{name}")
+        driver.recording = False
+        for _ in range(warmup):
+            FLOWS[name](driver, rng, volumes)
+        driver.recording = True
+        for _ in range(iterations):
+            FLOWS[name](driver, rng, volumes)
+    return summarize(driver.samples)
+
+
+def compare(summary, baseline, tolerance):
+    """Regressions against a baseline summary, as a list of messages."""
+    problems = []
+    for label, stats in summary.items():
+        before = baseline.get(label)
+        if before is None:
+            continue
+        if stats.get('queries_max', 0) > before.get('queries_max', 0):
+            problems.append(f"{label}: {stats['queries_max']} SQL statements per request, baseline {before['queries_max']}")
+        if before['p95_ms'] and stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            problems.append(f"{label}: p95 {stats['p95_ms']:.1f} ms, baseline {before['p95_ms']:.1f} ms")
+        if stats['errors'] > before.get('errors', 0):
+            problems.append(f"{label}: {stats['errors']} server errors, baseline {before.get('errors', 0)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.environ.get('BENCHMARK_DATABASE_URL'))
+    parser.add_argument('--reset', action='store_true', help='Drop and reseed the benchmark database.')
+    parser.add_argument('--flows', nargs='+', choices=sorted(FLOWS), default=list(FLOWS))
+    parser.add_argument('--iterations', type=int, default=30, help='Timed runs of each flow.')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed runs of each flow first.')
+    parser.add_argument('--json', dest='json_path', help='Write the results to this file.')
+    parser.add_argument('--baseline', help='Fail on regressions against this results file.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p95 slowdown against the baseline (0.25 = 25%%).')
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+
+    volumes = volumes_from_args(args)
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.gettempdir(), f"anjets-bench-{args.size}.db")
+
+    from app import create_app
+
+    app = create_app(benchmark_config(database_url))
+    if not seed_database(app, volumes, seed=args.seed, reset=args.reset):
+        print(f"Reusing the data already in {database_url}")
+
+    summary = run_flows(app, volumes, args.flows, args.iterations, args.warmup, args.seed)
+    print()
+    print_summary(summary)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'volumes': volumes, 'iterations': args.iterations, 'results': summary}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('volumes') != volumes:
+            print("\nWarning: the baseline was recorded with different volumes.")
+        problems = compare(summary, baseline['results'], args.tolerance)
+        if problems:
+            print("\nRegressions against " + args.baseline + ":")
+            for problem in problems:
+                print("  " + problem)
+            sys.exit(1)
+        print("\nNo regressions against " + args.baseline + ".")
+
+
+if __name__ == '__main__':
+    main()
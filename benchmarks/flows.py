@@ -0,0 +1,147 @@
+"""
+The user flows the benchmarks drive, shared by app_bench.py (Flask test
+client) and http_load.py (HTTP against a running server).
+
+A flow is a function flow(driver, rng, data) that issues a few requests
+through the driver. Every request carries a label (usually the endpoint
+name) and the driver records its latency under that label. `data` holds
+the seeded volumes, so flows only pick ids that exist.
+"""
+import uuid
+from datetime import date, timedelta
+
+PERCENTILES = (50, 95, 99)
+
+
+def _customer_id(rng, data):
+    return rng.randint(1, data['customers'])
+
+
+def _variant_id(rng, data):
+    return rng.randint(1, data['products'] * data['variants_per_product'])
+
+
+def _date_range(days_back, days=30):
+    end = date.today() - timedelta(days=days_back)
+    return (end - timedelta(days=days)).isoformat(), end.isoformat()
+
+
+def client_menu(driver, rng, data):
+    driver.as_customer(_customer_id(rng, data))
+    driver.get('client_menu', '/menu')
+    driver.get('client_menu (category)', f"/menu?category_id={rng.randint(1, data['categories'])}")
+
+
+def add_to_cart(driver, rng, data):
+    driver.as_customer(_customer_id(rng, data))
+    driver.post('add_to_cart', '/cart/add', {'variant_id': _variant_id(rng, data), 'quantity': rng.randint(1, 3)})
+    driver.get('client_cart', '/cart')
+    driver.get('clear_cart', '/cart/clear')
+
+
+def checkout(driver, rng, data):
+    driver.as_customer(_customer_id(rng, data))
+    for _ in range(rng.randint(1, 3)):
+        driver.post('add_to_cart', '/cart/add', {'variant_id': _variant_id(rng, data), 'quantity': rng.randint(1, 3)})
+    driver.get('client_checkout_options', '/checkout/options')
+    driver.post('save_checkout_options', '/checkout/save_options', {
+        'event_date': (date.today() + timedelta(days=rng.randint(8, 60))).isoformat(),
+        'event_time': '12:00',
+        'order_type': 'Pickup',
+        'payment_method': 'COD/COP'
+    })
+    driver.get('client_checkout', '/checkout')
+    driver.get('checkout_quote', '/checkout/quote')
+    driver.post('place_order', '/checkout/place_order', headers={'Idempotency-Key': uuid.uuid4().hex})
+
+
+def client_orders(driver, rng, data):
+    driver.as_customer(_customer_id(rng, data))
+    driver.get('client_orders', '/my-account/orders')
+
+
+def admin_orders(driver, rng, data):
+    driver.as_admin()
+    driver.get('admin_orders', '/admin/orders')
+    driver.get('admin_orders (status)', '/admin/orders?status=Pending+Approval')
+
+
+def admin_sales_reports(driver, rng, data):
+    driver.as_admin()
+    driver.get('admin_sales_reports', '/admin/sales_reports')
+    start, end = _date_range(0, days=365)
+    driver.get('admin_sales_reports (year)', f"/admin/sales_reports?start_date={start}&end_date={end}")
+
+
+def exports(driver, rng, data):
+    driver.as_admin()
+    start, end = _date_range(rng.randint(0, max(0, data['days'] - 30)), days=30)
+    driver.get('admin_export_orders_json', f"/admin/export/orders_json?format=jsonl&start_date={start}&end_date={end}")
+    driver.get('admin_export_products_xml', '/admin/export/products_xml')
+    driver.get('admin_export_sales_csv', '/admin/export/sales_csv')
+
+
+FLOWS = {
+    'client_menu': client_menu,
+    'add_to_cart': add_to_cart,
+    'checkout': checkout,
+    'client_orders': client_orders,
+    'admin_orders': admin_orders,
+    'admin_sales_reports': admin_sales_reports,
+    'exports': exports
+}
+
+# Relative weights for the mixed HTTP load: mostly browsing and carts
+LOAD_MIX = {
+    'client_menu': 40,
+    'add_to_cart': 25,
+    'checkout': 10,
+    'client_orders': 10,
+    'admin_orders': 8,
+    'admin_sales_reports': 5,
+    'exports': 2
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples):
+    """
+    {label: {'requests', 'p50_ms', 'p95_ms', 'p99_ms', 'errors', ...}} from
+    {label: [(seconds, status, queries or None)]}.
+    """
+    summary = {}
+    for label, rows in samples.items():
+        timings = sorted(seconds * 1000 for seconds, _, _ in rows)
+        queries = [q for _, _, q in rows if q is not None]
+        stats = {
+            'requests': len(rows),
+            'errors': sum(1 for _, status, _ in rows if status >= 500 or status == 0)
+        }
+        for pct in PERCENTILES:
+            stats[f"p{pct}_ms"] = round(percentile(timings, pct), 2)
+        if queries:
+            stats['queries_avg'] = round(sum(queries) / len(queries), 1)
+            stats['queries_max'] = max(queries)
+        summary[label] = stats
+    return summary
+
+
+def print_summary(summary):
+    has_queries = any('queries_max' in stats for stats in summary.values())
+    header = f"{'request':<34}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    if has_queries:
+        header += f"{'queries avg':>13}{'max':>6}"
+    print(header)
+    for label, stats in summary.items():
+        line = (f"{label:<34}{stats['requests']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+                f"{stats['p99_ms']:>10.1f}{stats['errors']:>8}")
+        if has_queries:
+            line += f"{stats.get('queries_avg', 0):>13.1f}{stats.get('queries_max', 0):>6}"
+        print(line)
@@ -0,0 +1,172 @@
+"""
+HTTP load generator for a running server seeded by synthetic_data.py.
+
+    python benchmarks/synthetic_data.py --database-url mysql+pymysql://... --size full
+    DATABASE_URL=mysql+pymysql://... gunicorn -w 4 run:app
+    python benchmarks/http_load.py --url http://127.0.0.1:8000 --concurrency 16 --duration 60
+
+Each of --concurrency threads signs in through the real login forms, once
+as its own customer and once as the benchmark admin, then keeps picking a
+flow from flows.LOAD_MIX (or only --flows) until --duration runs out.
+Latency percentiles are reported per request label, with the overall
+request rate. SQL statements per request are not visible from outside;
+use app_bench.py for those, or run the server with PROFILING_ENABLED and
+read Admin -> Profiling.
+"""
+import argparse
+import http.cookiejar
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flows import FLOWS, LOAD_MIX, print_summary, summarize  # noqa: E402
+from synthetic_data import ADMIN_USERNAME, BENCHMARK_PASSWORD, SIZES, add_volume_arguments, volumes_from_args  # noqa: E402
+
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects as responses, so each request is timed on its own."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpDriver:
+    """One simulated user: a customer session and an admin session."""
+
+    def __init__(self, base_url, customer_id, samples, lock, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.customer_id = customer_id
+        self.samples = samples
+        self.lock = lock
+        self.timeout = timeout
+        self.recording = True
+        self._openers = {}
+        self._current = None
+
+    def _opener(self, role):
+        opener = self._openers.get(role)
+        if opener is None:
+            opener = urllib.request.build_opener(
+                urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                _NoRedirect()
+            )
+            self._openers[role] = opener
+            self._current = opener
+            self._login(role)
+        return opener
+
+    def _login(self, role):
+        recording, self.recording = self.recording, False
+        try:
+            if role == 'admin':
+                page = self.get('login', '/admin/login')
+                fields = {'username': ADMIN_USERNAME}
+                path = '/admin/login'
+            else:
+                page = self.get('login', '/account')
+                fields = {'email': f"bench-customer-{self.customer_id}@example.com"}
+                path = '/login'
+            match = CSRF_PATTERN.search(page)
+            fields.update(password=BENCHMARK_PASSWORD, csrf_token=match.group(1) if match else '')
+            self.post('login', path, fields)
+        finally:
+            self.recording = recording
+
+    def as_customer(self, customer_id):
+        # Logging in is a bcrypt check, so each thread stays one customer
+        self._current = self._opener('customer')
+
+    def as_admin(self):
+        self._current = self._opener('admin')
+
+    def _request(self, label, path, data=None, headers=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        if body is None and headers is not None:
+            body = b''
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers or {})
+        started = time.perf_counter()
+        try:
+            with self._current.open(request, timeout=self.timeout) as response:
+                text = response.read().decode('utf-8', 'replace')
+                status = response.status
+        except urllib.error.HTTPError as e:
+            text = e.read().decode('utf-8', 'replace')
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            text, status = '', 0
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            with self.lock:
+                self.samples[label].append((elapsed, status, None))
+        return text
+
+    def get(self, label, path):
+        return self._request(label, path)
+
+    def post(self, label, path, data=None, headers=None):
+        return self._request(label, path, data=data or {}, headers=headers)
+
+
+def _worker(driver, flow_names, weights, volumes, deadline, seed):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        name = rng.choices(flow_names, weights=weights)[0]
+        FLOWS[name](driver, rng, volumes)
+
+
+def run_load(base_url, volumes, flow_names, concurrency, duration, timeout=30, seed=42):
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    weights = [LOAD_MIX.get(name, 1) for name in flow_names]
+    deadline = time.monotonic() + duration
+
+    threads = []
+    for index in range(concurrency):
+        customer_id = index % volumes['customers'] + 1
+        driver = HttpDriver(base_url, customer_id, samples, lock, timeout)
+        thread = threading.Thread(
+            target=_worker,
+            args=(driver, flow_names, weights, volumes, deadline, f"{seed}-{index}"),
+            daemon=True
+        )
+        threads.append(thread)
+        thread.start()
+    started = time.monotonic()
+    for thread in threads:
+        thread.join()
+    return samples, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run.')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds.')
+    parser.add_argument('--flows', nargs='+', choices=sorted(FLOWS), default=list(LOAD_MIX))
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+
+    volumes = volumes_from_args(args)
+    print(f"{args.concurrency} users for {args.duration:g}s against {args.url} "
+          f"(data size '{args.size}', {SIZES[args.size]['orders']:,} orders unless overridden)")
+    samples, elapsed = run_load(args.url, volumes, args.flows, args.concurrency, args.duration, args.timeout, args.seed)
+
+    total = sum(len(rows) for rows in samples.values())
+    print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f}/s)\n")
+    print_summary(summarize(samples))
+
+
+if __name__ == '__main__':
+    main()
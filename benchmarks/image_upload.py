@@ -0,0 +1,161 @@
+"""
+Compare the old in-request upload resize with the current pipeline.
+
+    python benchmarks/image_upload.py [--phone-samples 5] [--repeat 3]
+
+"legacy" is the body save_picture/save_payment_receipt used to run:
+Image.open -> thumbnail((800, 800)) -> save. "current" is
+app.images.process_image, which asks the JPEG decoder for a reduced-scale
+decode first. Each method runs in a fresh process, and the peak RSS
+growth while resizing each image is read from /proc (Linux only).
+
+The images checked into app/static/uploads were already resized to 800px
+when they were uploaded, so each JPEG sample is also re-encoded at phone
+camera size (4032x3024) to measure what an upload actually costs.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASEDIR)
+
+UPLOAD_DIRS = ('products', 'payments', 'ids')
+PHONE_SIZE = (4032, 3024)
+
+
+def legacy_resize(raw_path, final_path):
+    from PIL import Image
+
+    i = Image.open(raw_path)
+    i.thumbnail((800, 800))
+    i.save(final_path)
+
+
+def current_resize(raw_path, final_path):
+    from app.images import process_image
+
+    # process_image consumes its input, so work on a copy
+    work_path = final_path + '.in' + os.path.splitext(raw_path)[1]
+    shutil.copyfile(raw_path, work_path)
+    process_image(work_path, final_path)
+
+
+METHODS = {
+    'legacy': legacy_resize,
+    'current': current_resize
+}
+
+
+def _memory_kib():
+    """(current RSS, peak RSS) of this process in KiB, from /proc (Linux)."""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(value.split()[0])
+    return values['VmRSS'], values['VmHWM']
+
+
+def _reset_peak():
+    # Writing 5 to clear_refs resets VmHWM to the current RSS
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def _run(method, paths, out_dir, repeat, results):
+    # Import everything up front so only the resize shows up in the peak
+    from PIL import Image  # noqa: F401
+    import app.images  # noqa: F401
+
+    timings = []
+    peak_growth = 0
+    for _ in range(repeat):
+        for path in paths:
+            final_path = os.path.join(out_dir, f"{method}-{os.path.basename(path)}")
+            _reset_peak()
+            rss_before, _ = _memory_kib()
+            started = time.perf_counter()
+            METHODS[method](path, final_path)
+            timings.append(time.perf_counter() - started)
+            _, peak = _memory_kib()
+            peak_growth = max(peak_growth, peak - rss_before)
+    results.put((timings, peak_growth))
+
+
+def measure(method, paths, out_dir, repeat):
+    """Run `method` over `paths` in a child process; return (timings, largest peak RSS growth in KiB)."""
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=_run, args=(method, paths, out_dir, repeat, results))
+    process.start()
+    timings, peak_growth = results.get()
+    process.join()
+    return timings, peak_growth
+
+
+def sample_images():
+    paths = []
+    for subfolder in UPLOAD_DIRS:
+        folder = os.path.join(BASEDIR, 'app', 'static', 'uploads', subfolder)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
+                paths.append(os.path.join(folder, filename))
+    return paths
+
+
+def make_phone_images(paths, count, out_dir):
+    from PIL import Image
+
+    phone_paths = []
+    for path in [p for p in paths if p.lower().endswith(('.jpg', '.jpeg'))][:count]:
+        with Image.open(path) as img:
+            big = img.convert('RGB').resize(PHONE_SIZE, Image.Resampling.BICUBIC)
+        phone_path = os.path.join(out_dir, 'phone-' + os.path.basename(path))
+        big.save(phone_path, 'JPEG', quality=92)
+        phone_paths.append(phone_path)
+    return phone_paths
+
+
+def report(label, paths, out_dir, repeat):
+    print(f"\n{label}: {len(paths)} images x {repeat}")
+    print(f"{'method':<10}{'median ms':>12}{'p95 ms':>10}{'total s':>10}{'peak RSS +MiB':>16}")
+    for method in METHODS:
+        timings, rss_kib = measure(method, paths, out_dir, repeat)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{method:<10}{statistics.median(timings) * 1000:>12.1f}{p95 * 1000:>10.1f}"
+              f"{sum(timings):>10.2f}{rss_kib / 1024:>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--phone-samples', type=int, default=5,
+                        help='How many JPEG samples to re-encode at phone size.')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sample_images()
+    if not paths:
+        sys.exit("No sample images found under app/static/uploads.")
+
+    work_dir = tempfile.mkdtemp(prefix='image-bench-')
+    try:
+        report("Repository samples (already <= 800px)", paths, work_dir, args.repeat)
+        if args.phone_samples:
+            phone_paths = make_phone_images(paths, args.phone_samples, work_dir)
+            report(f"Phone-size copies ({PHONE_SIZE[0]}x{PHONE_SIZE[1]} JPEG)", phone_paths, work_dir, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Check the SQL statement budgets declared with @query_budget.
+
+    python benchmarks/query_budgets.py
+
+Every route with a budget (see app/query_budget.py) is requested against
+two in-memory SQLite databases seeded by synthetic_data.py, a small one
+and one with four to five times the rows, each in its own process so no
+in-process cache carries over. Each route is requested twice: "cold",
+with the customer's checkout quote invalidated and the catalog version
+due for a re-read, and then "warm", straight after itself, so both the
+cache-miss and the steady-state paths are counted. The customer's cart
+and buffet package are refilled before each route, since some routes
+empty them; POST routes (placing an order) get a cart holding every
+active variant before each request, so the large data set places six
+times as many lines. The menu reset, which deletes the data, runs last.
+The check fails (exit status 1) when:
+
+  * a route answers with another status than the one it declares,
+  * a route issues more statements than its budget on either request,
+  * a route issues more statements on the large data set than on the
+    small one, i.e. the count grows with the number of rows (an N+1
+    query), or
+  * a GET route has neither a budget nor a @no_query_budget reason.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_data import ADMIN_USERNAME, Seeder, benchmark_config  # noqa: E402
+
+SIZES = {
+    'small': {
+        'categories': 3, 'products': 12, 'variants_per_product': 2,
+        'customers': 5, 'orders': 30, 'max_items_per_order': 3,
+        'reviews': 20, 'days': 30, 'voucher_codes': 40
+    },
+    'large': {
+        'categories': 6, 'products': 48, 'variants_per_product': 3,
+        'customers': 15, 'orders': 150, 'max_items_per_order': 4,
+        'reviews': 100, 'days': 30, 'voucher_codes': 200
+    }
+}
+CUSTOMER_ID = 1
+# Checkout options as save_checkout_options leaves them
+CHECKOUT_SESSION = {
+    'order_type': 'Pickup',
+    'delivery_address': 'Store Pickup',
+    'delivery_fee': 0.0,
+    'payment_method': 'COD/COP',
+    'event_date_str': '2099-01-01',
+    'event_time_str': '12:00'
+}
+# The buffet wizard state buffet_wizard_reco leaves in the session
+BUFFET_SESSION = {
+    'buffet_recommendations': {'Shared_Mains': 3, 'Category 1': 3},
+    'buffet_sequence': ['Category 1']
+}
+# Per-route additions to the signed-in session
+ROUTE_SESSIONS = {
+    'buffet_wizard_select': BUFFET_SESSION,
+    'buffet_remove_item_from_package': BUFFET_SESSION,
+    'client_card_payment': {'payment_method': 'Credit/Debit Card', 'final_total': 1000.0},
+    'client_gcash_upload': {'payment_method': 'GCash', 'final_total': 1000.0}
+}
+IMPORT_REPORT_TOKEN = 'querybudget'
+# Routes that delete the data the others need
+RUN_LAST = ('admin_reset_menu',)
+
+
+def _fill_cart(app, volumes, every_variant=False):
+    from app import cart_store, db
+    from app.models import Product, ProductVariant
+
+    with app.app_context():
+        cart_store.clear(CUSTOMER_ID)
+        cart_store.clear(CUSTOMER_ID, cart_store.BUFFET)
+        variants = volumes['variants_per_product']
+        if every_variant:
+            # Only orderable lines, or checkout stops to show the cart changes
+            variant_ids = [
+                variant_id for (variant_id,) in db.session.query(ProductVariant.variant_id)
+                .join(Product).filter(Product.is_active == True)
+            ]
+        else:
+            # One line per four products, so cart pages grow with the data too
+            variant_ids = [(product_id - 1) * variants + 1 for product_id in range(1, volumes['products'] + 1, 4)]
+            for variant_id in variant_ids:
+                cart_store.add_item(CUSTOMER_ID, variant_id, 1, cart_store.BUFFET)
+        for variant_id in variant_ids:
+            cart_store.add_item(CUSTOMER_ID, variant_id, 1)
+        db.session.commit()
+
+
+def _seed(app, volumes):
+    from app import db, leaderboard, sales_rollup
+    from app.models import Order, OrderItem, Review
+    from app.vouchers import generate_voucher_batch
+
+    with app.app_context():
+        db.create_all()
+        Seeder(volumes, echo=lambda *args: None).run()
+
+        # Order 1 is a completed order of the customer with product 1 on it,
+        # not yet reviewed, for the receipt and review pages
+        order = db.session.get(Order, 1)
+        order.customer_id = CUSTOMER_ID
+        order.status = 'Completed'
+        if not any(item.product_id == 1 for item in order.items):
+            db.session.add(OrderItem(order_id=1, product_id=1, variant_id=1, quantity=1, price_per_item=100))
+        Review.query.filter_by(customer_id=CUSTOMER_ID, product_id=1).delete()
+        leaderboard.rebuild_leaderboard()
+        sales_rollup.rebuild_sales_rollup()
+
+        generate_voucher_batch('Query budgets', volumes['voucher_codes'], 10)
+        db.session.commit()
+    _fill_cart(app, volumes)
+
+
+def _reset_token(app, created_files):
+    from app import db
+    from app.models import Customer
+
+    return {'token': db.session.get(Customer, CUSTOMER_ID).get_reset_token()}
+
+
+def _import_report(app, created_files):
+    from app.routes import import_report_folder
+
+    os.makedirs(import_report_folder(), exist_ok=True)
+    path = os.path.join(import_report_folder(), f"{IMPORT_REPORT_TOKEN}.csv")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("row,error\n")
+    created_files.append(path)
+    return {'token': IMPORT_REPORT_TOKEN}
+
+
+# Per-route setup, run before the route is measured; returns URL values
+ROUTE_SETUP = {
+    'client_reset_token': _reset_token,
+    'admin_import_report': _import_report
+}
+
+
+def _login(client, role, admin_id, extra=None):
+    with client.session_transaction() as session:
+        session.clear()
+        if role == 'customer':
+            session['customer_id'] = CUSTOMER_ID
+            session['customer_name'] = f"Customer {CUSTOMER_ID}"
+            session.update(CHECKOUT_SESSION)
+            session.update(extra or {})
+        elif role == 'admin':
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+
+
+def measure(size):
+    """{endpoint: {'url', 'cold', 'warm', 'status'}} for every budgeted route."""
+    from flask import url_for
+    from sqlalchemy import event
+    from app import cart_store, create_app, db
+    from app.catalog import mark_catalog_stale
+    from app.models import User
+    from app.query_budget import QUERY_BUDGETS
+
+    app = create_app(benchmark_config('sqlite:///:memory:'))
+    # No timed catalog version checks: counts must not depend on how long a run takes
+    app.config['CATALOG_VERSION_CHECK_SECONDS'] = 3600
+    volumes = SIZES[size]
+    _seed(app, volumes)
+
+    counter = [0]
+    with app.app_context():
+        admin_id = db.session.query(User.user_id).filter_by(username=ADMIN_USERNAME).scalar()
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: counter.__setitem__(0, counter[0] + 1))
+
+    client = app.test_client()
+    results = {}
+    created_files = []
+    try:
+        for endpoint, budget in sorted(QUERY_BUDGETS.items(), key=lambda item: (item[0] in RUN_LAST, item[0])):
+            _fill_cart(app, volumes)
+            url_values = dict(budget.url_values)
+            if endpoint in ROUTE_SETUP:
+                with app.app_context():
+                    url_values.update(ROUTE_SETUP[endpoint](app, created_files))
+            with app.test_request_context():
+                url = url_for(endpoint, **url_values)
+
+            with app.app_context():
+                cart_store.bump_cart_version(CUSTOMER_ID)
+                db.session.commit()
+            mark_catalog_stale()
+
+            counts = []
+            for attempt in range(2):
+                if budget.method == 'POST':
+                    # Placing an order empties the cart and the checkout session
+                    _fill_cart(app, volumes, every_variant=True)
+                if attempt == 0 or budget.method == 'POST' or budget.status != 200:
+                    # Logging out and checkout redirects change the session
+                    _login(client, budget.role, admin_id, ROUTE_SESSIONS.get(endpoint))
+                counter[0] = 0
+                response = client.open(url, method=budget.method,
+                                       headers={'Idempotency-Key': f"query-budget-{endpoint}-{attempt}"})
+                response.get_data()
+                counts.append(counter[0])
+                status = response.status_code
+                response.close()
+            results[endpoint] = {'url': url, 'cold': counts[0], 'warm': counts[1], 'status': status}
+    finally:
+        for path in created_files:
+            os.remove(path)
+    return results
+
+
+def _measure_in_subprocess(size):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure', size],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def check(small, large, budgets):
+    """[(endpoint, problem)] for every budget violation and growing count."""
+    problems = []
+    for endpoint, budget in sorted(budgets.items()):
+        for size, results in (('small', small), ('large', large)):
+            result = results[endpoint]
+            if result['status'] != budget.status:
+                problems.append((endpoint, f"{result['url']} answered {result['status']} on the {size} data set, "
+                                           f"expected {budget.status}"))
+            worst = max(result['cold'], result['warm'])
+            if worst > budget.limit:
+                problems.append((endpoint, f"{worst} statements on the {size} data set, budget {budget.limit}"))
+        for kind in ('cold', 'warm'):
+            if large[endpoint][kind] > small[endpoint][kind]:
+                problems.append((endpoint, f"{kind} count grows with the data: "
+                                           f"{small[endpoint][kind]} -> {large[endpoint][kind]}"))
+    return problems
+
+
+def unbudgeted_endpoints(app):
+    """GET endpoints of the app with neither a budget nor a @no_query_budget reason."""
+    from app.query_budget import NO_QUERY_BUDGET, QUERY_BUDGETS
+
+    return sorted({
+        rule.endpoint for rule in app.url_map.iter_rules()
+        if 'GET' in rule.methods and rule.endpoint != 'static'
+        and rule.endpoint not in QUERY_BUDGETS and rule.endpoint not in NO_QUERY_BUDGET
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--measure', choices=sorted(SIZES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return
+
+    from app.query_budget import NO_QUERY_BUDGET, QUERY_BUDGETS
+    from app import create_app
+
+    # Importing the routes registers the budgets
+    app = create_app(benchmark_config('sqlite:///:memory:'))
+    small = _measure_in_subprocess('small')
+    large = _measure_in_subprocess('large')
+
+    print(f"{'endpoint':<32}{'budget':>7}{'small cold/warm':>17}{'large cold/warm':>17}")
+    for endpoint, budget in sorted(QUERY_BUDGETS.items()):
+        s, l = small[endpoint], large[endpoint]
+        print(f"{endpoint:<32}{budget.limit:>7}{s['cold']:>11}/{s['warm']:<5}{l['cold']:>11}/{l['warm']:<5}")
+
+    print("\nNot budgeted:")
+    for endpoint, reason in sorted(NO_QUERY_BUDGET.items()):
+        print(f"  {endpoint}: {reason}")
+
+    problems = check(small, large, QUERY_BUDGETS)
+    problems += [(endpoint, "GET route without @query_budget or @no_query_budget")
+                 for endpoint in unbudgeted_endpoints(app)]
+    if problems:
+        print(f"\n{len(problems)} query budget problem(s):")
+        for endpoint, problem in problems:
+            print(f"  {endpoint}: {problem}")
+        sys.exit(1)
+    print(f"\nAll {len(QUERY_BUDGETS)} routes are within budget and do not grow with the data.")
+
+
+if __name__ == '__main__':
+    main()
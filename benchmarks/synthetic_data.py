@@ -0,0 +1,342 @@
+"""
+Seed a throwaway database with synthetic catering data for the benchmarks.
+
+    python benchmarks/synthetic_data.py --database-url sqlite:////tmp/bench.db --size full
+
+Sizes (override any count with its own flag, e.g. --orders 50000):
+
+    small    1k customers,   10k orders   (seconds)
+    medium  20k customers,  200k orders   (about a minute on SQLite)
+    full   100k customers,    1M orders   (several minutes on SQLite)
+
+Rows are generated from a fixed random seed, so the same size and seed
+always give the same data. Tables are created with db.create_all(); the
+database must be empty unless --reset is given, which drops every table
+first. Never point this at a database you care about.
+
+Every customer can log in with BENCHMARK_PASSWORD (bench-customer-<id>@
+example.com) and the admin user is "bench-admin" with the same password,
+so the HTTP load generator can sign in through the real login forms.
+The rating, best-seller and sales rollup tables are rebuilt at the end,
+as `flask rebuild-*` would after a backfill.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASEDIR)
+
+BENCHMARK_PASSWORD = 'bench-Passw0rd!'
+ADMIN_USERNAME = 'bench-admin'
+INSERT_BATCH_SIZE = 5000
+
+SIZES = {
+    'small': {
+        'categories': 8, 'products': 80, 'variants_per_product': 3,
+        'customers': 1_000, 'orders': 10_000, 'max_items_per_order': 4,
+        'reviews': 2_000, 'days': 365
+    },
+    'medium': {
+        'categories': 10, 'products': 200, 'variants_per_product': 3,
+        'customers': 20_000, 'orders': 200_000, 'max_items_per_order': 4,
+        'reviews': 20_000, 'days': 365
+    },
+    'full': {
+        'categories': 12, 'products': 300, 'variants_per_product': 3,
+        'customers': 100_000, 'orders': 1_000_000, 'max_items_per_order': 4,
+        'reviews': 100_000, 'days': 730
+    }
+}
+
+# (status, weight): most old orders are finished, a few are still open
+ORDER_STATUSES = (
+    ('Completed', 70), ('Approved', 8), ('In Progress', 3), ('Up for Delivery', 2),
+    ('Pending Approval', 7), ('Declined', 10)
+)
+PAYMENT_METHODS = (('COD/COP', 60), ('GCash', 30), ('Credit/Debit Card', 10))
+ORDER_TYPES = (('Pickup', 55), ('Delivery', 45))
+SIZE_NAMES = ('Small', 'Medium', 'Large', 'Party Tray', 'Family')
+VAT_RATE = Decimal('0.12')
+DELIVERY_FEE = Decimal('100.00')
+
+
+def benchmark_config(database_url):
+    """A Config subclass pointed at `database_url`, with background work off."""
+    from config import Config
+
+    class BenchmarkConfig(Config):
+        SECRET_KEY = Config.SECRET_KEY or 'benchmark-secret-key'
+        SQLALCHEMY_DATABASE_URI = database_url
+        EMAIL_OUTBOX_WORKER = False
+        IMAGE_PROCESS_ASYNC = False
+        MAIL_SUPPRESS_SEND = True
+        SERVER_NAME = None
+
+    return BenchmarkConfig
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _chunks(rows, size=INSERT_BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+class Seeder:
+    """Generate and bulk-insert one synthetic data set."""
+
+    def __init__(self, volumes, seed=42, echo=print):
+        self.volumes = volumes
+        self.rng = random.Random(seed)
+        self.echo = echo
+        self.today = date.today()
+        self.variants = []  # (variant_id, product_id, price)
+
+    def _insert(self, model, rows):
+        from sqlalchemy import insert
+        from app import db
+
+        for chunk in _chunks(rows):
+            db.session.execute(insert(model), chunk)
+
+    def run(self):
+        from app import db
+
+        started = time.perf_counter()
+        steps = (
+            ('catalog', self.seed_catalog),
+            ('customers', self.seed_customers),
+            ('orders', self.seed_orders),
+            ('reviews', self.seed_reviews),
+            ('aggregates', self.rebuild_aggregates)
+        )
+        for label, step in steps:
+            step_started = time.perf_counter()
+            count = step()
+            db.session.commit()
+            self.echo(f"  {label:<11}{count:>10,} rows  {time.perf_counter() - step_started:6.1f}s")
+        self.echo(f"Seeded in {time.perf_counter() - started:.1f}s.")
+
+    def seed_catalog(self):
+        from app.models import Category, Product, ProductVariant, User
+        from app import db
+
+        v = self.volumes
+        self._insert(Category, [
+            {'category_id': c, 'name': f"Category {c}", 'description': f"Synthetic category {c}", 'is_active': True}
+            for c in range(1, v['categories'] + 1)
+        ])
+        self._insert(Product, [
+            {
+                'product_id': p,
+                'category_id': (p - 1) % v['categories'] + 1,
+                'name': f"Dish {p:05d}",
+                'description': f"Synthetic dish number {p}.",
+                'has_variants': v['variants_per_product'] > 1,
+                # One product in twenty is switched off, as on the real menu
+                'is_active': p % 20 != 0
+            }
+            for p in range(1, v['products'] + 1)
+        ])
+        variants = []
+        variant_id = 0
+        for product_id in range(1, v['products'] + 1):
+            base = Decimal(self.rng.randrange(150, 1500, 10))
+            for size in range(v['variants_per_product']):
+                variant_id += 1
+                price = base * (1 + Decimal(size) / 2)
+                variants.append({
+                    'variant_id': variant_id,
+                    'product_id': product_id,
+                    'size_name': SIZE_NAMES[size % len(SIZE_NAMES)],
+                    'price': price
+                })
+                self.variants.append((variant_id, product_id, price))
+        self._insert(ProductVariant, variants)
+
+        admin = User(username=ADMIN_USERNAME)
+        admin.set_password(BENCHMARK_PASSWORD)
+        db.session.add(admin)
+        return v['categories'] + v['products'] + len(variants)
+
+    def seed_customers(self):
+        from app import bcrypt
+        from app.models import Customer
+
+        # One hash for everyone: bcrypt per row would take hours at 100k
+        password_hash = bcrypt.generate_password_hash(BENCHMARK_PASSWORD).decode('utf-8')
+        start = datetime.combine(self.today - timedelta(days=self.volumes['days']), dt_time(9, 0))
+
+        rows = []
+        for customer_id in range(1, self.volumes['customers'] + 1):
+            discount = customer_id % 25 == 0
+            rows.append({
+                'customer_id': customer_id,
+                'name': f"Customer {customer_id}",
+                'email': f"bench-customer-{customer_id}@example.com",
+                'contact_number': f"09{customer_id:09d}",
+                'password_hash': password_hash,
+                'registration_date': start + timedelta(minutes=self.rng.randrange(self.volumes['days'] * 24 * 60)),
+                'address': f"{customer_id} Synthetic St.",
+                'discount_type': 'Senior' if discount else None,
+                'is_verified_discount': discount and customer_id % 50 == 0,
+                'discount_status': ('Approved' if customer_id % 50 == 0 else 'Pending') if discount else None
+            })
+        self._insert(Customer, rows)
+        return len(rows)
+
+    def seed_orders(self):
+        """Orders and their items, generated and inserted in batches to bound memory."""
+        from app.models import Order, OrderItem
+
+        v = self.volumes
+        start = datetime.combine(self.today - timedelta(days=v['days']), dt_time(8, 0))
+        window_minutes = v['days'] * 24 * 60
+
+        order_id = 0
+        item_count = 0
+        order_item_id = 0
+        while order_id < v['orders']:
+            orders = []
+            items = []
+            for _ in range(min(INSERT_BATCH_SIZE, v['orders'] - order_id)):
+                order_id += 1
+                order_date = start + timedelta(minutes=self.rng.randrange(window_minutes))
+                order_type = _weighted(self.rng, ORDER_TYPES)
+                payment_method = _weighted(self.rng, PAYMENT_METHODS)
+                status = _weighted(self.rng, ORDER_STATUSES)
+
+                total = Decimal('0')
+                for variant_id, product_id, price in self.rng.sample(self.variants, self.rng.randint(1, v['max_items_per_order'])):
+                    quantity = self.rng.randint(1, 5)
+                    order_item_id += 1
+                    items.append({
+                        'order_item_id': order_item_id,
+                        'order_id': order_id,
+                        'product_id': product_id,
+                        'variant_id': variant_id,
+                        'quantity': quantity,
+                        'price_per_item': price
+                    })
+                    total += price * quantity
+
+                delivery_fee = DELIVERY_FEE if order_type == 'Delivery' else Decimal('0')
+                vat = (total * VAT_RATE).quantize(Decimal('0.01'))
+                orders.append({
+                    'order_id': order_id,
+                    'customer_id': self.rng.randint(1, v['customers']),
+                    'order_date': order_date,
+                    'event_date': (order_date + timedelta(days=self.rng.randint(3, 30))).date(),
+                    'event_time': dt_time(self.rng.randint(9, 19), 0),
+                    'total_amount': total,
+                    'discount_amount': Decimal('0'),
+                    'final_amount': total + vat + delivery_fee,
+                    'vat_amount': vat,
+                    'delivery_fee': delivery_fee,
+                    'status': status,
+                    'decline_reason': 'Fully booked' if status == 'Declined' else None,
+                    'order_type': order_type,
+                    'delivery_address': f"{order_id} Event Ave." if order_type == 'Delivery' else None,
+                    'payment_method': payment_method,
+                    'payment_status': 'Paid' if status == 'Completed' else 'Pending'
+                })
+            self._insert(Order, orders)
+            self._insert(OrderItem, items)
+            item_count += len(items)
+        return order_id + item_count
+
+    def seed_reviews(self):
+        from app.models import Review
+
+        v = self.volumes
+        wanted = min(v['reviews'], v['customers'] * v['products'])
+        pairs = set()
+        while len(pairs) < wanted:
+            pairs.add((self.rng.randint(1, v['customers']), self.rng.randint(1, v['products'])))
+
+        start = datetime.combine(self.today - timedelta(days=v['days']), dt_time(8, 0))
+        rows = [
+            {
+                'customer_id': customer_id,
+                'product_id': product_id,
+                'rating': _weighted(self.rng, ((5, 50), (4, 30), (3, 12), (2, 5), (1, 3))),
+                'comment': 'Synthetic review.',
+                'review_date': start + timedelta(minutes=self.rng.randrange(v['days'] * 24 * 60))
+            }
+            for customer_id, product_id in sorted(pairs)
+        ]
+        self._insert(Review, rows)
+        return len(rows)
+
+    def rebuild_aggregates(self):
+        from app.catalog import bump_catalog_version
+        from app.leaderboard import rebuild_leaderboard
+        from app.ratings import rebuild_product_ratings
+        from app.sales_rollup import rebuild_sales_rollup
+
+        count = rebuild_product_ratings() + rebuild_leaderboard() + rebuild_sales_rollup()
+        bump_catalog_version()
+        return count
+
+
+def volumes_from_args(args):
+    volumes = dict(SIZES[args.size])
+    for key in volumes:
+        value = getattr(args, key, None)
+        if value is not None:
+            volumes[key] = value
+    return volumes
+
+
+def add_volume_arguments(parser):
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    for key in SIZES['small']:
+        parser.add_argument('--' + key.replace('_', '-'), dest=key, type=int,
+                            help=f"Override the {key.replace('_', ' ')} count of --size.")
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the generated rows.')
+
+
+def seed_database(app, volumes, seed=42, reset=False, echo=print):
+    """Create the schema in `app`'s database and fill it. Returns False if it was not empty."""
+    from app import db
+    from app.models import Order
+
+    with app.app_context():
+        if reset:
+            db.drop_all()
+        db.create_all()
+        if db.session.query(Order.order_id).first() is not None:
+            return False
+        echo("Seeding " + ', '.join(f"{key}={value:,}" for key, value in volumes.items()))
+        Seeder(volumes, seed=seed, echo=echo).run()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.environ.get('BENCHMARK_DATABASE_URL'),
+                        help='Database to seed (default: $BENCHMARK_DATABASE_URL).')
+    parser.add_argument('--reset', action='store_true', help='Drop all tables first.')
+    add_volume_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.database_url:
+        sys.exit("Pass --database-url or set BENCHMARK_DATABASE_URL.")
+
+    from app import create_app
+
+    app = create_app(benchmark_config(args.database_url))
+    if not seed_database(app, volumes_from_args(args), seed=args.seed, reset=args.reset):
+        sys.exit("The database already has orders; pass --reset to drop and reseed it.")
+
+
+if __name__ == '__main__':
+    main()
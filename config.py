@@ -30,6 +30,9 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # How often (seconds) a worker re-reads the catalog version counter
+    CATALOG_VERSION_CHECK_SECONDS = int(os.environ.get('CATALOG_VERSION_CHECK_SECONDS', 5))
+
     # --- ADD THESE LINES for Flask-Mail ---
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 587
@@ -38,4 +41,36 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
 
-    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_USERNAME')
\ No newline at end of file
+    MAIL_DEFAULT_SENDER = os.environ.get('MAIL_USERNAME')
+
+    # Email outbox: run a delivery thread in each served web process (set to
+    # 'false' when a separate `flask send-emails --loop` worker is used).
+    # CLI commands never start the thread
+    EMAIL_OUTBOX_WORKER = os.environ.get('EMAIL_OUTBOX_WORKER', 'true').lower() == 'true'
+    EMAIL_OUTBOX_POLL_SECONDS = int(os.environ.get('EMAIL_OUTBOX_POLL_SECONDS', 5))
+
+    # Uploaded images are resized by a pool of IMAGE_WORKERS processes; when
+    # more than IMAGE_QUEUE_LIMIT uploads are waiting, new ones are resized
+    # inline in the request instead
+    IMAGE_PROCESS_ASYNC = os.environ.get('IMAGE_PROCESS_ASYNC', 'true').lower() == 'true'
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+    IMAGE_QUEUE_LIMIT = int(os.environ.get('IMAGE_QUEUE_LIMIT', 16))
+
+    # Uploads over either cap are rejected from the header, before decoding
+    IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 50_000_000))
+
+    # Per-endpoint timings and SQL counts, shown on /admin/profiling; requests
+    # slower than PROFILING_SLOW_MS are logged with their top statements
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_SLOW_MS = int(os.environ.get('PROFILING_SLOW_MS', 500))
+
+    # Prometheus metrics at /metrics, off unless enabled. Behind a reverse
+    # proxy every request comes from the proxy's address, so either scrape
+    # the app server directly (bypassing the proxy) from METRICS_ALLOWED_IPS
+    # or set METRICS_TOKEN, which the scraper then sends as a bearer token.
+    # Set PROMETHEUS_MULTIPROC_DIR when running several worker processes so
+    # a scrape of any worker covers all of them
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_ALLOWED_IPS = [ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
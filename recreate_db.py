@@ -20,5 +20,17 @@ with app.app_context():
     print("- Order_Items")
     print("- Vouchers")
     print("- Reviews")
+    print("- Catalog_Version")
+    print("- Product_Ratings")
+    print("- Product_Sales_Daily")
+    print("- Product_Sales_Totals")
+    print("- Sales_Daily")
+    print("- Sales_Daily_Variants")
+    print("- Email_Outbox")
+    print("- Stored_Files")
+    print("- Cart_Items")
+    print("- Cart_States")
+    print("- Voucher_Batches")
+    print("- Voucher_Redemptions")
     print("\nYou can now run the application!")
 
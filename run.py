@@ -1,6 +1,14 @@
+import os
+
 from app import create_app
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # With the reloader on, the process serving requests is the child
+    # (WERKZEUG_RUN_MAIN); the watching parent must not deliver email too
+    if app.config.get('EMAIL_OUTBOX_WORKER') and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.mailer import start_worker_thread
+        start_worker_thread(app)
+
+    app.run(host='0.0.0.0', port=5000, debug=True)